@@ -0,0 +1,147 @@
+"""Бенчмарк: задержки event loop при смешанной нагрузке БД + LLM, синхронная сессия против AsyncSession.
+
+Каждый "запрос" повторяет путь /companies/search: чтение компаний с фильтром
+по описанию (полный просмотр таблицы), вызов LLM через stub-сервер и запись
+SearchLog. Параллельно фоновая задача измеряет, на сколько опаздывает
+пробуждение event loop (lag): пока синхронный запрос к БД выполняется в
+потоке event loop, стоят все остальные запросы и вызовы LLM.
+
+БД берется из DATABASE_URL (для Postgres нужен asyncpg), по умолчанию -
+временный файл SQLite (нужен aiosqlite). --concurrency не должен превышать
+размер пула синхронного движка (pool_size + max_overflow): иначе ожидание
+соединения в синхронном режиме блокирует event loop, и соединения не
+освобождаются до истечения pool_timeout.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_async_db --companies 100000 --concurrency 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import start_stub_server  # noqa: E402
+
+
+async def _monitor_lag(samples: list, stop: asyncio.Event, interval: float = 0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def _run_mode(mode: str, client, requests: int, concurrency: int) -> str:
+    from sqlalchemy import select
+    from database import AsyncSessionLocal, Company, SearchLog, SessionLocal
+
+    llm_latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def llm_call():
+        started = time.perf_counter()
+        await client._make_request("ping", max_tokens=10)
+        llm_latencies.append(time.perf_counter() - started)
+
+    query = select(Company.id).where(Company.description.like("%бурение%")).limit(20)
+
+    async def handle_sync(index: int):
+        db = SessionLocal()
+        try:
+            db.execute(query).all()
+            await llm_call()
+            db.add(SearchLog(search_type="company", query=f"bench {index}", results_count=1))
+            db.commit()
+        finally:
+            db.close()
+
+    async def handle_async(index: int):
+        async with AsyncSessionLocal() as db:
+            (await db.execute(query)).all()
+            await llm_call()
+            db.add(SearchLog(search_type="company", query=f"bench {index}", results_count=1))
+            await db.commit()
+
+    handler = handle_sync if mode == "sync" else handle_async
+
+    async def limited(index: int):
+        async with semaphore:
+            await handler(index)
+
+    lag_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_monitor_lag(lag_samples, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    lag_samples.sort()
+    p99 = lag_samples[int(len(lag_samples) * 0.99) - 1] if lag_samples else 0.0
+    return (f"{mode:<6} время={elapsed:6.2f} с  запросов/с={requests / elapsed:7.1f}  "
+            f"lag p50={statistics.median(lag_samples) * 1000:6.1f} ms p99={p99 * 1000:6.1f} ms "
+            f"max={lag_samples[-1] * 1000:6.1f} ms  LLM avg={statistics.mean(llm_latencies) * 1000:6.1f} ms")
+
+
+def _seed(companies: int):
+    from database import Company, SessionLocal, create_tables
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        existing = db.query(Company).count()
+        rows = [
+            {"name": f"Компания {index}", "description": f"Поставщик оборудования, профиль {index % 97}",
+             "email": f"info{index}@example{index % 50}.ru"}
+            for index in range(existing, companies)
+        ]
+        for start in range(0, len(rows), 10000):
+            db.bulk_insert_mappings(Company, rows[start:start + 10000])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.1, help="задержка ответа stub LLM, сек")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_async_db.db')}"
+    server, base_url = start_stub_server(delay=args.delay)
+    os.environ["POLZA_BASE_URL"] = base_url
+
+    from database import DATABASE_URL
+    from polza_client import PolzaAIClient
+
+    _seed(args.companies)
+    print(f"БД: {DATABASE_URL}, компаний: {args.companies}, запросов: {args.requests}, "
+          f"одновременно: {args.concurrency}, ответ LLM: {args.delay * 1000:.0f} ms")
+    real_stdout = sys.stdout
+    client = PolzaAIClient()
+    try:
+        for mode in ("sync", "async"):
+            sys.stdout = open(os.devnull, "w")
+            try:
+                line = await _run_mode(mode, client, args.requests, args.concurrency)
+            finally:
+                sys.stdout.close()
+                sys.stdout = real_stdout
+            print(line)
+    finally:
+        sys.stdout = real_stdout
+        await client.aclose()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""Бенчмарк: отчет о дубликатах компаний (EntityResolver.merge_report) - время, число сравнений, точность.
+
+Генерируются уникальные названия компаний, к части из них добавляются
+дубликаты в другом написании: с ОПФ и в кавычках, заглавными буквами,
+латиницей по другой схеме транслитерации ("kh", "tz", "ia"), с опечаткой,
+с другим названием, но тем же сайтом. Для нескольких размеров таблицы
+печатается время отчета, число сравнений пар против N²/2 и точность/полнота
+найденных групп по известной разметке. Таблицы не нужны: компании сравниваются
+в памяти, модуль database импортируется только ради модели Company.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_entity_resolution --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from itertools import combinations
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from names import company_name_key  # noqa: E402
+
+SYLLABLES = ["ал", "маз", "гео", "бур", "тех", "нефть", "хим", "про", "мет", "лит", "сиб", "урал", "вол", "га",
+             "ком", "пласт", "энер", "гия", "строй", "транс", "ника", "рус", "бел", "кедр", "ива", "дон", "кам",
+             "ен", "ре", "ко", "ми", "за", "ту", "цвет", "жел", "ют", "щит", "яр", "ёл", "ка", "вест", "норд",
+             "ост", "мир", "арс", "бор", "вит", "грин", "дар", "зар", "кон", "лен", "мос", "неж", "пром", "роса",
+             "сар", "тай", "фар", "хол", "чел", "шах", "эко", "юг", "ям", "ан", "бис", "вер", "дис", "кор"]
+SECOND_WORDS = ["", "", "", "Трейд", "Групп", "Сервис", "Инжиниринг", "Снаб", "Холдинг", "Проект"]
+LEGAL_FORMS = ["ООО", "АО", "ЗАО", "ПАО", "ООО ТД"]
+# Английская практика транслитерации, отличная от transliterate_cyrillic
+ALT_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'tz', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '',
+    'э': 'e', 'ю': 'iu', 'я': 'ia',
+}
+
+
+def _alt_transliterate(name: str) -> str:
+    return "".join(ALT_TRANSLIT.get(ch, ALT_TRANSLIT.get(ch.lower(), ch).upper() if ch.isupper() else ch) for ch in name)
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    # Опечатка во второй половине слова: замена одной буквы
+    position = rng.randrange(len(name) // 2, len(name))
+    letters = "абвгдежзиклмнопрстуфхцчшщэюя"
+    return name[:position] + rng.choice(letters) + name[position + 1:]
+
+
+def _generate(size: int, duplicate_ratio: float, seed: int = 42):
+    """(строки (id, name, website, email), {id: id исходной компании} для дубликатов)"""
+    rng = random.Random(seed)
+    rows = []
+    origin = {}
+    keys = set()
+    base_count = int(size / (1 + duplicate_ratio))
+    while len(rows) < base_count:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        name = f"{word} {rng.choice(SECOND_WORDS)}".strip()
+        key = company_name_key(name)
+        if key in keys:
+            continue
+        keys.add(key)
+        has_site = rng.random() < 0.5
+        website = f"https://{key[:20]}{len(rows)}.ru" if has_site else ""
+        email = f"info@{key[:20]}{len(rows)}.ru" if has_site and rng.random() < 0.7 else ""
+        rows.append((len(rows) + 1, name, website, email))
+
+    variants = ["legal", "upper", "latin", "typo", "same_site"]
+    while len(rows) < size:
+        base_id, name, website, email = rows[rng.randrange(base_count)]
+        variant = rng.choice(variants)
+        if variant == "legal":
+            duplicate = (f"{rng.choice(LEGAL_FORMS)} «{name}»", "", "")
+        elif variant == "upper":
+            duplicate = (name.upper(), website, "")
+        elif variant == "latin":
+            duplicate = (_alt_transliterate(name), "", email)
+        elif variant == "typo":
+            if len(name) < 8:
+                continue
+            duplicate = (_typo(name, rng), website, "")
+        else:
+            if not website:
+                continue
+            duplicate = (f"Филиал {len(rows)}", website.replace("https://", "http://www."), "")
+        origin[len(rows) + 1] = origin.get(base_id, base_id)
+        rows.append((len(rows) + 1, *duplicate))
+    return rows, origin
+
+
+def _quality(report, origin):
+    true_pairs = set()
+    groups = {}
+    for duplicate_id, base_id in origin.items():
+        groups.setdefault(base_id, {base_id}).add(duplicate_id)
+    for members in groups.values():
+        true_pairs.update(combinations(sorted(members), 2))
+    found_pairs = set()
+    for cluster in report["clusters"]:
+        members = sorted([cluster["canonical"]["id"]] + [duplicate["id"] for duplicate in cluster["duplicates"]])
+        found_pairs.update(combinations(members, 2))
+    correct = len(true_pairs & found_pairs)
+    precision = correct / len(found_pairs) if found_pairs else 1.0
+    recall = correct / len(true_pairs) if true_pairs else 1.0
+    return precision, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,50000,100000")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="доля дубликатов к числу исходных компаний")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_entity_resolution.db')}"
+    from entity_resolution import EntityResolver
+
+    resolver = EntityResolver()
+    print(f"{'компаний':>9} {'время':>9} {'сравнений':>11} {'N²/2':>14} {'групп':>7} {'точность':>9} {'полнота':>8}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        rows, origin = _generate(size, args.duplicates)
+        started = time.perf_counter()
+        report = resolver.merge_report(rows, max_clusters=size, max_possible=0)
+        elapsed = time.perf_counter() - started
+        precision, recall = _quality(report, origin)
+        print(f"{size:>9} {elapsed:7.2f} с {report['comparisons']:>11} {size * (size - 1) // 2:>14} "
+              f"{report['clusters_total']:>7} {precision:9.3f} {recall:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Микробенчмарк: извлечение контактов из страниц поисковика и проверка наборов подстрок.
+
+Страницы - сохраненные HTML выдачи DuckDuckGo из benchmarks/fixtures. Для
+каждой сравнивается прежний разбор (отдельный проход регулярного выражения
+на каждый шаблон сайта, email и телефона с re.IGNORECASE) и однопроходный
+scan_search_page; результаты обоих должны совпадать. Второй блок - проверка
+домена по списку исключений: KeywordSet, альтернация регулярного выражения
+и автомат Ахо-Корасик на Python.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_extraction --repeat 200
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import EXCLUDED_DOMAINS, scan_search_page  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _legacy_scan(content: str, company_keywords: List[str]) -> Dict[str, str]:
+    """Разбор страницы до перехода на scan_search_page (без печати)"""
+    results = {"website": "", "email": "", "phone": ""}
+    website_patterns = [
+        r'https?://(?:www\.)?([a-z0-9\-]+\.(?:ru|com|org|net|io|co))',
+        r'www\.([a-z0-9\-]+\.(?:ru|com|org|net|io|co))',
+        r'([a-z0-9\-]+\.(?:ru|com|org|net|io|co))',
+    ]
+    email_pattern = r'\b([a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,})\b'
+    phone_patterns = [
+        r'\+7\s?\(?\d{3}\)?\s?\d{3}[- ]?\d{2}[- ]?\d{2}',
+        r'\+7\s?\d{10}',
+        r'8\s?\(?\d{3}\)?\s?\d{3}[- ]?\d{2}[- ]?\d{2}',
+    ]
+    excluded_domains = [
+        'google', 'yandex', 'duckduckgo', 'facebook', 'twitter', 'linkedin',
+        'w3.org', 'wikipedia', 'wikimedia', 'github', 'stackoverflow',
+        'reddit', 'youtube', 'instagram', 'vk.com', 'ok.ru',
+        'mail.ru', 'rambler', 'livejournal', 'habr', 'geektimes'
+    ]
+    for pattern in website_patterns:
+        for match in re.finditer(pattern, content, re.IGNORECASE):
+            website = match.group(1)
+            website_lower = website.lower()
+            if any(skip in website_lower for skip in excluded_domains):
+                continue
+            is_relevant = any(kw in website_lower for kw in company_keywords) if company_keywords else True
+            if is_relevant or not results["website"]:
+                results["website"] = 'https://' + website
+                if is_relevant:
+                    break
+        if results["website"] and any(kw in results["website"].lower() for kw in company_keywords):
+            break
+    for match in re.finditer(email_pattern, content, re.IGNORECASE):
+        email = match.group(1)
+        if not any(skip in email.lower() for skip in ['example', 'test', 'sample', 'placeholder']):
+            results["email"] = email
+            break
+    for pattern in phone_patterns:
+        phone_match = re.search(pattern, content, re.IGNORECASE)
+        if phone_match:
+            phone = phone_match.group(0).strip()
+            phone_clean = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
+            if not any(p in phone_clean for p in ['1234567', '0000000', '1111111']):
+                results["phone"] = phone
+                break
+    return {field: value.lower() for field, value in results.items() if value}
+
+
+class _AhoCorasick:
+    """Автомат Ахо-Корасик на словарях Python - для сравнения с KeywordSet"""
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [False]
+        for word in words:
+            node = 0
+            for ch in word:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(False)
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.out[node] = True
+        queue = list(self.goto[0].values())
+        while queue:
+            node = queue.pop(0)
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0) if self.goto[state].get(ch, 0) != child else 0
+                self.out[child] = self.out[child] or self.out[self.fail[child]]
+
+    def found_in(self, text: str) -> bool:
+        node = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                return True
+        return False
+
+
+def _timed(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    keywords = ["алмазгеобур", "almazgeobur"]
+    print(f"{'страница':<30} {'KB':>6} {'прежний разбор':>16} {'один проход':>14} {'ускорение':>10}")
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        legacy = _legacy_scan(content, keywords)
+        single_pass = scan_search_page(content, keywords)
+        if legacy != single_pass:
+            print(f"⚠️ {os.path.basename(path)}: результаты расходятся: {legacy} != {single_pass}")
+        legacy_time = _timed(lambda: _legacy_scan(content, keywords), args.repeat)
+        single_time = _timed(lambda: scan_search_page(content, keywords), args.repeat)
+        print(f"{os.path.basename(path):<30} {len(content) / 1024:6.1f} {legacy_time * 1000:13.2f} ms "
+              f"{single_time * 1000:11.2f} ms {legacy_time / single_time:9.1f}x")
+
+    domains = ["almazgeobur.ru", "ru.wikipedia.org", "drillparts.com", "yandex.ru", "geotools.net"]
+    with open(os.path.join(FIXTURES_DIR, "ddg_company_found.html"), encoding="utf-8") as f:
+        page = f.read().lower()
+    alternation = re.compile("|".join(re.escape(word) for word in EXCLUDED_DOMAINS.words))
+    automaton = _AhoCorasick(EXCLUDED_DOMAINS.words)
+    checks = [
+        ("KeywordSet", EXCLUDED_DOMAINS.found_in),
+        ("альтернация re", lambda text: alternation.search(text) is not None),
+        ("Ахо-Корасик на Python", automaton.found_in),
+    ]
+    print(f"\nПроверка по {len(EXCLUDED_DOMAINS.words)} исключаемым доменам: {len(domains)} доменов, страница без совпадений")
+    no_match_page = page
+    for word in EXCLUDED_DOMAINS.words:
+        no_match_page = no_match_page.replace(word, "")
+    for label, check in checks:
+        assert [check(domain) for domain in domains] == [EXCLUDED_DOMAINS.found_in(domain) for domain in domains]
+        short = _timed(lambda: [check(domain) for domain in domains], args.repeat * 100)
+        long = _timed(lambda: check(no_match_page), args.repeat)
+        print(f"{label:<24} {short * 1e6:8.2f} мкс {long * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Бенчмарк: новый httpx.AsyncClient на каждый вызов против общего пула соединений.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_http_pool --calls 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import start_stub_server  # noqa: E402
+
+
+def _report(label: str, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<28} mean={statistics.mean(samples) * 1000:7.2f} ms  "
+          f"p50={statistics.median(samples) * 1000:7.2f} ms  p95={p95 * 1000:7.2f} ms")
+
+
+async def _per_call_client(base_url: str, calls: int):
+    """Старое поведение: клиент (и соединение) создается на каждый запрос"""
+    samples = []
+    payload = {"model": "gpt-4o", "messages": [{"role": "user", "content": "ping"}]}
+    for _ in range(calls):
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            response = await client.post(f"{base_url}/chat/completions", json=payload)
+            response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def _pooled_client(base_url: str, calls: int):
+    """Новое поведение: PolzaAIClient через общий HTTPClientPool"""
+    os.environ["POLZA_BASE_URL"] = base_url
+    from polza_client import PolzaAIClient
+
+    client = PolzaAIClient()
+    samples = []
+    try:
+        for _ in range(calls):
+            started = time.perf_counter()
+            await client._make_request("ping", max_tokens=10)
+            samples.append(time.perf_counter() - started)
+    finally:
+        await client.aclose()
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    try:
+        before = await _per_call_client(base_url, args.calls)
+        after = await _pooled_client(base_url, args.calls)
+    finally:
+        server.shutdown()
+
+    print(f"Stub: {base_url}, вызовов: {args.calls}")
+    _report("до (клиент на вызов)", before)
+    _report("после (общий пул)", after)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
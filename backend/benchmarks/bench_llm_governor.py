@@ -0,0 +1,71 @@
+"""Бенчмарк: задержка интерактивного запроса к LLM на фоне массового обогащения.
+
+Фоновые вызовы заполняют очередь регулятора (LLMGovernor) сверх лимита
+одновременных запросов, после чего отправляется интерактивный запрос.
+Сравнивается ожидание без приоритета (все вызовы фоновые) и с приоритетом.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_llm_governor --bulk 40 --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import start_stub_server  # noqa: E402
+
+
+async def _interactive_latency(bulk: int, concurrency: int, prioritized: bool) -> float:
+    from llm_governor import BULK, INTERACTIVE, LLMGovernor, llm_priority
+    from polza_client import PolzaAIClient
+
+    client = PolzaAIClient()
+    client.llm_governor = LLMGovernor(default_rpm=0, default_tpm=0, default_concurrency=concurrency)
+
+    async def call(priority: int):
+        with llm_priority(priority):
+            await client._make_request("ping", max_tokens=10)
+
+    try:
+        background = [asyncio.create_task(call(BULK)) for _ in range(bulk)]
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        await call(INTERACTIVE if prioritized else BULK)
+        latency = time.perf_counter() - started
+        await asyncio.gather(*background)
+    finally:
+        await client.aclose()
+    return latency
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bulk", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.05, help="задержка ответа stub-сервера, сек")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(delay=args.delay)
+    os.environ["POLZA_BASE_URL"] = base_url
+    real_stdout = sys.stdout
+    try:
+        sys.stdout = open(os.devnull, "w")
+        try:
+            fifo = await _interactive_latency(args.bulk, args.concurrency, prioritized=False)
+            prioritized = await _interactive_latency(args.bulk, args.concurrency, prioritized=True)
+        finally:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+    finally:
+        server.shutdown()
+
+    print(f"Stub: {base_url}, фоновых вызовов: {args.bulk}, одновременно: {args.concurrency}, ответ: {args.delay * 1000:.0f} ms")
+    print(f"{'без приоритета (общая очередь)':<34} {fifo * 1000:8.1f} ms")
+    print(f"{'интерактивный приоритет':<34} {prioritized * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""Бенчмарк SMTPSender против локального SMTP-сервера aiosmtpd (pip install aiosmtpd).
+
+Сравнивает соединение на каждое письмо с переиспользованием соединения пулом воркеров.
+Запуск из каталога backend:
+    python -m benchmarks.bench_mailer --messages 500 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from mailer import SMTPSender  # noqa: E402
+
+
+class _CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run(port: int, messages, workers: int, batch_size: int) -> float:
+    sender = SMTPSender(host="127.0.0.1", port=port, username="", password="", use_tls=False, use_ssl=False,
+                        from_address="bench@localhost", workers=workers, batch_size=batch_size,
+                        default_rate=0, retry_base_delay=0.01)
+    started = time.perf_counter()
+    counts = await sender.send_all(messages)
+    elapsed = time.perf_counter() - started
+    assert counts["failed"] == 0, counts
+    return len(messages) / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    handler = _CountingHandler()
+    port = _free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    messages = [
+        {"to": f"user{i}@example{i % 10}.com", "subject": "Тест", "body": "Текст письма " * 20}
+        for i in range(args.messages)
+    ]
+    try:
+        per_message = await _run(port, messages, workers=1, batch_size=1)
+        reused = await _run(port, messages, workers=1, batch_size=args.messages)
+        pooled = await _run(port, messages, workers=args.workers, batch_size=args.messages)
+    finally:
+        controller.stop()
+
+    print(f"Писем: {args.messages}, принято сервером: {handler.received}")
+    rows = [
+        ("соединение на письмо, 1 воркер", per_message),
+        ("одно соединение, 1 воркер", reused),
+        (f"одно соединение на воркер, {args.workers} воркера", pooled),
+    ]
+    for label, rate in rows:
+        print(f"{label:<42} {rate:8.1f} писем/с")
+
+if __name__ == "__main__":
+    asyncio.run(main())
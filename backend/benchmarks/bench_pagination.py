@@ -0,0 +1,102 @@
+"""Бенчмарк: время выдачи страницы истории поисков на разной глубине, OFFSET против курсора.
+
+Таблица search_logs заполняется синтетическими записями, затем страница из
+--limit записей (от новых к старым, как в GET /search-logs) читается через
+pagination.paginate с skip и с курсором, указывающим на ту же позицию. OFFSET
+пропускает все предыдущие строки, курсор читает индекс (created_at, id) с
+нужного места.
+
+БД берется из DATABASE_URL, по умолчанию - временный файл SQLite (нужен aiosqlite).
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_pagination --rows 500000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _seed(rows: int):
+    from database import SearchLog, SessionLocal, create_tables
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        existing = db.query(SearchLog).count()
+        started = datetime(2025, 1, 1)
+        for start in range(existing, rows, 20000):
+            db.bulk_insert_mappings(SearchLog, [
+                # Несколько записей в одну секунду - курсор различает их по id
+                {"search_type": "company", "query": f"компания {index}", "results_count": index % 2,
+                 "created_at": started + timedelta(seconds=index // 3)}
+                for index in range(start, min(start + 20000, rows))
+            ])
+            db.commit()
+    finally:
+        db.close()
+
+
+async def _timed(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_pagination.db')}"
+
+    from sqlalchemy import select
+    from database import DATABASE_URL, AsyncSessionLocal, SearchLog
+    from pagination import encode_cursor, paginate
+
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        _seed(args.rows)
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    keys = (SearchLog.created_at, SearchLog.id)
+    print(f"БД: {DATABASE_URL}, записей: {args.rows}, страница: {args.limit}")
+    print(f"{'глубина':>10} {'OFFSET':>10} {'курсор':>10} {'ускорение':>10}")
+    async with AsyncSessionLocal() as db:
+        for fraction in (0.0, 0.1, 0.5, 0.9):
+            skip = int(args.rows * fraction)
+            cursor = None
+            if skip:
+                # Курсор на ту же позицию - значения последней строки предыдущей страницы
+                previous = await db.scalar(
+                    select(SearchLog).order_by(SearchLog.created_at.desc(), SearchLog.id.desc()).offset(skip - 1).limit(1)
+                )
+                cursor = encode_cursor({"after": [previous.created_at.isoformat(), previous.id]})
+            offset_rows, _ = await paginate(db, select(SearchLog), args.limit, keys=keys, skip=skip, descending=True)
+            cursor_rows, _ = await paginate(db, select(SearchLog), args.limit, keys=keys, cursor=cursor, descending=True)
+            if [row.id for row in offset_rows] != [row.id for row in cursor_rows]:
+                print(f"⚠️ глубина {skip}: страницы OFFSET и курсора расходятся")
+            offset_time = await _timed(
+                lambda: paginate(db, select(SearchLog), args.limit, keys=keys, skip=skip, descending=True), args.repeat)
+            cursor_time = await _timed(
+                lambda: paginate(db, select(SearchLog), args.limit, keys=keys, cursor=cursor, descending=True), args.repeat)
+            print(f"{skip:>10} {offset_time * 1000:7.1f} ms {cursor_time * 1000:7.1f} ms {offset_time / cursor_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Бенчмарк: политика повторов и circuit breaker против stub-сервера с внесением отказов.
+
+Сценарии: часть ответов 503, лимит 429 с Retry-After, полный отказ upstream
+(с circuit breaker и без него). Для каждого выводятся доля успешных запросов,
+обращений к upstream на запрос, отклоненных без обращения (fail fast) и
+состояние цепи.
+
+Запуск из каталога backend:
+    python -m benchmarks.bench_resilience --requests 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import FaultInjectingHandler, fault_settings, start_stub_server  # noqa: E402
+
+
+async def _run_scenario(label: str, faults, requests: int, breaker_enabled: bool = True) -> str:
+    from polza_client import PolzaAIClient
+    from resilience import CircuitBreaker, CircuitOpenError, UpstreamPolicy, retry_budget
+
+    # Короткие паузы, чтобы сценарий укладывался в секунды; логика та же, что в приложении
+    breaker = CircuitBreaker("polza", min_calls=10 if breaker_enabled else 10 ** 9, window=30, open_seconds=60)
+    client = PolzaAIClient()
+    client.upstream_policies["polza"] = UpstreamPolicy("polza", max_attempts=3, base_delay=0.02, max_delay=1.0,
+                                                       breaker=breaker)
+    counts = {"ok": 0, "failed": 0, "fail_fast": 0}
+    faults["requests"] = 0
+    started = time.perf_counter()
+    try:
+        for _ in range(requests):
+            with retry_budget(4):
+                try:
+                    await client._make_request("ping", max_tokens=10, retry_count=3)
+                    counts["ok"] += 1
+                except CircuitOpenError:
+                    counts["fail_fast"] += 1
+                except (httpx.HTTPError, ValueError):
+                    counts["failed"] += 1
+    finally:
+        await client.aclose()
+    elapsed = time.perf_counter() - started
+    return (f"{label:<34} успешно={counts['ok'] / requests:6.1%}  ошибок={counts['failed']:4d}  "
+            f"fail-fast={counts['fail_fast']:4d}  upstream/запрос={faults['requests'] / requests:5.2f}  "
+            f"время={elapsed:6.2f} с  цепь={breaker.state}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+
+    faults = fault_settings()
+    server, base_url = start_stub_server(handler_class=FaultInjectingHandler, faults=faults)
+    os.environ["POLZA_BASE_URL"] = base_url
+    # Печать каждого запроса и повтора заглушаем, оставляя только итоги
+    real_stdout = sys.stdout
+    try:
+        scenarios = [
+            ("30% ответов 503", dict(failure_rate=0.3, status=503, retry_after=None, outage=False), True),
+            ("20% ответов 429, Retry-After: 0.1", dict(failure_rate=0.2, status=429, retry_after=0.1, outage=False), True),
+            ("отказ upstream, без breaker", dict(failure_rate=0.0, status=503, retry_after=None, outage=True), False),
+            ("отказ upstream, с breaker", dict(failure_rate=0.0, status=503, retry_after=None, outage=True), True),
+        ]
+        print(f"Stub: {base_url}, запросов в сценарии: {args.requests}")
+        for label, settings, breaker_enabled in scenarios:
+            faults.update(settings)
+            sys.stdout = open(os.devnull, "w")
+            try:
+                line = await _run_scenario(label, faults, args.requests, breaker_enabled)
+            finally:
+                sys.stdout.close()
+                sys.stdout = real_stdout
+            print(line)
+    finally:
+        sys.stdout = real_stdout
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
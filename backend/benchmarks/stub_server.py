@@ -0,0 +1,77 @@
+"""Локальный stub-сервер, имитирующий Polza.AI /chat/completions для бенчмарков"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive между запросами
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024  # заголовки и тело уходят одним пакетом
+    delay = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.delay:
+            time.sleep(self.delay)
+        body = json.dumps({
+            "choices": [{"message": {"role": "assistant", "content": '{"description": "stub"}'}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            "model": payload.get("model", "stub"),
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FaultInjectingHandler(_StubHandler):
+    """Stub с внесением отказов: параметры берутся из общего словаря faults на каждый запрос.
+
+    failure_rate - доля ответов с кодом status; retry_after - заголовок Retry-After
+    для отказов; outage - все запросы завершаются отказом. В faults["requests"]
+    считается число полученных запросов.
+    """
+    faults = None
+
+    def do_POST(self):
+        faults = self.faults
+        with faults["lock"]:
+            faults["requests"] += 1
+        if faults.get("outage") or random.random() < faults.get("failure_rate", 0.0):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            body = b'{"error": {"message": "injected fault"}}'
+            self.send_response(faults.get("status", 503))
+            if faults.get("retry_after") is not None:
+                self.send_header("Retry-After", str(faults["retry_after"]))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_POST()
+
+
+def fault_settings(failure_rate: float = 0.0, status: int = 503, retry_after: float = None, outage: bool = False):
+    """Изменяемые параметры отказов для FaultInjectingHandler"""
+    return {"failure_rate": failure_rate, "status": status, "retry_after": retry_after, "outage": outage,
+            "requests": 0, "lock": threading.Lock()}
+
+
+def start_stub_server(delay: float = 0.0, handler_class=_StubHandler, **attrs):
+    """Запускает stub-сервер в фоновом потоке, возвращает (server, base_url)"""
+    handler = type("StubHandler", (handler_class,), {"delay": delay, **attrs})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/v1"
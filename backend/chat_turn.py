@@ -0,0 +1,114 @@
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class ChatTurn:
+    """Состояние одного хода чата (одного запроса /chat/dialog).
+
+    Хранит компании, уже найденные за этот ход, чтобы эндпоинт (команда
+    "найди и сохрани") и построение контекста для LLM не искали одну и ту же
+    компанию дважды, и считает обращения к upstream за ход.
+    """
+
+    def __init__(self):
+        self.companies: Dict[str, Dict[str, Any]] = {}
+        self.upstream_calls: Dict[str, int] = defaultdict(int)
+        self.lookups = {"requested": 0, "reused": 0}
+
+    def known_company(self, key: str) -> Optional[Dict[str, Any]]:
+        self.lookups["requested"] += 1
+        info = self.companies.get(key)
+        if info is not None:
+            self.lookups["reused"] += 1
+        return info
+
+    def remember_company(self, key: str, info: Dict[str, Any]):
+        self.companies[key] = info
+
+    def record_upstream_call(self, upstream: str):
+        self.upstream_calls[upstream] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"upstream_calls": dict(self.upstream_calls), "company_lookups": dict(self.lookups)}
+
+
+class SharedChatTurns:
+    """Ходы чата, которые ждут одну общую работу (SingleFlight).
+
+    Общая задача выполняется вне контекста хода, поэтому ее обращения к
+    upstream учитываются здесь - в каждом присоединенном ходе, в том числе
+    присоединившемся после части обращений.
+    """
+
+    def __init__(self):
+        self.turns: List[ChatTurn] = []
+        self.upstream_calls: Dict[str, int] = defaultdict(int)
+
+    def attach(self, turn: Optional[ChatTurn]):
+        if turn is None or any(attached is turn for attached in self.turns):
+            return
+        self.turns.append(turn)
+        for upstream, count in self.upstream_calls.items():
+            turn.upstream_calls[upstream] += count
+
+    def record_upstream_call(self, upstream: str):
+        self.upstream_calls[upstream] += 1
+        for turn in self.turns:
+            turn.record_upstream_call(upstream)
+
+
+_current_turn: contextvars.ContextVar[Optional[ChatTurn]] = contextvars.ContextVar("chat_turn", default=None)
+_shared_turns: contextvars.ContextVar[Optional[SharedChatTurns]] = contextvars.ContextVar("shared_chat_turns", default=None)
+
+
+def current_chat_turn() -> Optional[ChatTurn]:
+    """Текущий ход чата; задачи asyncio, созданные внутри хода, видят его же"""
+    return _current_turn.get()
+
+
+def current_chat_turns() -> List[ChatTurn]:
+    """Ходы чата, к которым относится текущая работа: текущий ход или все ходы, ждущие общую работу"""
+    shared = _shared_turns.get()
+    if shared is not None:
+        return list(shared.turns)
+    turn = _current_turn.get()
+    return [turn] if turn is not None else []
+
+
+def record_upstream_call(upstream: str):
+    """Учитывает обращение к upstream в текущем ходе чата или во всех ходах, ждущих общую работу"""
+    shared = _shared_turns.get()
+    if shared is not None:
+        shared.record_upstream_call(upstream)
+        return
+    turn = _current_turn.get()
+    if turn is not None:
+        turn.record_upstream_call(upstream)
+
+
+@contextmanager
+def shared_chat_turns(shared: SharedChatTurns) -> Iterator[SharedChatTurns]:
+    token = _shared_turns.set(shared)
+    try:
+        yield shared
+    finally:
+        try:
+            _shared_turns.reset(token)
+        except ValueError:
+            pass
+
+
+@contextmanager
+def chat_turn() -> Iterator[ChatTurn]:
+    turn = ChatTurn()
+    token = _current_turn.set(turn)
+    try:
+        yield turn
+    finally:
+        try:
+            _current_turn.reset(token)
+        except ValueError:
+            # Потоковый ответ закрыт из другого контекста (клиент оборвал соединение) - там ход не установлен
+            pass
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from database import SessionLocal, CompanyInfoCacheEntry
+
+
+class CompanyInfoCache:
+    """Двухуровневый кэш результатов search_company_info.
+
+    Первый уровень - LRU в памяти процесса с ограничением по размеру, второй -
+    таблица company_info_cache в Postgres, которая переживает перезапуск.
+    Ключ - нормализованное название компании (normalize_company_name).
+    """
+
+    def __init__(self, ttl: float = None, max_size: int = None, persistent: bool = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("COMPANY_CACHE_TTL", "86400"))
+        self.max_size = max_size if max_size is not None else int(os.getenv("COMPANY_CACHE_MAX_SIZE", "1000"))
+        if persistent is None:
+            persistent = os.getenv("COMPANY_CACHE_PERSISTENT", "true").lower() in ("1", "true", "yes", "on")
+        self.persistent = persistent
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.counters = {"hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "db_errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _load_from_db(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        db = SessionLocal()
+        try:
+            entry = db.query(CompanyInfoCacheEntry).filter(
+                CompanyInfoCacheEntry.normalized_name == key,
+                CompanyInfoCacheEntry.expires_at > datetime.utcnow()
+            ).first()
+            if entry is None:
+                return None
+            remaining = (entry.expires_at - datetime.utcnow()).total_seconds()
+            return time.monotonic() + remaining, json.loads(entry.data)
+        finally:
+            db.close()
+
+    def _save_to_db(self, key: str, company_name: str, value: Dict[str, Any]):
+        db = SessionLocal()
+        try:
+            expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+            data = json.dumps(value, ensure_ascii=False)
+            entry = db.query(CompanyInfoCacheEntry).filter(CompanyInfoCacheEntry.normalized_name == key).first()
+            if entry is None:
+                db.add(CompanyInfoCacheEntry(normalized_name=key, company_name=company_name, data=data, expires_at=expires_at))
+            else:
+                entry.company_name = company_name
+                entry.data = data
+                entry.created_at = datetime.utcnow()
+                entry.expires_at = expires_at
+            db.commit()
+        finally:
+            db.close()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+
+        cached = self._entries.get(key)
+        if cached is not None:
+            expires_at, value = cached
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return dict(value)
+            del self._entries[key]
+
+        if self.persistent:
+            try:
+                loaded = await asyncio.to_thread(self._load_from_db, key)
+            except Exception as e:
+                self.counters["db_errors"] += 1
+                print(f"⚠️ Ошибка чтения кэша компаний из БД: {e}")
+                loaded = None
+            if loaded is not None:
+                expires_at, value = loaded
+                self._remember(key, value, expires_at)
+                self.counters["db_hits"] += 1
+                return dict(value)
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, company_name: str, value: Dict[str, Any]):
+        if not self.enabled:
+            return
+        self._remember(key, dict(value), time.monotonic() + self.ttl)
+        self.counters["stores"] += 1
+        if self.persistent:
+            try:
+                await asyncio.to_thread(self._save_to_db, key, company_name, value)
+            except Exception as e:
+                self.counters["db_errors"] += 1
+                print(f"⚠️ Ошибка записи кэша компаний в БД: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["db_hits"] + self.counters["misses"]
+        hit_ratio = (self.counters["hits"] + self.counters["db_hits"]) / lookups if lookups else 0.0
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "persistent": self.persistent,
+            "hit_ratio": round(hit_ratio, 4),
+        }
@@ -0,0 +1,67 @@
+"""Серверный поиск по таблице companies: полнотекстовый и триграммный в Postgres, LIKE в остальных БД"""
+from typing import List, Optional
+
+from sqlalchemy import case, func, literal_column, or_, select
+from sqlalchemy.sql import ColumnElement, Select
+
+from database import COMPANY_SEARCH_CONFIG, Company
+
+# Короче трех символов триграммный индекс не используется - такие строки ищутся только по словам
+MIN_SUBSTRING_LENGTH = 3
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def company_filters(has_email: Optional[bool] = None, verified: Optional[bool] = None,
+                    language: Optional[str] = None) -> List[ColumnElement]:
+    """Условия фильтров списка компаний; None - фильтр не задан"""
+    conditions = []
+    if has_email is not None:
+        with_email = (Company.email.isnot(None)) & (Company.email != "")
+        conditions.append(with_email if has_email else ~with_email)
+    if verified is not None:
+        conditions.append(Company.is_verified.is_(True) if verified else Company.is_verified.isnot(True))
+    if language:
+        if language == "ru":
+            # Язык не указан - рассылка идет на русском
+            conditions.append(or_(Company.preferred_language == "ru", Company.preferred_language.is_(None)))
+        else:
+            conditions.append(Company.preferred_language == language)
+    return conditions
+
+
+def search_companies_query(query: str, dialect_name: str, has_email: Optional[bool] = None,
+                           verified: Optional[bool] = None, language: Optional[str] = None) -> Select:
+    """SELECT компаний по строке поиска с фильтрами, лучшие совпадения первыми.
+
+    В Postgres строка разбирается websearch_to_tsquery (поддерживает кавычки,
+    "or" и "-слово") и сопоставляется с companies.search_vector; подстрока
+    названия ищется ILIKE по триграммному индексу. Ранг - ts_rank_cd с весами
+    полей плюс триграммная похожесть названия. В других БД (SQLite для
+    разработки) - LIKE по тем же полям, совпадения в названии первыми; lower()
+    в SQLite не меняет регистр кириллицы.
+    Без строки поиска - только фильтры, порядок по id.
+    """
+    statement = select(Company).where(*company_filters(has_email, verified, language))
+    query = (query or "").strip()
+    if not query:
+        return statement.order_by(Company.id)
+
+    pattern = _like_pattern(query)
+    if dialect_name == "postgresql":
+        search_vector = literal_column("companies.search_vector")
+        ts_query = func.websearch_to_tsquery(literal_column(f"'{COMPANY_SEARCH_CONFIG}'::regconfig"), query)
+        matches = [search_vector.op("@@")(ts_query)]
+        if len(query) >= MIN_SUBSTRING_LENGTH:
+            matches.append(Company.name.ilike(pattern, escape="\\"))
+        rank = func.ts_rank_cd(search_vector, ts_query) + func.similarity(Company.name, query)
+        return statement.where(or_(*matches)).order_by(rank.desc(), Company.id.desc())
+
+    fields = [Company.name, Company.equipment_purchased, Company.description, Company.address]
+    rank = case(*[(field.ilike(pattern, escape="\\"), weight) for weight, field in enumerate(fields)], else_=len(fields))
+    return (statement
+            .where(or_(*[field.ilike(pattern, escape="\\") for field in fields]))
+            .order_by(rank, Company.id.desc()))
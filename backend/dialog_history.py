@@ -0,0 +1,108 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Dialog, DialogMessage
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов сообщения: ~3 символа на токен для смеси
+    кириллицы и латиницы плюс служебная разметка сообщения"""
+    return len(text or "") // 3 + 4
+
+
+def message_dict(message: DialogMessage) -> Dict[str, Any]:
+    return {"id": message.id, "role": message.role, "content": message.content,
+            "timestamp": message.created_at.isoformat()}
+
+
+async def add_dialog_message(db: AsyncSession, dialog: Dialog, role: str, content: str) -> DialogMessage:
+    message = DialogMessage(dialog_id=dialog.id, role=role, content=content, token_count=estimate_tokens(content))
+    db.add(message)
+    dialog.updated_at = datetime.utcnow()
+    await db.commit()
+    await db.refresh(message)
+    return message
+
+
+async def get_or_create_dialog(db: AsyncSession, dialog_id: Optional[int], first_message: str,
+                              conversation_history: List[Dict[str, Any]] = None) -> Dialog:
+    """Диалог для сообщения чата; новый диалог получает название по первому сообщению.
+
+    conversation_history от клиентов, которые еще хранят историю у себя,
+    переносится в новый диалог один раз - дальше история берется из БД.
+    """
+    dialog = await db.get(Dialog, dialog_id) if dialog_id else None
+    if dialog is not None:
+        return dialog
+    if dialog_id:
+        print(f"⚠️ Диалог {dialog_id} не найден, создаем новый")
+
+    title = first_message.strip().splitlines()[0][:60] if first_message.strip() else "Новый диалог"
+    dialog = Dialog(title=title)
+    db.add(dialog)
+    await db.flush()
+    for msg in conversation_history or []:
+        content = msg.get("content", "")
+        if content:
+            db.add(DialogMessage(dialog_id=dialog.id, role=msg.get("role", "user"), content=content,
+                                 token_count=estimate_tokens(content)))
+    await db.commit()
+    await db.refresh(dialog)
+    return dialog
+
+
+class DialogHistoryWindow:
+    """История диалога для LLM в пределах бюджета токенов.
+
+    Последние сообщения передаются как есть, пока укладываются в token_budget,
+    более старые сворачиваются в резюме. Резюме обновляется инкрементально
+    (прошлое резюме + вытесненные сообщения) и хранится в dialogs.summary.
+    При переполнении окно ужимается до половины бюджета, поэтому резюме
+    пересчитывается раз в несколько ходов, а не на каждом сообщении.
+    """
+
+    def __init__(self, polza_client, token_budget: int = None, min_recent: int = None):
+        self.polza_client = polza_client
+        self.token_budget = token_budget or int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+        self.min_recent = min_recent if min_recent is not None else int(os.getenv("CHAT_HISTORY_MIN_RECENT", "2"))
+
+    async def build(self, db: AsyncSession, dialog: Dialog) -> List[Dict[str, str]]:
+        """conversation_history для chat_with_llm: резюме (если есть) и последние сообщения"""
+        messages = (await db.execute(
+            select(DialogMessage)
+            .where(DialogMessage.dialog_id == dialog.id, DialogMessage.id > (dialog.summarized_until or 0))
+            .order_by(DialogMessage.id)
+        )).scalars().all()
+
+        if sum(message.token_count or 0 for message in messages) > self.token_budget and len(messages) > self.min_recent:
+            # Оставляем свежие сообщения на половину бюджета (но не меньше min_recent), остальное - в резюме
+            split, kept_tokens = len(messages), 0
+            while split > 0:
+                cost = messages[split - 1].token_count or 0
+                if len(messages) - split >= self.min_recent and kept_tokens + cost > self.token_budget // 2:
+                    break
+                kept_tokens += cost
+                split -= 1
+            older, messages = messages[:split], messages[split:]
+            if older:
+                summary = await self.polza_client.summarize_conversation(
+                    [{"role": message.role, "content": message.content} for message in older],
+                    previous_summary=dialog.summary
+                )
+                if summary:
+                    dialog.summary = summary
+                    dialog.summarized_until = older[-1].id
+                    await db.commit()
+                else:
+                    # Старые сообщения не попадут в этот запрос, но останутся для следующей попытки резюме
+                    print(f"⚠️ Не удалось обновить резюме диалога {dialog.id}, отправляем только последние сообщения")
+
+        history = []
+        if dialog.summary:
+            history.append({"role": "system", "content": f"Краткое резюме предыдущей части диалога:\n{dialog.summary}"})
+        history.extend({"role": message.role, "content": message.content} for message in messages)
+        return history
@@ -0,0 +1,262 @@
+import asyncio
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import EmailVerification
+from singleflight import SingleFlight
+
+MXResult = Tuple[Optional[bool], Optional[str]]  # (есть MX записи или None - DNS не ответил, сообщение об ошибке)
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+def is_valid_email_format(email: str) -> bool:
+    return bool(EMAIL_PATTERN.match(email))
+
+
+def email_domain(email: str) -> str:
+    return email.strip().lower().rsplit('@', 1)[-1]
+
+
+def mx_verification_status(has_mx: Optional[bool]) -> str:
+    """verification_status по результату MXResolver.check: временная ошибка DNS - "failed", а не "invalid" """
+    if has_mx is None:
+        return "failed"
+    return "verified" if has_mx else "invalid"
+
+
+class MXResolver:
+    """Асинхронная проверка MX записей домена с кэшем.
+
+    Положительные ответы кэшируются на TTL из DNS (в пределах min/max),
+    отрицательные (NXDOMAIN, нет MX) - на negative_ttl. Временные ошибки
+    (таймаут, недоступный DNS) не кэшируются и возвращаются как (None, ...):
+    домен не проверен, а не отсутствует. Одновременные запросы одного
+    домена объединяются, поэтому домен резолвится один раз на пачку адресов.
+    """
+
+    def __init__(self, timeout: float = None, negative_ttl: float = None, min_ttl: float = None,
+                 max_ttl: float = None, concurrency: int = None):
+        self.timeout = timeout if timeout is not None else float(os.getenv("DNS_TIMEOUT", "5"))
+        self.negative_ttl = negative_ttl if negative_ttl is not None else float(os.getenv("DNS_NEGATIVE_TTL", "600"))
+        self.min_ttl = min_ttl if min_ttl is not None else float(os.getenv("DNS_MIN_TTL", "60"))
+        self.max_ttl = max_ttl if max_ttl is not None else float(os.getenv("DNS_MAX_TTL", "86400"))
+        self.concurrency = concurrency or int(os.getenv("DNS_CONCURRENCY", "50"))
+        self._resolver: Optional[dns.asyncresolver.Resolver] = None
+        self._cache: Dict[str, Tuple[float, MXResult]] = {}
+        self._lookups = SingleFlight("mx_lookup")
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.counters = {"hits": 0, "negative_hits": 0, "misses": 0, "errors": 0}
+
+    def _get_resolver(self) -> dns.asyncresolver.Resolver:
+        if self._resolver is None:
+            self._resolver = dns.asyncresolver.Resolver()
+            self._resolver.lifetime = self.timeout
+        return self._resolver
+
+    async def _resolve(self, domain: str) -> MXResult:
+        async with self._semaphore:
+            try:
+                answer = await self._get_resolver().resolve(domain, "MX")
+                ttl = min(self.max_ttl, max(self.min_ttl, answer.rrset.ttl if answer.rrset is not None else self.min_ttl))
+                result = (len(answer) > 0, None)
+                self._cache[domain] = (time.monotonic() + ttl, result)
+                return result
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                result = (False, "Домен не найден или не имеет MX записей")
+                self._cache[domain] = (time.monotonic() + self.negative_ttl, result)
+                return result
+            except (dns.exception.Timeout, dns.resolver.NoNameservers):
+                self.counters["errors"] += 1
+                return None, "DNS не ответил, проверка домена будет повторена позже"
+            except Exception as e:
+                self.counters["errors"] += 1
+                return None, f"Ошибка при проверке домена: {str(e)}"
+
+    async def check(self, domain: str) -> MXResult:
+        domain = domain.strip().lower().rstrip(".")
+        cached = self._cache.get(domain)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self.counters["hits" if result[0] else "negative_hits"] += 1
+                return result
+            del self._cache[domain]
+
+        self.counters["misses"] += 1
+        return await self._lookups.do(domain, lambda: self._resolve(domain))
+
+    async def prefetch(self, domains: Iterable[str]) -> Dict[str, MXResult]:
+        """Резолвит уникальные домены пачки параллельно, чтобы дальше отвечать из кэша; возвращает результаты по доменам"""
+        unique_domains = list({domain.strip().lower().rstrip(".") for domain in domains if domain})
+        results = await asyncio.gather(*(self.check(domain) for domain in unique_domains))
+        return dict(zip(unique_domains, results))
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "cached_domains": len(self._cache), "coalesced": self._lookups.counters["coalesced"]}
+
+
+class VerificationFreshnessPolicy:
+    """Сколько сохраненный результат проверки email считается актуальным.
+
+    Срок задается отдельно для каждого verification_status (в секундах):
+    подтвержденные адреса меняются редко, а ошибки проверки стоит повторить
+    быстрее. Статусы без срока (pending) всегда проверяются заново.
+    """
+
+    def __init__(self, max_age: Dict[str, float] = None):
+        self.max_age = max_age if max_age is not None else {
+            "verified": float(os.getenv("EMAIL_VERIFY_MAX_AGE_VERIFIED", "604800")),
+            "invalid": float(os.getenv("EMAIL_VERIFY_MAX_AGE_INVALID", "86400")),
+            "failed": float(os.getenv("EMAIL_VERIFY_MAX_AGE_FAILED", "3600")),
+        }
+
+    def is_fresh(self, verification: Optional[EmailVerification], now: datetime = None) -> bool:
+        if verification is None or verification.last_checked is None:
+            return False
+        max_age = self.max_age.get(verification.verification_status, 0)
+        if max_age <= 0:
+            return False
+        now = now or datetime.utcnow()
+        return (now - verification.last_checked).total_seconds() < max_age
+
+
+async def check_emails(rows: Iterable[Tuple[Optional[int], str]], resolver: MXResolver) -> List[Dict[str, Any]]:
+    """Проверка формата и MX записей без записи в БД; rows - пары (company_id, email).
+
+    Адреса нормализуются и дедуплицируются (первый company_id выигрывает),
+    домены резолвятся параллельно. Возвращает результаты по уникальным адресам.
+    """
+    company_by_email: Dict[str, Optional[int]] = {}
+    for company_id, email in rows:
+        email = (email or "").strip().lower()
+        if email and email not in company_by_email:
+            company_by_email[email] = company_id
+
+    by_domain: Dict[str, List[str]] = defaultdict(list)
+    for email in company_by_email:
+        if is_valid_email_format(email):
+            by_domain[email_domain(email)].append(email)
+    # Результаты берутся из prefetch: временные ошибки не кэшируются, и повторный check снова ждал бы таймаута DNS
+    mx_results = await resolver.prefetch(by_domain.keys())
+
+    results: List[Dict[str, Any]] = []
+    for email in company_by_email:
+        result = {"email": email, "company_id": company_by_email[email], "is_valid": False,
+                  "is_deliverable": False, "verification_status": "invalid",
+                  "error_message": "Неверный формат email адреса"}
+        if is_valid_email_format(email):
+            has_mx, error_message = mx_results[email_domain(email)]
+            result.update(is_valid=True, is_deliverable=bool(has_mx), error_message=error_message,
+                          verification_status=mx_verification_status(has_mx))
+        results.append(result)
+    return results
+
+
+def store_verification_results(
+    db: Session,
+    results: List[Dict[str, Any]],
+    chunk_size: int = None,
+    commit: bool = True,
+    on_progress: Callable[[int, int], Any] = None,
+):
+    """Записывает результаты check_emails в email_verifications чанками: на чанк один
+    SELECT существующих записей, bulk UPDATE/INSERT и один коммит (commit=False -
+    без коммита, его делает вызывающий). Из AsyncSession вызывается через run_sync."""
+    chunk_size = chunk_size or int(os.getenv("EMAIL_VERIFY_CHUNK_SIZE", "500"))
+    total = len(results)
+    for start in range(0, total, chunk_size):
+        chunk = results[start:start + chunk_size]
+        now = datetime.utcnow()
+        existing_ids = dict(
+            db.query(EmailVerification.email, func.min(EmailVerification.id))
+            .filter(EmailVerification.email.in_([result["email"] for result in chunk]))
+            .group_by(EmailVerification.email)
+            .all()
+        )
+        updates, inserts = [], []
+        for result in chunk:
+            values = {
+                "is_valid": result["is_valid"],
+                "is_deliverable": result["is_deliverable"],
+                "verification_status": result["verification_status"],
+                "error_message": result["error_message"],
+                "last_checked": now,
+            }
+            if result["email"] in existing_ids:
+                updates.append({"id": existing_ids[result["email"]], **values})
+            else:
+                inserts.append({"email": result["email"], "company_id": result["company_id"], **values})
+        if updates:
+            db.bulk_update_mappings(EmailVerification, updates)
+        if inserts:
+            db.bulk_insert_mappings(EmailVerification, inserts)
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+        if on_progress is not None:
+            on_progress(min(start + chunk_size, total), total)
+
+
+async def verify_emails_batch(
+    db: AsyncSession,
+    rows: Iterable[Tuple[Optional[int], str]],
+    resolver: MXResolver,
+    chunk_size: int = None,
+    commit: bool = True,
+    on_progress: Callable[[int, int], Any] = None,
+) -> List[Dict[str, Any]]:
+    """Проверяет пачку адресов (check_emails) и записывает результаты в
+    email_verifications (store_verification_results через run_sync). Возвращает
+    результаты по уникальным адресам.
+    """
+    results = await check_emails(rows, resolver)
+    await db.run_sync(store_verification_results, results, chunk_size=chunk_size, commit=commit, on_progress=on_progress)
+    return results
+
+
+async def deliverable_emails(
+    db: AsyncSession,
+    rows: Iterable[Tuple[Optional[int], str, Optional[EmailVerification]]],
+    resolver: MXResolver,
+    policy: VerificationFreshnessPolicy,
+) -> Tuple[Dict[str, bool], Dict[str, int]]:
+    """Доставляемость адресов с учетом уже сохраненных проверок.
+
+    rows - тройки (company_id, email, последняя проверка или None). Актуальные
+    по policy результаты берутся как есть, остальные адреса перепроверяются
+    одной пачкой (check_emails и запись результатов). Возвращает email -> is_deliverable
+    и счетчики reused/rechecked.
+    """
+    now = datetime.utcnow()
+    deliverable: Dict[str, bool] = {}
+    stale: List[Tuple[Optional[int], str]] = []
+    for company_id, email, verification in rows:
+        email = (email or "").strip().lower()
+        if not email or email in deliverable:
+            continue
+        if policy.is_fresh(verification, now):
+            deliverable[email] = bool(verification.is_deliverable)
+        else:
+            deliverable[email] = False
+            stale.append((company_id, email))
+
+    reused = len(deliverable) - len(stale)
+    if stale:
+        results = await check_emails(stale, resolver)
+        await db.run_sync(store_verification_results, results)
+        for result in results:
+            deliverable[result["email"]] = result["is_deliverable"]
+    return deliverable, {"reused": reused, "rechecked": len(stale)}
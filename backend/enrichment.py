@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from llm_governor import BULK, llm_priority
+from resilience import retry_budget
+
+ResultCallback = Callable[[Dict[str, Any]], Optional[Awaitable[None]]]
+
+
+class BulkEnricher:
+    """Параллельное обогащение списка компаний через PolzaAIClient.search_company_info.
+
+    Поиск выполняют concurrency воркеров из общей очереди, поэтому одновременно
+    в работе не больше concurrency компаний, а память не растет с размером файла.
+    Частоту запросов к каждому upstream ограничивает сам клиент (upstream_limits,
+    llm_governor), так что пропускная способность растет с concurrency до лимита
+    провайдера, а вызовы LLM обогащения идут с фоновым приоритетом.
+    """
+
+    def __init__(self, polza_client, concurrency: int = None, retry_count: int = 2):
+        self.polza_client = polza_client
+        self.concurrency = max(1, concurrency or int(os.getenv("BULK_SEARCH_CONCURRENCY", "8")))
+        self.retry_count = retry_count
+        self._cancelled = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def stop(self):
+        """Останавливает выдачу компаний: новые не берутся, текущие поиски и их on_result завершаются"""
+        self._cancelled.set()
+
+    def cancel(self):
+        """Останавливает обработку: новые компании не берутся, текущие поиски прерываются"""
+        self._cancelled.set()
+        for worker in self._workers:
+            worker.cancel()
+
+    async def _lookup(self, company_name: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            # Бюджет повторов на компанию: сбой upstream не растягивает обработку каждой строки файла;
+            # фоновый приоритет - запросы чата к LLM обслуживаются раньше массового обогащения
+            with retry_budget(), llm_priority(BULK):
+                info = await self.polza_client.search_company_info(company_name, retry_count=self.retry_count)
+            return {"name": company_name, "info": info, "error": None, "elapsed": time.monotonic() - started}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Ошибка при обогащении компании '{company_name}': {e}")
+            return {"name": company_name, "info": None, "error": str(e), "elapsed": time.monotonic() - started}
+
+    async def _worker(self, queue: asyncio.Queue, on_result: Optional[ResultCallback], results: List[Dict[str, Any]]):
+        while not self._cancelled.is_set():
+            try:
+                company_name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await self._lookup(company_name)
+            results.append(result)
+            if on_result is not None:
+                callback_result = on_result(result)
+                if asyncio.iscoroutine(callback_result):
+                    await callback_result
+
+    async def run(self, company_names: Iterable[str], on_result: ResultCallback = None) -> List[Dict[str, Any]]:
+        """Обогащает компании и возвращает результаты в порядке завершения.
+
+        on_result вызывается для каждой компании сразу после поиска (может быть
+        корутиной) - например, чтобы сохранить ее в БД, не дожидаясь остальных.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for company_name in company_names:
+            queue.put_nowait(company_name)
+
+        results: List[Dict[str, Any]] = []
+        if queue.empty():
+            return results
+
+        started = time.monotonic()
+        worker_count = min(self.concurrency, queue.qsize())
+        self._workers = [
+            asyncio.create_task(self._worker(queue, on_result, results))
+            for _ in range(worker_count)
+        ]
+        try:
+            await asyncio.gather(*self._workers)
+        except asyncio.CancelledError:
+            if not self._cancelled.is_set():
+                # Отменили снаружи (например, оборвался запрос) - гасим воркеров
+                self.cancel()
+                raise
+        finally:
+            for worker in self._workers:
+                if not worker.done():
+                    worker.cancel()
+            self._workers = []
+
+        elapsed = time.monotonic() - started
+        print(f"📦 Обогащено {len(results)} компаний за {elapsed:.1f} с (параллельность {worker_count})")
+        return results
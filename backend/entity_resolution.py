@@ -0,0 +1,359 @@
+"""Поиск дубликатов компаний: блокировка по ключам и оценка похожести названий, доменов и email"""
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import Company
+from names import GENERIC_NAME_TOKENS, company_domain, company_name_tokens
+
+# Короче трех символов pg_trgm не строит триграмм - такие названия ищутся только по ключу
+MIN_TRIGRAM_NAME_LENGTH = 3
+
+
+class CompanyFeatures:
+    """Признаки компании для сравнения: ключ и слова названия (company_name_key), домен, email.
+
+    core - ключ без общих слов (GENERIC_NAME_TOKENS): у "Пласттех Инжиниринг"
+    это "plasteh"; если название состоит только из общих слов, core равен key.
+    """
+
+    __slots__ = ("id", "name", "tokens", "key", "core", "domain", "email", "_grams", "_core_grams")
+
+    def __init__(self, name: str, website: str = "", email: str = "", id: int = None):
+        self.id = id
+        self.name = name or ""
+        self.tokens = company_name_tokens(self.name)
+        self.key = "".join(self.tokens)
+        self.core = "".join(token for token in self.tokens if token not in GENERIC_NAME_TOKENS) or self.key
+        self.domain = company_domain(website, email)
+        self.email = (email or "").strip().lower()
+        self._grams = None
+        self._core_grams = None
+
+    @staticmethod
+    def _trigrams(value: str) -> frozenset:
+        padded = f"##{value}#"
+        return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    @property
+    def grams(self) -> frozenset:
+        """Триграммы ключа названия с границами слова"""
+        if self._grams is None:
+            self._grams = self._trigrams(self.key)
+        return self._grams
+
+    @property
+    def core_grams(self) -> frozenset:
+        if self._core_grams is None:
+            self._core_grams = self.grams if self.core == self.key else self._trigrams(self.core)
+        return self._core_grams
+
+
+def _dice(a: frozenset, b: frozenset) -> float:
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class EntityResolver:
+    """Поиск дубликатов компаний без сравнения всех пар.
+
+    Компания попадает в блоки по ключу названия, домену, email (точные блоки),
+    по словам названия и началу ключа (нечеткие блоки). Сравниваются только
+    компании из общего блока: в точном блоке каждая с первой, в нечетком -
+    с window соседями после сортировки по ключу, поэтому число сравнений
+    растет линейно от числа компаний. Точные блоки домена и email больше
+    max_block_size не сравниваются - это каталоги и общие адреса, а не одна
+    компания.
+
+    Оценка пары от 0 до 1: совпадение email - 1; общий домен - не ниже
+    domain_score; иначе коэффициент Дайса по триграммам ключа названия, но не
+    выше, чем по триграммам core - общее "Инжиниринг" не делает похожими
+    "Пласттех Инжиниринг" и "Пластэнер Инжиниринг". При разных доменах у обеих
+    компаний оценка умножается на domain_conflict_penalty (тезки с разными
+    сайтами). Пары не ниже match_threshold - дубликаты,
+    не ниже possible_threshold - кандидаты для ручной проверки.
+    """
+
+    domain_score = 0.95
+    domain_conflict_penalty = 0.8
+    # Не короче четырех букв: по словам "гео", "бур" блоки были бы огромными
+    min_token_length = 4
+    max_candidates = 50
+
+    def __init__(self, match_threshold: float = None, possible_threshold: float = None,
+                 max_block_size: int = None, window: int = None):
+        self.match_threshold = match_threshold if match_threshold is not None else float(os.getenv("ENTITY_MATCH_THRESHOLD", "0.85"))
+        self.possible_threshold = possible_threshold if possible_threshold is not None else float(os.getenv("ENTITY_POSSIBLE_THRESHOLD", "0.7"))
+        self.max_block_size = max_block_size if max_block_size is not None else int(os.getenv("ENTITY_MAX_BLOCK_SIZE", "100"))
+        self.window = window if window is not None else int(os.getenv("ENTITY_BLOCK_WINDOW", "10"))
+        self.counters = {"lookups": 0, "duplicates": 0, "bulk_names": 0, "bulk_duplicates": 0}
+
+    def score(self, a: CompanyFeatures, b: CompanyFeatures) -> Tuple[float, List[str]]:
+        """Оценка похожести двух компаний и ее причины: email, domain, name, domain_conflict"""
+        if a.email and a.email == b.email:
+            return 1.0, ["email"]
+        if not a.key or not b.key:
+            name_score = 0.0
+        elif a.key == b.key:
+            name_score = 1.0
+        elif min(len(a.key), len(b.key)) < self.min_token_length:
+            name_score = 0.0
+        else:
+            name_score = _dice(a.grams, b.grams)
+            if a.core != b.core and (a.core != a.key or b.core != b.key):
+                name_score = min(name_score, _dice(a.core_grams, b.core_grams))
+        reasons = ["name"] if name_score >= self.possible_threshold else []
+        if a.domain and b.domain:
+            if a.domain == b.domain:
+                return max(name_score, self.domain_score), ["domain"] + reasons
+            return name_score * self.domain_conflict_penalty, reasons + ["domain_conflict"]
+        return name_score, reasons
+
+    def blocking_keys(self, features: CompanyFeatures) -> List[Tuple[str, str]]:
+        """Блоки компании: ("k"|"d"|"e", значение) - точные, ("t"|"p", значение) - нечеткие"""
+        keys = []
+        if features.key:
+            keys.append(("k", features.key))
+            if len(features.key) >= self.min_token_length:
+                keys.append(("p", features.key[:self.min_token_length]))
+        if features.domain:
+            keys.append(("d", features.domain))
+        if features.email:
+            keys.append(("e", features.email))
+        for token in set(features.tokens):
+            # Блок по общему слову объединил бы все "... Инжиниринг" - бесполезные сравнения
+            if len(token) >= self.min_token_length and token not in GENERIC_NAME_TOKENS:
+                keys.append(("t", token))
+        return keys
+
+    def best_match(self, features: CompanyFeatures,
+                   companies: Sequence[Company]) -> Optional[Tuple[Company, float, List[str]]]:
+        """Самая похожая из companies, если ее оценка не ниже match_threshold (при равенстве - более старая)"""
+        best = None
+        for company in sorted(companies, key=lambda company: company.id):
+            score, reasons = self.score(features, CompanyFeatures(company.name, company.website, company.email, id=company.id))
+            if score >= self.match_threshold and (best is None or score > best[1]):
+                best = (company, round(score, 3), reasons)
+        return best
+
+    def candidates_statement(self, features: CompanyFeatures, dialect_name: str):
+        """SELECT кандидатов в дубликаты по индексам: name_key, domain, email и похожие названия -
+        в Postgres по триграммам, в остальных БД по началу ключа (нечеткий блок "p")"""
+        conditions = []
+        if features.key:
+            conditions.append(Company.name_key == features.key)
+        if features.domain:
+            conditions.append(Company.domain == features.domain)
+        if features.email:
+            # Для бесплатной почты домен не ключ, но общий адрес - та же компания (индекс ix_companies_email_lower)
+            conditions.append(func.lower(Company.email) == features.email)
+        statement = select(Company)
+        if dialect_name == "postgresql" and len(features.name.strip()) >= MIN_TRIGRAM_NAME_LENGTH:
+            # Оператор % использует индекс ix_companies_name_trgm (миграция companies_search_indexes)
+            conditions.append(Company.name.op("%")(features.name))
+            statement = statement.order_by(func.similarity(Company.name, features.name).desc())
+        elif len(features.key) >= self.min_token_length:
+            # Диапазон по индексу name_key вместо LIKE: индекс используется при любой сортировке строк БД
+            prefix = features.key[:self.min_token_length]
+            conditions.append(and_(Company.name_key >= prefix, Company.name_key < prefix + "\uffff"))
+            # Точное совпадение ключа не должно вытесняться лимитом кандидатов по началу ключа
+            statement = statement.order_by(case((Company.name_key == features.key, 0), else_=1), Company.id)
+        if not conditions:
+            return None
+        return statement.where(or_(*conditions)).limit(self.max_candidates)
+
+    async def find_duplicate(self, db: AsyncSession, name: str, website: str = "",
+                             email: str = "") -> Optional[Tuple[Company, float, List[str]]]:
+        """Существующая компания, которая совпадает с новой: (компания, оценка, причины) или None.
+
+        Вызывается до обогащения, чтобы не тратить поиск и LLM на известную компанию.
+        """
+        self.counters["lookups"] += 1
+        features = CompanyFeatures(name, website, email)
+        statement = self.candidates_statement(features, db.bind.dialect.name)
+        if statement is None:
+            return None
+        match = self.best_match(features, (await db.scalars(statement)).all())
+        if match:
+            self.counters["duplicates"] += 1
+        return match
+
+    def filter_new_names(self, db: Session, names: Sequence[str]) -> Tuple[List[str], Dict[str, str]]:
+        """Названия из массовой загрузки, которых нет в БД и которые не повторяют более раннюю строку.
+
+        Возвращает (названия для обогащения, {пропущенное название: причина}).
+        Точные совпадения ключа названия ищутся пачками по индексу name_key,
+        остальные названия - как в find_duplicate: кандидаты по индексам и
+        оценка score ("Рога и Копыто" - дубликат "ООО Рога и Копыта"). Строки
+        файла сравниваются между собой по тем же блокам, что и в merge_report.
+        """
+        features = {name: CompanyFeatures(name) for name in names}
+        unique_keys = list({item.key for item in features.values() if item.key})
+        existing = {}
+        for i in range(0, len(unique_keys), 500):
+            chunk = unique_keys[i:i + 500]
+            for key, company_name in db.query(Company.name_key, Company.name).filter(Company.name_key.in_(chunk)):
+                existing.setdefault(key, company_name)
+
+        new_names = []
+        skipped = {}
+        accepted: Dict[Tuple[str, str], List[CompanyFeatures]] = defaultdict(list)
+        dialect_name = db.bind.dialect.name
+        for name in names:
+            item = features[name]
+            company_name = existing.get(item.key)
+            if company_name is None:
+                statement = self.candidates_statement(item, dialect_name)
+                match = self.best_match(item, db.scalars(statement).all()) if statement is not None else None
+                company_name = match[0].name if match else None
+            if company_name is not None:
+                skipped[name] = f"Компания уже есть в базе данных: {company_name}" if company_name != name else "Компания уже есть в базе данных"
+                continue
+            earlier = self._match_earlier_row(item, accepted)
+            if earlier is not None:
+                skipped[name] = f"Повторяет строку файла: {earlier}"
+                continue
+            for block in self.blocking_keys(item):
+                accepted[block].append(item)
+            new_names.append(name)
+        self.counters["bulk_names"] += len(names)
+        self.counters["bulk_duplicates"] += len(skipped)
+        return new_names, skipped
+
+    def _match_earlier_row(self, item: CompanyFeatures,
+                           accepted: Dict[Tuple[str, str], List[CompanyFeatures]]) -> Optional[str]:
+        """Название более ранней строки файла, с которой совпадает item: в точном блоке - первая строка,
+        в нечетком - последние window строк блока"""
+        seen = set()
+        for kind, value in self.blocking_keys(item):
+            block = accepted.get((kind, value))
+            if not block:
+                continue
+            if kind in ("k", "d", "e"):
+                others = block[:1]
+            else:
+                others = block[-self.window:]
+            for other in others:
+                if id(other) in seen:
+                    continue
+                seen.add(id(other))
+                if self.score(item, other)[0] >= self.match_threshold:
+                    return other.name
+        return None
+
+    def merge_report(self, rows: Iterable[Tuple[int, str, str, str]], max_clusters: int = 100,
+                     max_possible: int = 100) -> Dict[str, Any]:
+        """Отчет о дубликатах по всем компаниям: группы для объединения и пары для ручной проверки.
+
+        rows - (id, name, website, email). В группе canonical - компания с
+        наименьшим id, у остальных - лучшая оценка связи и причины.
+        """
+        features = []
+        blocks = defaultdict(list)
+        for company_id, name, website, email in rows:
+            company = CompanyFeatures(name, website, email, id=company_id)
+            for block in self.blocking_keys(company):
+                blocks[block].append(len(features))
+            features.append(company)
+
+        parent = list(range(len(features)))
+
+        def find(index: int) -> int:
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        best_link = {}
+        possible = {}
+        comparisons = 0
+
+        def compare(i: int, j: int):
+            nonlocal comparisons
+            comparisons += 1
+            score, reasons = self.score(features[i], features[j])
+            if score >= self.match_threshold:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+                for index in (i, j):
+                    if score > best_link.get(index, (0.0,))[0]:
+                        best_link[index] = (score, reasons)
+            elif score >= self.possible_threshold:
+                possible[(min(i, j), max(i, j))] = (score, reasons)
+
+        skipped_blocks = 0
+        for (kind, _), members in blocks.items():
+            if len(members) < 2:
+                continue
+            if kind in ("k", "d", "e"):
+                if kind != "k" and len(members) > self.max_block_size:
+                    skipped_blocks += 1
+                    continue
+                # Точный блок: достаточно сравнить каждую компанию с первой
+                for j in members[1:]:
+                    compare(members[0], j)
+            else:
+                members = sorted(members, key=lambda index: features[index].key)
+                for position, i in enumerate(members):
+                    for j in members[position + 1:position + 1 + self.window]:
+                        if features[i].key != features[j].key:  # одинаковые ключи уже сравнены в блоке "k"
+                            compare(i, j)
+
+        clusters = defaultdict(list)
+        for index in best_link:
+            clusters[find(index)].append(index)
+
+        def describe(index: int) -> Dict[str, Any]:
+            return {"id": features[index].id, "name": features[index].name}
+
+        groups = []
+        for members in clusters.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda index: features[index].id)
+            groups.append({
+                "canonical": describe(members[0]),
+                "duplicates": [
+                    {**describe(index), "score": round(best_link[index][0], 3), "reasons": best_link[index][1]}
+                    for index in members[1:]
+                ],
+            })
+        groups.sort(key=lambda group: (-len(group["duplicates"]), group["canonical"]["id"]))
+
+        # Пары, уже попавшие в одну группу, в ручную проверку не идут
+        possible_pairs = [
+            {"a": describe(i), "b": describe(j), "score": round(score, 3), "reasons": reasons}
+            for (i, j), (score, reasons) in possible.items() if find(i) != find(j)
+        ]
+        possible_pairs.sort(key=lambda pair: -pair["score"])
+
+        return {
+            "companies": len(features),
+            "comparisons": comparisons,
+            "skipped_blocks": skipped_blocks,
+            "clusters_total": len(groups),
+            "duplicates_total": sum(len(group["duplicates"]) for group in groups),
+            "possible_total": len(possible_pairs),
+            "clusters": groups[:max_clusters],
+            "possible": possible_pairs[:max_possible],
+        }
+
+    def merge_report_from_db(self, db: Session, **kwargs) -> Dict[str, Any]:
+        """merge_report по таблице companies; строки читаются пачками"""
+        rows = db.execute(
+            select(Company.id, Company.name, Company.website, Company.email)
+            .order_by(Company.id)
+            .execution_options(yield_per=10000)
+        )
+        return self.merge_report(((row.id, row.name, row.website, row.email) for row in rows), **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "match_threshold": self.match_threshold,
+            "possible_threshold": self.possible_threshold,
+        }
@@ -0,0 +1,347 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+class KeywordSet:
+    """Набор подстрок-маркеров (placeholder'ы, исключаемые домены, ключевые слова).
+
+    Подстроки приводятся к нижнему регистру и дедуплицируются один раз при
+    импорте модуля. Проверка - последовательный поиск подстрок: на наборах из
+    десятков коротких слов встроенный поиск подстроки в CPython на коротких
+    строках не уступает альтернации регулярного выражения, на длинных текстах
+    быстрее нее, а автомат Ахо-Корасик на Python медленнее обоих
+    (см. benchmarks/bench_extraction.py).
+    """
+
+    __slots__ = ("words",)
+
+    def __init__(self, *words: str):
+        self.words = tuple(dict.fromkeys(word.lower() for word in words))
+
+    def found_in(self, text_lower: str) -> bool:
+        """Есть ли в тексте (уже в нижнем регистре) хотя бы одна подстрока набора"""
+        for word in self.words:
+            if word in text_lower:
+                return True
+        return False
+
+
+# Поисковики, соцсети и справочные сайты - не сайт компании
+EXCLUDED_DOMAINS = KeywordSet(
+    'google', 'yandex', 'duckduckgo', 'facebook', 'twitter', 'linkedin',
+    'w3.org', 'wikipedia', 'wikimedia', 'github', 'stackoverflow',
+    'reddit', 'youtube', 'instagram', 'vk.com', 'ok.ru',
+    'mail.ru', 'rambler', 'livejournal', 'habr', 'geektimes',
+)
+EMAIL_PLACEHOLDERS = KeywordSet('example', 'test', 'sample', 'placeholder')
+ADDRESS_PLACEHOLDERS = KeywordSet('примерная', 'примерный', 'пример', 'test', 'sample', 'demo', 'placeholder', 'example')
+ADDRESS_MARKERS = KeywordSet(
+    "г.", "ул.", "д.", "мск", "спб", "москва", "санкт", "проспект", "проезд", "переулок",  # Россия
+    "street", "st.", "avenue", "ave.", "road", "rd.", "boulevard", "blvd.",  # Английский
+    "strasse", "straße", "platz", "weg",  # Немецкий
+    "rue", "avenue", "boulevard", "place",  # Французский
+    "via", "piazza", "corso",  # Итальянский
+    "calle", "avenida", "plaza",  # Испанский
+    "北京", "上海", "广州", "深圳",  # Китай
+    "東京", "大阪", "横浜",  # Япония
+)
+# Проверяются по номеру без разделителей и маски X (clean_phone)
+PHONE_PLACEHOLDERS = KeywordSet(
+    '1234567', '0000000', '1111111', '12345', '00000', '11111',
+    '495123', '495000', '495111',  # Москва + placeholder
+)
+# На страницах поисковика отсекаем только явно фейковые номера, остальное проверит _validate_company_data
+WEB_PHONE_PLACEHOLDERS = KeywordSet('1234567', '0000000', '1111111')
+REFUSAL_PHRASES = KeywordSet("sorry", "can't", "cannot", "не могу", "не имею")
+
+_PHONE_SEPARATORS = str.maketrans('', '', ' -()')
+_PHONE_SEPARATORS_AND_MASK = str.maketrans('', '', ' -()xX')
+
+
+def clean_phone(phone: str, drop_mask: bool = True) -> str:
+    """Номер без пробелов, дефисов и скобок (и без маски X вида "+7 (XXX)", если drop_mask)"""
+    return phone.translate(_PHONE_SEPARATORS_AND_MASK if drop_mask else _PHONE_SEPARATORS)
+
+
+def is_example_phone(phone: str, phone_clean: str) -> bool:
+    """Номер похож на пример из документации: +7 (495) 123-..., +7 (495) 000-..."""
+    return '+7' in phone and '495' in phone and ('123' in phone_clean or '000' in phone_clean)
+
+
+# --- Страница результатов поисковика: один проход по документу ---
+
+# Опорные точки: окончание домена, "@" email и начало телефона. У каждой альтернативы
+# литеральный первый символ, поэтому движок регулярных выражений перескакивает к
+# следующему кандидату поиском символа, а не пробует шаблоны в каждой позиции HTML
+_SEARCH_PAGE_ANCHORS = re.compile(r'\.(?:ru|com|org|net|io|co)|@|\+7|8')
+_EMAIL = re.compile(r'\b([a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,})\b')
+_PHONE_PATTERNS = (
+    ("phone_ru", re.compile(r'\+7\s?\(?\d{3}\)?\s?\d{3}[- ]?\d{2}[- ]?\d{2}')),
+    ("phone_ru_compact", re.compile(r'\+7\s?\d{10}')),
+    ("phone_ru_8", re.compile(r'8\s?\(?\d{3}\)?\s?\d{3}[- ]?\d{2}[- ]?\d{2}')),
+)
+_DOMAIN_LABEL_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789-')
+_EMAIL_LOCAL_CHARS = _DOMAIN_LABEL_CHARS | frozenset('._%+')
+# Домен после протокола - уровень 1, после www. - 2, голый - 3: ссылка надежнее упоминания в тексте
+_URL_PREFIXES = ('http://', 'https://', 'http://www.', 'https://www.')
+_MAX_EMAIL_LENGTH = 256
+
+
+def _scan_back(content: str, position: int, chars: frozenset, limit: int) -> int:
+    """Начало непрерывной последовательности символов chars, заканчивающейся перед position"""
+    start = position
+    while start > limit and content[start - 1] in chars:
+        start -= 1
+    return start
+
+
+def _rank_website(websites: Dict[str, Tuple[int, int]], domain: str, tier: int, position: int):
+    rank = (tier, position)
+    if rank < websites.get(domain, (4, 0)):
+        websites[domain] = rank
+
+
+def scan_search_page(content: str, company_keywords: List[str]) -> Dict[str, str]:
+    """Сайт, email и телефон со страницы результатов поисковика за один проход по HTML.
+
+    Сайт - первый домен, содержащий ключевое слово из названия компании (если
+    таких нет - первый не исключенный), по порядку: ссылки с протоколом, www.,
+    голые домены. Email - первый не placeholder. Телефон - первое совпадение
+    первого по приоритету формата, не похожее на placeholder. Возвращаются
+    только найденные поля.
+    """
+    content = content.lower()
+    websites: Dict[str, Tuple[int, int]] = {}
+    email = ""
+    email_end = 0
+    domain_end = 0
+    phones: Dict[str, str] = {}
+
+    for anchor in _SEARCH_PAGE_ANCHORS.finditer(content):
+        position = anchor.start()
+        first = content[position]
+        if first == '.':
+            start = _scan_back(content, position, _DOMAIN_LABEL_CHARS, 0)
+            if start == position:
+                continue
+            domain = content[start:anchor.end()]
+            if content.endswith(_URL_PREFIXES, 0, start):
+                _rank_website(websites, domain, 1, start)
+            elif content.endswith('www.', 0, start):
+                _rank_website(websites, domain, 2, start)
+            # Голые домены не пересекаются: следующий не может начаться внутри предыдущего
+            start = max(start, domain_end)
+            if start < position:
+                domain_end = anchor.end()
+                _rank_website(websites, content[start:domain_end], 3, start)
+        elif first == '@':
+            if email:
+                continue
+            start = _scan_back(content, position, _EMAIL_LOCAL_CHARS, email_end)
+            match = _EMAIL.search(content, start, position + _MAX_EMAIL_LENGTH)
+            if match and match.start() < position:
+                email_end = match.end()
+                if not EMAIL_PLACEHOLDERS.found_in(match.group(1)):
+                    email = match.group(1)
+        else:
+            for kind, pattern in _PHONE_PATTERNS:
+                if kind not in phones:
+                    match = pattern.match(content, position)
+                    if match:
+                        phones[kind] = match.group(0).strip()
+
+    results = {}
+    fallback = ""
+    for domain, _ in sorted(websites.items(), key=lambda item: item[1]):
+        if EXCLUDED_DOMAINS.found_in(domain):
+            continue
+        if not company_keywords or any(keyword in domain for keyword in company_keywords):
+            results["website"] = "https://" + domain
+            break
+        if not fallback:
+            fallback = "https://" + domain
+    else:
+        if fallback:
+            results["website"] = fallback
+    if email:
+        results["email"] = email
+    for kind, _ in _PHONE_PATTERNS:
+        phone = phones.get(kind)
+        if phone and not WEB_PHONE_PLACEHOLDERS.found_in(clean_phone(phone, drop_mask=False)):
+            results["phone"] = phone
+            break
+    return results
+
+
+# --- Текстовый ответ модели без JSON ---
+
+_TEXT_WEBSITE_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'https?://[^\s\)]+',
+    r'www\.[^\s\)]+',
+    r'сайт[:\s]+([^\s\)]+)',
+    r'website[:\s]+([^\s\)]+)',
+))
+_TEXT_EMAIL = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+# Международные форматы
+_TEXT_PHONE_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'\+?\d{1,3}[\s\-]?[\(\-]?\d{1,4}[\)\-]?[\s\-]?\d{1,4}[\s\-]?\d{1,4}[\s\-]?\d{1,9}',  # Международный формат
+    r'\+?7\s?[\(\-]?\d{3}[\)\-]?\s?\d{3}[\-]?\d{2}[\-]?\d{2}',  # Россия
+    r'\+?1[\s\-]?[\(\-]?\d{3}[\)\-]?[\s\-]?\d{3}[\-]?\d{4}',  # США/Канада
+    r'\+?44[\s\-]?\d{2,4}[\s\-]?\d{3,4}[\s\-]?\d{3,4}',  # UK
+    r'\+?49[\s\-]?\d{2,4}[\s\-]?\d{3,9}',  # Германия
+    r'\+?33[\s\-]?\d{1,2}[\s\-]?\d{2}[\s\-]?\d{2}[\s\-]?\d{2}[\s\-]?\d{2}',  # Франция
+    r'телефон[:\s]+([+\d\s\-\(\)]+)',
+    r'phone[:\s]+([+\d\s\-\(\)]+)',
+    r'tel[:\s]+([+\d\s\-\(\)]+)',
+))
+_TEXT_ADDRESS_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'адрес[:\s]+([^\n\.]+)',
+    r'address[:\s]+([^\n\.]+)',
+    r'г\.\s*[А-Яа-я]+[^\n\.]*',  # Россия
+    r'Москва[^\n\.]*',
+    r'Санкт-Петербург[^\n\.]*',
+    r'\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Drive|Dr|Lane|Ln)[^\n\.]*',  # Английский
+    r'\d+\s+[A-Za-z\s]+(?:Straße|Str|Platz|Weg)[^\n\.]*',  # Немецкий
+    r'\d+\s+[A-Za-z\s]+(?:Rue|Avenue|Boulevard|Place)[^\n\.]*',  # Французский
+    r'\d+\s+[A-Za-z\s]+(?:Via|Piazza|Corso)[^\n\.]*',  # Итальянский
+    r'\d+\s+[A-Za-z\s]+(?:Calle|Avenida|Plaza)[^\n\.]*',  # Испанский
+))
+_SENTENCE_END = re.compile(r'[\.!?]\s+')
+
+
+def _first_match(patterns: Tuple[re.Pattern, ...], text: str) -> Optional[str]:
+    """Совпадение первого по приоритету шаблона: группа 1, если она есть, иначе все совпадение"""
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return match.group(1) if match.groups() else match.group(0)
+    return None
+
+
+def extract_text_info(text: str, company_name: str) -> Dict[str, str]:
+    """Сайт, email, телефон, адрес и описание из текстового ответа модели"""
+    result = {
+        "website": "",
+        "email": "",
+        "address": "",
+        "phone": "",
+        "description": "",
+        "equipment": "",
+        "preferred_language": "ru"  # По умолчанию русский
+    }
+
+    website = _first_match(_TEXT_WEBSITE_PATTERNS, text)
+    if website:
+        result["website"] = website if website.startswith('http') else 'https://' + website
+
+    email_match = _TEXT_EMAIL.search(text)
+    if email_match:
+        result["email"] = email_match.group(0)
+
+    phone = _first_match(_TEXT_PHONE_PATTERNS, text)
+    if phone:
+        result["phone"] = phone.strip()
+
+    address = _first_match(_TEXT_ADDRESS_PATTERNS, text)
+    if address:
+        result["address"] = address.strip()
+
+    # Описание - берем первые несколько предложений
+    company_lower = company_name.lower()
+    description_sentences = [s for s in _SENTENCE_END.split(text) if company_lower in s.lower() or len(s) > 20]
+    if description_sentences:
+        result["description"] = '. '.join(description_sentences[:3])
+
+    return result
+
+
+# --- Сообщения чата ---
+
+_COMPANY_MENTION = KeywordSet('компани', 'фирм', 'организац', 'предприяти', 'ооо', 'зао', 'ао', 'ип',
+                              'найди', 'найти', 'ищу', 'искать', 'информация', 'знаешь', 'расскажи')
+_GENERIC_COMPANY_WORDS = frozenset(['информация', 'компания', 'фирма', 'организация', 'предприятие'])
+# Паттерны для поиска компаний (в порядке приоритета)
+_COMPANY_NAME_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    # Прямые запросы: "найди информацию о компании X"
+    r'(?:найди|найти|ищу|искать|расскажи|что\s+ты\s+знаешь)\s+(?:информацию\s+)?(?:о\s+)?(?:компани[ияюе]|фирм[еыу]|организаци[июе])\s+["\']?([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+)["\']?',
+    # "компания X" или "фирма X"
+    r'(?:компани[яиюе]|фирм[аыуе]|организаци[яиюе]|предприяти[еяю])\s+["\']?([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+(?:ООО|ЗАО|АО|ИП|Ltd|Inc|LLC|GmbH|Corp)?)["\']?',
+    # "ООО X", "ЗАО X" и т.д.
+    r'(?:ООО|ЗАО|АО|ИП|Ltd|Inc|LLC|GmbH|Corp)\s+["\']?([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+)["\']?',
+    # Названия в кавычках
+    r'["\']([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+(?:ООО|ЗАО|АО|ИП|Ltd|Inc|LLC|GmbH|Corp)?)["\']',
+))
+# Текст после "о компании", "фирма" и т.д., если основные паттерны ничего не нашли
+_COMPANY_NAME_FALLBACK_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'(?:о|про)\s+(?:компани[ияюе]|фирм[еыу]|организаци[июе])\s+([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]{3,50})',
+    r'(?:компани[ияюе]|фирм[аыуе])\s+([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]{3,50})',
+))
+_COMPANY_WORD_SUFFIX = re.compile(r'\s+(компани[ияюе]|фирм[ыуе]|организаци[июе]|предприяти[еяю])\s*$', re.IGNORECASE)
+
+
+def extract_company_names(message: str) -> List[str]:
+    """Названия компаний из сообщения пользователя (не больше 5, без повторов)"""
+    companies = []
+
+    if _COMPANY_MENTION.found_in(message.lower()):
+        for pattern in _COMPANY_NAME_PATTERNS:
+            for match in pattern.findall(message):
+                # Очищаем от лишних слов
+                company = _COMPANY_WORD_SUFFIX.sub('', match.strip()).strip('.,!?;:')
+                if 2 < len(company) < 200 and company.lower() not in _GENERIC_COMPANY_WORDS:
+                    companies.append(company)
+
+        if not companies:
+            company = _first_match(_COMPANY_NAME_FALLBACK_PATTERNS, message)
+            if company:
+                company = company.strip().strip('.,!?;:')
+                if 2 < len(company) < 200:
+                    companies.append(company)
+
+    # Удаляем дубликаты, сохраняя порядок
+    seen = set()
+    unique_companies = []
+    for company in companies:
+        company_lower = company.lower().strip()
+        if company_lower not in seen and len(company_lower) > 2:
+            seen.add(company_lower)
+            unique_companies.append(company)
+
+    return unique_companies[:5]  # Максимум 5 компаний за раз
+
+
+_EQUIPMENT_MENTION = KeywordSet('оборудован', 'техник', 'использует', 'пользуется', 'применяет', 'имеет', 'работает с', 'используют')
+_EQUIPMENT_SEARCH = KeywordSet('найди', 'найти', 'ищу', 'искать', 'кто', 'какие компании')
+# Все что идет после "используют" до конца строки или до знаков препинания
+_EQUIPMENT_AFTER_VERB = re.compile(r'(?:используют?|пользуются?|применяют?|имеют?|работают?\s+с)\s+["\']?([^"\'\n\.!?]{3,100})["\']?', re.IGNORECASE)
+_EQUIPMENT_TRAILING_WORDS = re.compile(r'\s+(оборудован[иемя]|техник[аой]|компани[ияюе]|фирм[ыуе]|используют?|пользуются?)\s*$', re.IGNORECASE)
+_EQUIPMENT_LEADING_CLAUSE = re.compile(r'^(?:котор[ыеая]|кто)\s+(?:используют?|пользуются?)\s+', re.IGNORECASE)
+_COMPANIES_WITH_EQUIPMENT = re.compile(r'(?:компани[ияюе]|фирм[ыуе])\s+(?:с\s+)?(?:оборудованием|техникой)\s+["\']?([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+)["\']?', re.IGNORECASE)
+
+
+def extract_equipment_name(message: str) -> Optional[str]:
+    """Название оборудования из запроса вида "найди компании, которые используют X" """
+    message_lower = message.lower()
+    has_equipment = _EQUIPMENT_MENTION.found_in(message_lower)
+
+    # Нужны и ключевые слова поиска, и упоминание использования оборудования
+    if has_equipment and _EQUIPMENT_SEARCH.found_in(message_lower):
+        match = _EQUIPMENT_AFTER_VERB.search(message)
+        if match:
+            equipment = match.group(1).strip().strip('.,!?;:')
+            equipment = _EQUIPMENT_TRAILING_WORDS.sub('', equipment)
+            # Убираем фразы типа "которые используют" в начале
+            equipment = _EQUIPMENT_LEADING_CLAUSE.sub('', equipment).strip()
+            if 2 < len(equipment) < 200:
+                print(f"Обнаружено упоминание оборудования: {equipment}")
+                return equipment
+
+    # Также проверяем паттерн "компании с оборудованием X"
+    if has_equipment:
+        match = _COMPANIES_WITH_EQUIPMENT.search(message)
+        if match:
+            equipment = match.group(1).strip().strip('.,!?;:')
+            if 2 < len(equipment) < 200:
+                return equipment
+
+    return None
@@ -0,0 +1,101 @@
+import os
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _http2_supported() -> bool:
+    """HTTP/2 в httpx требует пакет h2 (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class HTTPClientPool:
+    """Долгоживущие httpx.AsyncClient, по одному на upstream хост.
+
+    Клиенты создаются лениво при первом обращении к хосту и держат keep-alive
+    соединения между запросами, поэтому TCP+TLS рукопожатие выполняется один раз,
+    а не на каждый вызов. Закрываются в lifespan приложения через aclose().
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        http2: Optional[bool] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.max_connections = max_connections if max_connections is not None else _env_int("HTTP_POOL_MAX_CONNECTIONS", 100)
+        self.max_keepalive_connections = (
+            max_keepalive_connections if max_keepalive_connections is not None
+            else _env_int("HTTP_POOL_MAX_KEEPALIVE", 20)
+        )
+        self.keepalive_expiry = keepalive_expiry if keepalive_expiry is not None else _env_float("HTTP_POOL_KEEPALIVE_EXPIRY", 30.0)
+        self.timeout = timeout if timeout is not None else _env_float("HTTP_POOL_TIMEOUT", 120.0)
+
+        http2_requested = http2 if http2 is not None else _env_bool("HTTP_POOL_HTTP2", True)
+        if http2_requested and not _http2_supported():
+            print("⚠️ HTTP/2 запрошен, но пакет h2 не установлен - используем HTTP/1.1")
+            http2_requested = False
+        self.http2 = http2_requested
+
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        """Возвращает общий клиент для хоста из url (создает при первом обращении)"""
+        origin = self._origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+            self._clients[origin] = client
+            print(f"🔌 Создан пул соединений для {origin} (http2={self.http2}, max_connections={self.max_connections})")
+        return client
+
+    async def aclose(self):
+        """Закрывает все клиенты пула"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"⚠️ Ошибка при закрытии HTTP клиента: {e}")
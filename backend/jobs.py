@@ -0,0 +1,254 @@
+import asyncio
+import json
+import os
+import traceback
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import AsyncSessionLocal, Job, JobItem
+from llm_governor import BULK, llm_priority
+from llm_telemetry import llm_endpoint
+
+
+class JobContext:
+    """Контекст выполнения задачи, который получает обработчик.
+
+    Строки отмечаются коммитом сразу после обработки (по одной или пачкой),
+    поэтому после перезапуска backend задача продолжается с необработанных строк.
+    Задача работает через AsyncSession на том же event loop, что и API, поэтому
+    коммиты не блокируют запросы. Отметки строк из параллельных воркеров
+    обработчика выполняются по очереди - одна сессия не допускает
+    одновременных операций.
+    """
+
+    def __init__(self, job: Job, db: AsyncSession):
+        self.job = job
+        self.db = db
+        self._lock = asyncio.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        # status перечитывается после каждого коммита (_commit), так что отмена из API видна здесь
+        return self.job.status == "cancelled"
+
+    async def _commit(self):
+        await self.db.commit()
+        await self.db.refresh(self.job, attribute_names=["status"])
+
+    async def pending_items(self) -> List[JobItem]:
+        return list((await self.db.scalars(
+            select(JobItem)
+            .where(JobItem.job_id == self.job.id, JobItem.status == "pending")
+            .order_by(JobItem.position)
+        )).all())
+
+    def _mark_item(self, item: JobItem, status: str, result: Any = None, error: str = None, found: bool = False):
+        item.status = status
+        item.result = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        item.error_message = error
+        item.processed_at = datetime.utcnow()
+        self.job.processed = (self.job.processed or 0) + 1
+        if found:
+            self.job.found = (self.job.found or 0) + 1
+        if status == "failed":
+            self.job.failed = (self.job.failed or 0) + 1
+
+    async def _finish_item(self, item: JobItem, status: str, result: Any = None, error: str = None,
+                           found: bool = False, records: Iterable[Any] = ()):
+        async with self._lock:
+            self.db.add_all(records)
+            self._mark_item(item, status, result=result, error=error, found=found)
+            await self._commit()
+
+    async def complete_items(self, entries: Iterable[Tuple[JobItem, Any, bool]]):
+        """Отмечает пачку строк (item, result, found) обработанными одним коммитом"""
+        async with self._lock:
+            for item, result, found in entries:
+                self._mark_item(item, "done", result=result, found=found)
+            await self._commit()
+
+    async def complete_item(self, item: JobItem, result: Any = None, found: bool = False, records: Iterable[Any] = ()):
+        """records - новые строки других таблиц (например, найденная компания), сохраняются тем же коммитом"""
+        await self._finish_item(item, "done", result=result, found=found, records=records)
+
+    async def skip_item(self, item: JobItem, reason: str = None):
+        await self._finish_item(item, "skipped", result={"reason": reason} if reason else None)
+
+    async def fail_item(self, item: JobItem, error: str):
+        await self._finish_item(item, "failed", error=error)
+
+
+JobHandler = Callable[[JobContext], Awaitable[None]]
+
+
+class JobRunner:
+    """Фоновый обработчик задач из таблицы jobs.
+
+    Задачи выполняются по одной в порядке создания; параллельность внутри задачи
+    определяет ее обработчик. При старте задачи в статусе running (прерванные
+    перезапуском) возвращаются в очередь и продолжаются с необработанных строк.
+    Цикл работает на event loop приложения, поэтому к БД он обращается только
+    через AsyncSession; create_job и describe_job - синхронные, для run_sync.
+    """
+
+    def __init__(self, poll_interval: float = None):
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL", "5"))
+        self._handlers: Dict[str, JobHandler] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def register(self, job_type: str, handler: JobHandler):
+        self._handlers[job_type] = handler
+
+    def create_job(self, db: Session, job_type: str, payloads: Iterable[str], source_name: str = None) -> Job:
+        """Создает задачу со строками payloads и будит воркер"""
+        payloads = list(payloads)
+        job = Job(job_type=job_type, status="pending", source_name=source_name, total=len(payloads))
+        db.add(job)
+        db.flush()
+        db.bulk_insert_mappings(JobItem, [
+            {"job_id": job.id, "position": position, "payload": payload, "status": "pending"}
+            for position, payload in enumerate(payloads)
+        ])
+        db.commit()
+        db.refresh(job)
+        self.wake()
+        return job
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _recover_interrupted(self):
+        async with AsyncSessionLocal() as db:
+            interrupted = (await db.execute(
+                update(Job).where(Job.status == "running").values(status="pending")
+            )).rowcount
+            await db.commit()
+            if interrupted:
+                print(f"♻️ Возобновляем {interrupted} прерванных задач")
+
+    async def _next_job_id(self) -> Optional[int]:
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(
+                select(Job.id).where(Job.status == "pending").order_by(Job.created_at, Job.id).limit(1)
+            )
+
+    async def _loop(self):
+        await self._recover_interrupted()
+        while True:
+            try:
+                job_id = await self._next_job_id()
+                if job_id is not None:
+                    await self._run_job(job_id)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ошибка в цикле обработки задач: {e}")
+                traceback.print_exc()
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_job(self, job_id: int):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(Job, job_id)
+            handler = self._handlers.get(job.job_type)
+            if handler is None:
+                job.status = "failed"
+                job.error_message = f"Неизвестный тип задачи: {job.job_type}"
+                job.finished_at = datetime.utcnow()
+                await db.commit()
+                return
+
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            await db.commit()
+            print(f"▶️ Запускаем задачу #{job.id} ({job.job_type}): {job.processed}/{job.total} уже обработано")
+
+            try:
+                with llm_endpoint(f"job:{job.job_type}"), llm_priority(BULK):
+                    await handler(JobContext(job, db))
+            except asyncio.CancelledError:
+                # Остановка приложения - задача останется running и будет возобновлена при старте
+                raise
+            except Exception as e:
+                print(f"❌ Задача #{job.id} завершилась с ошибкой: {e}")
+                traceback.print_exc()
+                await db.rollback()
+                await db.refresh(job)
+                job.status = "failed"
+                job.error_message = str(e)[:1000]
+                job.finished_at = datetime.utcnow()
+                await db.commit()
+                return
+
+            await db.refresh(job)
+            if job.status != "cancelled":
+                job.status = "completed"
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+            print(f"✅ Задача #{job.id} завершена: обработано {job.processed}, найдено {job.found}, ошибок {job.failed}")
+
+
+def describe_job(db: Session, job: Job, error_limit: int = 100) -> Dict[str, Any]:
+    """Статус задачи для API: счетчики, ETA и ошибки по строкам"""
+    eta_seconds = None
+    if job.status == "running" and job.started_at:
+        # Скорость считаем только по строкам, обработанным в текущем запуске
+        processed_this_run = (
+            db.query(func.count(JobItem.id))
+            .filter(JobItem.job_id == job.id, JobItem.processed_at >= job.started_at)
+            .scalar()
+        )
+        elapsed = (datetime.utcnow() - job.started_at).total_seconds()
+        remaining = (job.total or 0) - (job.processed or 0)
+        if processed_this_run and elapsed > 0:
+            eta_seconds = round(remaining * elapsed / processed_this_run, 1)
+
+    failed_items = (
+        db.query(JobItem)
+        .filter(JobItem.job_id == job.id, JobItem.status == "failed")
+        .order_by(JobItem.position)
+        .limit(error_limit)
+        .all()
+    )
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "source_name": job.source_name,
+        "total": job.total or 0,
+        "processed": job.processed or 0,
+        "found": job.found or 0,
+        "failed": job.failed or 0,
+        "eta_seconds": eta_seconds,
+        "error_message": job.error_message,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "errors": [
+            {"position": item.position, "payload": item.payload, "error": item.error_message}
+            for item in failed_items
+        ],
+    }
@@ -0,0 +1,302 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+# Приоритеты очереди: меньше - раньше
+INTERACTIVE = 0
+BULK = 1
+_RETRY = -1
+_PRIORITY_NAMES = {_RETRY: "retry", INTERACTIVE: "interactive", BULK: "bulk"}
+
+_current_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class SharedPriority:
+    """Приоритет работы, которую ждут несколько вызывающих (SingleFlight).
+
+    Начинается с приоритета первого вызывающего; если присоединяется более
+    срочный (чат к поиску компании из массового обогащения), raise_to
+    повышает его - и для следующих вызовов LLM, и для уже стоящих в очереди.
+    """
+
+    def __init__(self, priority: int):
+        self.value = priority
+        self._queued = set()  # (бюджет модели, ожидающий вызов)
+
+    def raise_to(self, priority: int):
+        if priority >= self.value:
+            return
+        self.value = priority
+        for budget, waiter in list(self._queued):
+            if not waiter.future.done() and waiter.priority > priority:
+                budget.requeue(waiter, priority)
+
+
+_shared_priority: contextvars.ContextVar[Optional[SharedPriority]] = contextvars.ContextVar("llm_shared_priority", default=None)
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """Вызовы LLM внутри блока (и в созданных из него задачах) встают в очередь с этим приоритетом"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        try:
+            _current_priority.reset(token)
+        except ValueError:
+            pass
+
+
+@contextmanager
+def shared_llm_priority(shared: SharedPriority) -> Iterator[SharedPriority]:
+    """Вызовы LLM внутри блока берут приоритет из shared на момент постановки в очередь"""
+    token = _shared_priority.set(shared)
+    try:
+        yield shared
+    finally:
+        try:
+            _shared_priority.reset(token)
+        except ValueError:
+            pass
+
+
+def current_llm_priority() -> int:
+    shared = _shared_priority.get()
+    return shared.value if shared is not None else _current_priority.get()
+
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], max_tokens: int) -> int:
+    """Грубая оценка токенов запроса до ответа API: ~3 символа на токен плюс лимит ответа"""
+    return sum(len(str(message.get("content") or "")) for message in messages) // 3 + (max_tokens or 0)
+
+
+def _parse_model_limits(value: str) -> Dict[str, Tuple[float, float, int]]:
+    """Разбирает лимиты вида "gpt-4o:500:30000:8" (запросов/мин, токенов/мин, одновременных запросов)"""
+    limits = {}
+    for part in (value or "").split(","):
+        fields = part.strip().rsplit(":", 3)
+        if len(fields) == 4:
+            try:
+                limits[fields[0]] = (float(fields[1]), float(fields[2]), int(fields[3]))
+            except ValueError:
+                print(f"⚠️ Некорректный лимит модели '{part}', пропускаем")
+    return limits
+
+
+class _Waiter:
+    def __init__(self, tokens: int, holds_slot: bool, priority: int):
+        self.tokens = tokens
+        self.holds_slot = holds_slot
+        self.priority = priority
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class _ModelBudget:
+    """Бюджет одной модели: token bucket запросов и токенов в минуту плюс лимит одновременных запросов.
+
+    Ожидающие вызовы стоят в одной очереди по (приоритет, порядок прихода) и
+    пропускаются строго с головы, поэтому интерактивный запрос обгоняет все
+    уже ждущие фоновые. Лимит 0 - без ограничения.
+    """
+
+    def __init__(self, model: str, rpm: float, tpm: float, concurrency: int):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concurrency = concurrency
+        self._requests = rpm
+        self._tokens = tpm
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self.in_flight = 0
+        self._queue: List[Tuple[int, int, _Waiter]] = []
+        self._order = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.counters = {"admitted": 0, "waited": 0, "wait_seconds": 0.0, "throttled": 0}
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.rpm > 0:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm > 0:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_time(self, waiter: _Waiter, now: float) -> Optional[float]:
+        """0 - можно пропускать; None - ждем освобождения слота; иначе секунды до пополнения бюджета"""
+        if not waiter.holds_slot and self.concurrency > 0 and self.in_flight >= self.concurrency:
+            return None
+        wait = max(0.0, self._paused_until - now)
+        if self.rpm > 0 and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm > 0:
+            # Запрос больше минутного бюджета ждет полного бюджета, иначе он не прошел бы никогда
+            needed = min(waiter.tokens, self.tpm)
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._queue:
+            priority, _, waiter = self._queue[0]
+            if waiter.future.done() or priority != waiter.priority:
+                # Ожидание отменено (клиент ушел, задача отменена) или вызов переставлен выше (requeue)
+                heapq.heappop(self._queue)
+                continue
+            wait = self._wait_time(waiter, now)
+            if wait is None:
+                return
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self._admit(waiter, now)
+            waiter.future.set_result(None)
+
+    def _admit(self, waiter: _Waiter, now: float):
+        if self.rpm > 0:
+            self._requests -= 1
+        if self.tpm > 0:
+            self._tokens -= waiter.tokens
+        if not waiter.holds_slot:
+            self.in_flight += 1
+        self.counters["admitted"] += 1
+        waited = now - waiter.enqueued_at
+        if waited > 0.001:
+            self.counters["waited"] += 1
+            self.counters["wait_seconds"] += waited
+
+    async def acquire(self, tokens: int, priority: int, holds_slot: bool = False, shared: SharedPriority = None):
+        # Повтор уже занимает слот: пропускаем его первым, иначе слоты могли бы ждать сами себя
+        waiter = _Waiter(tokens, holds_slot, _RETRY if holds_slot else priority)
+        heapq.heappush(self._queue, (waiter.priority, next(self._order), waiter))
+        if shared is not None:
+            shared._queued.add((self, waiter))
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if not waiter.future.cancelled():
+                # Бюджет уже выдан, но вызывающий отменен - возвращаем слот
+                if not holds_slot:
+                    self.release()
+            else:
+                self._dispatch()
+            raise
+        finally:
+            if shared is not None:
+                shared._queued.discard((self, waiter))
+
+    def requeue(self, waiter: _Waiter, priority: int):
+        """Переставляет ожидающий вызов с новым приоритетом; прежняя запись очереди пропускается в _dispatch"""
+        waiter.priority = priority
+        heapq.heappush(self._queue, (priority, next(self._order), waiter))
+        self._dispatch()
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def settle(self, estimated: int, actual: int):
+        """Поправка бюджета токенов на фактический расход из usage"""
+        if self.tpm > 0 and actual:
+            self._tokens += estimated - actual
+
+    def pause(self, seconds: float):
+        """Upstream ответил 429 - придерживаем очередь модели, а не отправляем заведомо отклоняемые запросы"""
+        self.counters["throttled"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        queued = {name: 0 for name in _PRIORITY_NAMES.values()}
+        for priority, _, waiter in self._queue:
+            if not waiter.future.done() and priority == waiter.priority:
+                queued[_PRIORITY_NAMES.get(priority, str(priority))] += 1
+        waited = self.counters["waited"]
+        return {
+            "limits": {"rpm": self.rpm, "tpm": self.tpm, "concurrency": self.concurrency},
+            "in_flight": self.in_flight,
+            "queued": queued,
+            "admitted": self.counters["admitted"],
+            "waited": waited,
+            "avg_wait": round(self.counters["wait_seconds"] / waited, 3) if waited else None,
+            "throttled": self.counters["throttled"],
+        }
+
+
+class LLMReservation:
+    """Слот вызова LLM: держит место в лимите одновременных запросов на время вызова со всеми повторами"""
+
+    def __init__(self, budget: _ModelBudget, tokens: int, priority: int):
+        self._budget = budget
+        self.tokens = tokens
+        self._priority = priority
+        self._attempts = 0
+
+    async def attempt(self):
+        """Вызывается перед каждой отправкой; первая уже оплачена при входе, повторы ждут бюджета заново"""
+        self._attempts += 1
+        if self._attempts > 1:
+            await self._budget.acquire(self.tokens, self._priority, holds_slot=True)
+
+    def throttle(self, seconds: float):
+        self._budget.pause(seconds)
+
+    def settle(self, usage: Optional[Dict[str, Any]]):
+        if usage:
+            self._budget.settle(self.tokens, int(usage.get("total_tokens") or 0)
+                                or int(usage.get("prompt_tokens") or 0) + int(usage.get("completion_tokens") or 0))
+
+
+class LLMGovernor:
+    """Общий регулятор трафика LLM по моделям.
+
+    Для каждой модели - бюджеты запросов и токенов в минуту (token bucket) и
+    лимит одновременных запросов. Вызов, не укладывающийся в бюджет, ждет в
+    очереди вместо того чтобы получить 429 от провайдера; интерактивные вызовы
+    (чат, агент) обслуживаются раньше фоновых (массовое обогащение, задачи),
+    приоритет задается llm_priority.
+    """
+
+    def __init__(self, default_rpm: float = None, default_tpm: float = None, default_concurrency: int = None,
+                 model_limits: Dict[str, Tuple[float, float, int]] = None):
+        self.default_rpm = default_rpm if default_rpm is not None else float(os.getenv("LLM_DEFAULT_RPM", "0"))
+        self.default_tpm = default_tpm if default_tpm is not None else float(os.getenv("LLM_DEFAULT_TPM", "0"))
+        self.default_concurrency = default_concurrency if default_concurrency is not None else int(os.getenv("LLM_DEFAULT_CONCURRENCY", "8"))
+        self.model_limits = model_limits if model_limits is not None else _parse_model_limits(os.getenv("LLM_MODEL_LIMITS", ""))
+        self._budgets: Dict[str, _ModelBudget] = {}
+
+    def _budget_for(self, model: str) -> _ModelBudget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            rpm, tpm, concurrency = self.model_limits.get(model, (self.default_rpm, self.default_tpm, self.default_concurrency))
+            budget = _ModelBudget(model, rpm, tpm, concurrency)
+            self._budgets[model] = budget
+        return budget
+
+    @asynccontextmanager
+    async def reserve(self, model: str, tokens: int) -> AsyncIterator[LLMReservation]:
+        """Ждет бюджета модели и слота; слот освобождается при выходе из блока"""
+        shared = _shared_priority.get()
+        priority = current_llm_priority()
+        budget = self._budget_for(model)
+        await budget.acquire(tokens, priority, shared=shared)
+        try:
+            yield LLMReservation(budget, tokens, priority)
+        finally:
+            budget.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {model: budget.stats() for model, budget in sorted(self._budgets.items())}
@@ -0,0 +1,212 @@
+import asyncio
+import bisect
+import contextvars
+import os
+import re
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+# Границы гистограммы длительности вызова LLM, сек
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+_current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar("llm_endpoint", default="other")
+
+
+def endpoint_label(path: str) -> str:
+    """Метка эндпоинта без идентификаторов: /dialogs/15 -> /dialogs/{id}"""
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path) or "/"
+
+
+@contextmanager
+def llm_endpoint(label: str) -> Iterator[None]:
+    """Все вызовы LLM внутри блока (и в созданных из него задачах) относятся к label"""
+    token = _current_endpoint.set(label)
+    try:
+        yield
+    finally:
+        try:
+            _current_endpoint.reset(token)
+        except ValueError:
+            pass
+
+
+def current_llm_endpoint() -> str:
+    return _current_endpoint.get()
+
+
+def _parse_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    """Разбирает цены вида "gpt-4o:0.0025:0.01,gpt-4o-mini:0.00015:0.0006" (за 1000 токенов prompt/completion)"""
+    prices = {}
+    for part in (value or "").split(","):
+        fields = part.strip().rsplit(":", 2)
+        if len(fields) == 3:
+            try:
+                prices[fields[0]] = (float(fields[1]), float(fields[2]))
+            except ValueError:
+                print(f"⚠️ Некорректная цена модели '{part}', пропускаем")
+    return prices
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class LLMCall:
+    """Один вызов LLM: заполняется по ходу запроса и записывается при выходе из track()"""
+
+    def __init__(self, call_type: str, model: str, endpoint: str):
+        self.call_type = call_type
+        self.model = model
+        self.endpoint = endpoint
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.outcome = "ok"
+
+    def add_usage(self, usage: Optional[Dict[str, Any]]):
+        """Учитывает поле usage ответа API (при повторах токены каждой попытки суммируются)"""
+        if usage:
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            self.completion_tokens += int(usage.get("completion_tokens") or 0)
+
+    def count_retry(self, attempt: int, reason: str):
+        """Колбэк on_retry для UpstreamPolicy.call; повторы всех call() внутри одного вызова суммируются"""
+        self.retries += 1
+
+
+class _Series:
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+class LLMTelemetry:
+    """Учет токенов, длительности, повторов и исходов вызовов Polza.AI.
+
+    Серии ведутся по (эндпоинт, тип вызова, модель, исход). Эндпоинт берется из
+    контекста запроса (llm_endpoint), поэтому вызовы из фоновых задач и чата
+    различаются. Данные отдаются в формате Prometheus (render_prometheus) и
+    сводкой для /metrics/llm (summary).
+    """
+
+    def __init__(self, prices: Dict[str, Tuple[float, float]] = None):
+        self.prices = prices if prices is not None else _parse_prices(os.getenv("LLM_MODEL_PRICES", ""))
+        self._series: Dict[Tuple[str, str, str, str], _Series] = defaultdict(_Series)
+
+    @asynccontextmanager
+    async def track(self, call_type: str, model: str) -> AsyncIterator[LLMCall]:
+        call = LLMCall(call_type, model, _current_endpoint.get())
+        started = time.monotonic()
+        try:
+            yield call
+        except BaseException as e:
+            call.outcome = self._outcome_for(e)
+            raise
+        finally:
+            self.record(call, time.monotonic() - started)
+
+    @staticmethod
+    def _outcome_for(error: BaseException) -> str:
+        if isinstance(error, httpx.HTTPStatusError):
+            return f"http_{error.response.status_code}"
+        if isinstance(error, httpx.TimeoutException):
+            return "timeout"
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            return "cancelled"
+        return "error"
+
+    def record(self, call: LLMCall, latency: float):
+        series = self._series[(call.endpoint, call.call_type, call.model, call.outcome)]
+        series.calls += 1
+        series.prompt_tokens += call.prompt_tokens
+        series.completion_tokens += call.completion_tokens
+        series.retries += call.retries
+        series.latency_sum += latency
+        series.latency_max = max(series.latency_max, latency)
+        series.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def _cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        price = self.prices.get(model)
+        if price is None:
+            return None
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1000
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(**values: Any) -> str:
+            return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in values.items()) + "}"
+
+        items = sorted(self._series.items())
+        metric("llm_requests_total", "counter", "Вызовы LLM по эндпоинту, типу вызова, модели и исходу")
+        for (endpoint, call_type, model, outcome), series in items:
+            lines.append(f"llm_requests_total{labels(endpoint=endpoint, call=call_type, model=model, outcome=outcome)} {series.calls}")
+        for name, attr, help_text in (
+            ("llm_prompt_tokens_total", "prompt_tokens", "Токены запроса по данным usage"),
+            ("llm_completion_tokens_total", "completion_tokens", "Токены ответа по данным usage"),
+            ("llm_retries_total", "retries", "Повторные попытки вызовов LLM"),
+        ):
+            metric(name, "counter", help_text)
+            for (endpoint, call_type, model, outcome), series in items:
+                lines.append(f"{name}{labels(endpoint=endpoint, call=call_type, model=model, outcome=outcome)} {getattr(series, attr)}")
+
+        metric("llm_request_duration_seconds", "histogram", "Длительность вызова LLM вместе с повторами")
+        for (endpoint, call_type, model, outcome), series in items:
+            base = dict(endpoint=endpoint, call=call_type, model=model, outcome=outcome)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, series.buckets):
+                cumulative += count
+                lines.append(f"llm_request_duration_seconds_bucket{labels(**base, le=bound)} {cumulative}")
+            lines.append(f"llm_request_duration_seconds_bucket{labels(**base, le='+Inf')} {series.calls}")
+            lines.append(f"llm_request_duration_seconds_sum{labels(**base)} {series.latency_sum:.6f}")
+            lines.append(f"llm_request_duration_seconds_count{labels(**base)} {series.calls}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """Сводка по эндпоинтам и моделям: вызовы, ошибки, токены, задержка, стоимость"""
+        def empty():
+            return {"calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                    "latency_sum": 0.0, "latency_max": 0.0, "cost": None}
+
+        totals = empty()
+        by_endpoint: Dict[str, Dict[str, Any]] = defaultdict(empty)
+        by_model: Dict[str, Dict[str, Any]] = defaultdict(empty)
+        for (endpoint, call_type, model, outcome), series in self._series.items():
+            cost = self._cost(model, series.prompt_tokens, series.completion_tokens)
+            for bucket in (totals, by_endpoint[endpoint], by_model[model]):
+                bucket["calls"] += series.calls
+                bucket["errors"] += 0 if outcome == "ok" else series.calls
+                bucket["retries"] += series.retries
+                bucket["prompt_tokens"] += series.prompt_tokens
+                bucket["completion_tokens"] += series.completion_tokens
+                bucket["latency_sum"] += series.latency_sum
+                bucket["latency_max"] = max(bucket["latency_max"], series.latency_max)
+                if cost is not None:
+                    bucket["cost"] = (bucket["cost"] or 0.0) + cost
+
+        def finish(bucket: Dict[str, Any]) -> Dict[str, Any]:
+            latency_sum = bucket.pop("latency_sum")
+            bucket["avg_latency"] = round(latency_sum / bucket["calls"], 3) if bucket["calls"] else None
+            bucket["latency_max"] = round(bucket["latency_max"], 3)
+            if bucket["cost"] is not None:
+                bucket["cost"] = round(bucket["cost"], 6)
+            return bucket
+
+        return {
+            "totals": finish(totals),
+            "by_endpoint": {endpoint: finish(bucket) for endpoint, bucket in sorted(by_endpoint.items())},
+            "by_model": {model: finish(bucket) for model, bucket in sorted(by_model.items())},
+        }
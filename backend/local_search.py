@@ -0,0 +1,95 @@
+"""Поиск компании в локальной БД до обогащения через веб-поиск и LLM"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Company
+from model_router import company_completeness
+from names import company_name_key, normalize_company_name
+
+
+def company_row_data(company: Company) -> Dict[str, Any]:
+    """Строка companies в формате результата search_company_info"""
+    return {
+        "website": company.website or "",
+        "email": company.email or "",
+        "address": company.address or "",
+        "phone": company.phone or "",
+        "description": company.description or "",
+        "equipment": company.equipment_purchased or "",
+        "preferred_language": company.preferred_language or "ru",
+    }
+
+
+class LocalCompanyResolver:
+    """Ответ на поиск компании из таблицы companies без обращения к LLM.
+
+    Строка подходит, если название совпадает точно, после
+    normalize_company_name или по company_name_key, updated_at не старше
+    max_age секунд, а оценка полноты (company_completeness, как у ответов
+    LLM) не ниже min_score.
+    Устаревшие и неполные строки возвращаются со статусом - вызывающий
+    обогащает компанию заново и может отдать их, если обогащение не удалось.
+    """
+
+    # Сколько строк с совпадающим названием рассматривать (дубликаты до объединения)
+    max_candidates = 20
+
+    def __init__(self, max_age: float = None, min_score: float = None):
+        # 30 дней: контакты компаний меняются редко, устаревшая строка все равно обогащается заново
+        self.max_age = max_age if max_age is not None else float(os.getenv("LOCAL_SEARCH_MAX_AGE", "2592000"))
+        self.min_score = min_score if min_score is not None else float(os.getenv("LOCAL_SEARCH_MIN_SCORE", "0.8"))
+        self.counters = {"hits": 0, "stale": 0, "incomplete": 0, "misses": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age > 0
+
+    async def resolve(self, db: AsyncSession, company_name: str) -> Tuple[Optional[Company], str]:
+        """Лучшая строка для названия и ее статус: "fresh", "stale", "incomplete" или "missing"."""
+        if not self.enabled:
+            return None, "missing"
+
+        conditions = [Company.name == company_name, Company.normalized_name == normalize_company_name(company_name)]
+        name_key = company_name_key(company_name)
+        if name_key:
+            # То же название другим алфавитом: "Рога и Копыта" и "ROGA I KOPYTA"
+            conditions.append(Company.name_key == name_key)
+        candidates = (await db.scalars(
+            select(Company)
+            .where(or_(*conditions))
+            .order_by(Company.updated_at.desc())
+            .limit(self.max_candidates)
+        )).all()
+        if not candidates:
+            self.counters["misses"] += 1
+            return None, "missing"
+
+        # Точное совпадение названия важнее нормализованного, при равенстве - более свежая строка
+        candidates = sorted(candidates, key=lambda company: company.name != company_name)
+        fresh_after = datetime.utcnow() - timedelta(seconds=self.max_age)
+        best_status = None
+        best = None
+        for company in candidates:
+            complete = company_completeness(company_row_data(company)) >= self.min_score
+            fresh = (company.updated_at or company.created_at or datetime.min) >= fresh_after
+            if complete and fresh:
+                self.counters["hits"] += 1
+                return company, "fresh"
+            if best is None or (complete and best_status == "incomplete"):
+                best, best_status = company, "stale" if complete else "incomplete"
+
+        self.counters[best_status] += 1
+        return best, best_status
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = sum(self.counters.values())
+        return {
+            **self.counters,
+            "max_age_seconds": self.max_age,
+            "min_score": self.min_score,
+            "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+        }
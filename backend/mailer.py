@@ -0,0 +1,178 @@
+import asyncio
+import os
+import random
+import smtplib
+import ssl
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+from typing import Any, Callable, Dict, List, Optional
+
+from rate_limiter import AsyncRateLimiter
+
+DeliveryCallback = Callable[[Dict[str, Any], Dict[str, Any]], Any]
+
+
+def _parse_rate_limits(value: str) -> Dict[str, float]:
+    """Разбирает лимиты вида "gmail.com:1,mail.ru:2" (писем в секунду на домен)"""
+    limits = {}
+    for part in (value or "").split(","):
+        if ":" in part:
+            domain, rate = part.rsplit(":", 1)
+            try:
+                limits[domain.strip().lower()] = float(rate)
+            except ValueError:
+                print(f"⚠️ Некорректный лимит SMTP для '{part}', пропускаем")
+    return limits
+
+
+class _WorkerConnection:
+    """SMTP соединение воркера и число писем, отправленных через него"""
+
+    def __init__(self):
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.sent = 0
+
+
+class SMTPSender:
+    """Отправка писем через SMTP пулом воркеров.
+
+    Каждый воркер держит одно авторизованное соединение и отправляет через него
+    до batch_size писем, после чего переподключается. Частота отправки
+    ограничивается по почтовому провайдеру получателя (домену), временные
+    ошибки (4xx, обрыв соединения) повторяются с экспоненциальной задержкой,
+    постоянные (5xx, отказ в получателе) - нет.
+    """
+
+    def __init__(self, host: str = None, port: int = None, username: str = None, password: str = None,
+                 use_tls: bool = None, use_ssl: bool = None, from_address: str = None, workers: int = None,
+                 batch_size: int = None, max_retries: int = None, retry_base_delay: float = None,
+                 default_rate: float = None, provider_rates: Dict[str, float] = None, timeout: float = None):
+        self.host = host if host is not None else os.getenv("SMTP_HOST", "")
+        self.port = port or int(os.getenv("SMTP_PORT", "587"))
+        self.username = username if username is not None else os.getenv("SMTP_USER", "")
+        self.password = password if password is not None else os.getenv("SMTP_PASSWORD", "")
+        self.use_ssl = use_ssl if use_ssl is not None else os.getenv("SMTP_USE_SSL", "false").lower() in ("1", "true", "yes", "on")
+        self.use_tls = use_tls if use_tls is not None else os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes", "on")
+        self.from_address = from_address or os.getenv("SMTP_FROM", "") or self.username
+        self.workers = max(1, workers or int(os.getenv("SMTP_WORKERS", "4")))
+        self.batch_size = max(1, batch_size or int(os.getenv("SMTP_BATCH_SIZE", "100")))
+        self.max_retries = max(1, max_retries or int(os.getenv("SMTP_MAX_RETRIES", "3")))
+        self.retry_base_delay = retry_base_delay if retry_base_delay is not None else float(os.getenv("SMTP_RETRY_BASE_DELAY", "2"))
+        self.timeout = timeout or float(os.getenv("SMTP_TIMEOUT", "30"))
+        self.default_rate = default_rate if default_rate is not None else float(os.getenv("SMTP_DEFAULT_RATE", "5"))
+        self.provider_rates = provider_rates if provider_rates is not None else _parse_rate_limits(os.getenv("SMTP_PROVIDER_RATE_LIMITS", ""))
+        self._limiters: Dict[str, AsyncRateLimiter] = {}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host and self.from_address)
+
+    def _limiter_for(self, email: str) -> AsyncRateLimiter:
+        provider = email.rsplit("@", 1)[-1].lower()
+        limiter = self._limiters.get(provider)
+        if limiter is None:
+            rate = self.provider_rates.get(provider, self.default_rate)
+            limiter = AsyncRateLimiter(rate, burst=max(1, int(rate)))
+            self._limiters[provider] = limiter
+        return limiter
+
+    def build_message(self, to_address: str, subject: str, body: str) -> MIMEMultipart:
+        message = MIMEMultipart("alternative")
+        message["From"] = self.from_address
+        message["To"] = to_address
+        message["Subject"] = subject
+        message["Date"] = formatdate(localtime=True)
+        message["Message-ID"] = make_msgid()
+        message.attach(MIMEText(body, "plain", "utf-8"))
+        return message
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                smtp.starttls(context=ssl.create_default_context())
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    @staticmethod
+    def _disconnect(connection: _WorkerConnection):
+        if connection.smtp is not None:
+            try:
+                connection.smtp.quit()
+            except Exception:
+                pass
+        connection.smtp = None
+        connection.sent = 0
+
+    async def _send_one(self, connection: _WorkerConnection, message: Dict[str, Any]) -> Dict[str, Any]:
+        mime = self.build_message(message["to"], message["subject"], message["body"])
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if connection.smtp is None:
+                    connection.smtp = await asyncio.to_thread(self._connect)
+                await self._limiter_for(message["to"]).acquire()
+                await asyncio.to_thread(connection.smtp.send_message, mime)
+                connection.sent += 1
+                if connection.sent >= self.batch_size:
+                    await asyncio.to_thread(self._disconnect, connection)
+                return {"status": "sent", "attempts": attempt, "error": None}
+            except smtplib.SMTPRecipientsRefused as e:
+                return {"status": "failed", "attempts": attempt, "error": f"Получатель отклонен: {e.recipients}"}
+            except smtplib.SMTPResponseException as e:
+                last_error = f"SMTP {e.smtp_code}: {e.smtp_error!r}"
+                await asyncio.to_thread(self._disconnect, connection)
+                if 500 <= e.smtp_code < 600:
+                    return {"status": "failed", "attempts": attempt, "error": last_error}
+            except (smtplib.SMTPException, OSError) as e:
+                last_error = str(e) or e.__class__.__name__
+                await asyncio.to_thread(self._disconnect, connection)
+
+            if attempt < self.max_retries:
+                delay = self.retry_base_delay * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+        return {"status": "failed", "attempts": self.max_retries, "error": last_error}
+
+    async def _worker(self, queue: asyncio.Queue, on_result: Optional[DeliveryCallback], counts: Dict[str, int]):
+        connection = _WorkerConnection()
+        try:
+            while True:
+                try:
+                    message = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await self._send_one(connection, message)
+                counts[result["status"]] += 1
+                if result["status"] == "failed":
+                    print(f"⚠️ Не удалось отправить письмо на {message['to']}: {result['error']}")
+                if on_result is not None:
+                    callback_result = on_result(message, result)
+                    if asyncio.iscoroutine(callback_result):
+                        await callback_result
+        finally:
+            await asyncio.to_thread(self._disconnect, connection)
+
+    async def send_all(self, messages: List[Dict[str, Any]], on_result: DeliveryCallback = None) -> Dict[str, int]:
+        """Отправляет письма {"to", "subject", "body", ...}; on_result(message, result) - после каждого"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for message in messages:
+            queue.put_nowait(message)
+        counts = {"sent": 0, "failed": 0}
+        if queue.empty():
+            return counts
+        workers = [
+            asyncio.create_task(self._worker(queue, on_result, counts))
+            for _ in range(min(self.workers, queue.qsize()))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                if not worker.done():
+                    worker.cancel()
+        return counts
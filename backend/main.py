@@ -1,20 +1,20 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, BackgroundTasks, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import pandas as pd
 import io
+import os
 import asyncio
 from datetime import datetime
 import json
 import re
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import dns.resolver
 import socket
 
-from database import get_db, create_tables, Company, Equipment, SearchLog, Assistant, EmailCampaign, EmailVerification
+from database import get_async_db, AsyncSessionLocal, SessionLocal, create_tables, Company, Equipment, SearchLog, Assistant, EmailCampaign, EmailVerification, EmailDelivery, Job, Dialog, DialogMessage
 from schemas import (
     Company as CompanySchema, 
     CompanyCreate, 
@@ -32,12 +32,47 @@ from schemas import (
     EmailCampaign as EmailCampaignSchema,
     EmailVerificationRequest,
     EmailVerification as EmailVerificationSchema,
+    EmailDelivery as EmailDeliverySchema,
+    Dialog as DialogSchema,
+    DialogDetail,
     AgentActionRequest,
-    AgentActionResponse
+    AgentActionResponse,
+    JobStatus
 )
 from polza_client import PolzaAIClient
+from enrichment import BulkEnricher
+from jobs import JobRunner, JobContext, describe_job
+from email_verifier import MXResolver, VerificationFreshnessPolicy, verify_emails_batch, deliverable_emails, is_valid_email_format, email_domain, mx_verification_status
+from mailer import SMTPSender
+from chat_turn import chat_turn
+from llm_telemetry import endpoint_label, llm_endpoint
+from resilience import render_prometheus as render_upstream_prometheus, retry_budget
+from dialog_history import DialogHistoryWindow, add_dialog_message, get_or_create_dialog, message_dict
+from local_search import LocalCompanyResolver, company_row_data
+from company_search import search_companies_query
+from pagination import paginate
+from entity_resolution import EntityResolver
 
-app = FastAPI(title="AGB Searcher API", version="1.0.0")
+polza_client = PolzaAIClient()
+job_runner = JobRunner()
+mx_resolver = MXResolver()
+verification_policy = VerificationFreshnessPolicy()
+email_sender = SMTPSender()
+history_window = DialogHistoryWindow(polza_client)
+local_resolver = LocalCompanyResolver()
+entity_resolver = EntityResolver()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Жизненный цикл приложения: воркер фоновых задач и общий пул HTTP соединений"""
+    job_runner.register("bulk_search", _run_bulk_search_job)
+    job_runner.register("bulk_verify_emails", _run_bulk_verify_emails_job)
+    job_runner.start()
+    yield
+    await job_runner.stop()
+    await polza_client.aclose()
+
+app = FastAPI(title="AGB Searcher API", version="1.0.0", lifespan=lifespan)
 
 # Настройка CORS
 app.add_middleware(
@@ -46,24 +81,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.middleware("http")
+async def upstream_request_scope(request, call_next):
+    """Вызовы LLM внутри запроса учитываются в телеметрии под его эндпоинтом и делят один бюджет повторов"""
+    with llm_endpoint(endpoint_label(request.url.path)), retry_budget():
+        return await call_next(request)
+
 # Создание таблиц при запуске
 create_tables()
 
-polza_client = PolzaAIClient()
+async def _list_page(response: Response, db: AsyncSession, statement, limit: int, cursor: str = None, skip: int = 0,
+                     keys=None, descending: bool = False):
+    """Страница списка по курсору; курсор следующей страницы - в заголовке X-Next-Cursor"""
+    try:
+        rows, next_cursor = await paginate(db, statement, limit, keys=keys, cursor=cursor, skip=skip, descending=descending)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 @app.get("/")
 async def root():
     return {"message": "AGB Searcher API работает!"}
 
 @app.post("/companies", response_model=CompanySchema)
-async def create_company(company: CompanyCreate, db: Session = Depends(get_db)):
+async def create_company(company: CompanyCreate, db: AsyncSession = Depends(get_async_db)):
     """Создать новую компанию"""
-    # Проверяем, не существует ли уже такая компания
-    existing_company = db.query(Company).filter(Company.name == company.name).first()
-    if existing_company:
-        raise HTTPException(status_code=400, detail="Компания с таким названием уже существует")
+    # Проверяем, не существует ли уже такая компания: то же название в другом написании, тот же сайт или email
+    duplicate = await entity_resolver.find_duplicate(db, company.name, company.website or "", company.email or "")
+    if duplicate:
+        existing_company, _, _ = duplicate
+        raise HTTPException(status_code=400, detail=f"Компания уже существует: {existing_company.name} (id {existing_company.id})")
     
     db_company = Company(
         name=company.name,
@@ -75,20 +127,46 @@ async def create_company(company: CompanyCreate, db: Session = Depends(get_db)):
         equipment_purchased=company.equipment_purchased or ""
     )
     db.add(db_company)
-    db.commit()
-    db.refresh(db_company)
+    await db.commit()
+    await db.refresh(db_company)
     return db_company
 
 @app.get("/companies", response_model=List[CompanySchema])
-async def get_companies(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Получить список всех компаний"""
-    companies = db.query(Company).offset(skip).limit(limit).all()
-    return companies
+async def get_companies(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    has_email: Optional[bool] = None,
+    verified: Optional[bool] = None,
+    language: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Получить список компаний; q - поиск по названию, описанию, адресу и оборудованию (лучшие совпадения первыми),
+    has_email, verified и language - фильтры, cursor - из X-Next-Cursor предыдущей страницы"""
+    statement = search_companies_query(q, db.bind.dialect.name, has_email=has_email, verified=verified, language=language)
+    # Результаты поиска упорядочены по рангу - их курсор хранит смещение, список без поиска идет по id
+    keys = None if q and q.strip() else (Company.id,)
+    return await _list_page(response, db, statement, limit, cursor=cursor, skip=skip, keys=keys)
+
+def _duplicates_report(limit: int) -> dict:
+    db = SessionLocal()
+    try:
+        return entity_resolver.merge_report_from_db(db, max_clusters=limit, max_possible=limit)
+    finally:
+        db.close()
+
+@app.get("/companies/duplicates")
+async def get_company_duplicates(limit: int = 100):
+    """Отчет о дубликатах среди всех компаний: группы для объединения и пары для ручной проверки"""
+    # Отчет по всей таблице считается в отдельном потоке, чтобы не блокировать event loop
+    return await asyncio.to_thread(_duplicates_report, limit)
 
 @app.get("/companies/{company_id}", response_model=CompanySchema)
-async def get_company(company_id: int, db: Session = Depends(get_db)):
+async def get_company(company_id: int, db: AsyncSession = Depends(get_async_db)):
     """Получить информацию о конкретной компании"""
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = await db.get(Company, company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Компания не найдена")
     return company
@@ -97,10 +175,10 @@ async def get_company(company_id: int, db: Session = Depends(get_db)):
 async def update_company(
     company_id: int, 
     company_update: CompanyUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Обновить информацию о компании"""
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = await db.get(Company, company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Компания не найдена")
     
@@ -109,17 +187,17 @@ async def update_company(
         setattr(company, field, value)
     
     company.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(company)
+    await db.commit()
+    await db.refresh(company)
     return company
 
 @app.post("/companies/search", response_model=CompanySearchResult)
 async def search_company_info(
     search_request: SearchRequest, 
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Поиск информации о компании через Polza.AI"""
+    """Поиск информации о компании: сначала в БД, для промахов и устаревших строк - через Polza.AI"""
     company_name = search_request.query.strip()
     
     if not company_name:
@@ -132,14 +210,25 @@ async def search_company_info(
         results_count=0
     )
     db.add(search_log)
-    db.commit()
+    await db.commit()
     
-    # Поиск через Polza.AI с retry механизмом
-    company_info = await polza_client.search_company_info(company_name, retry_count=2)
+    # Свежая заполненная строка из БД отвечает без веб-поиска и LLM
+    local_company, local_status = await local_resolver.resolve(db, company_name)
+    if local_status == "fresh":
+        company_info, source = company_row_data(local_company), "database"
+        company_name = local_company.name
+    else:
+        # Поиск через Polza.AI с retry механизмом
+        company_info = await polza_client.search_company_info(company_name, retry_count=2)
+        source = "enrichment"
+        if not company_info and local_company is not None:
+            # Обогащение не удалось - отдаем устаревшие или неполные данные из БД вместо 404
+            company_info, source = company_row_data(local_company), "database_stale"
+            company_name = local_company.name
     
     # Обновляем лог
     search_log.results_count = 1 if company_info else 0
-    db.commit()
+    await db.commit()
     
     if not company_info:
         raise HTTPException(status_code=404, detail="Информация о компании не найдена")
@@ -152,14 +241,15 @@ async def search_company_info(
         phone=company_info.get("phone", ""),
         description=company_info.get("description", ""),
         equipment=company_info.get("equipment", ""),
-        preferred_language=company_info.get("preferred_language", "ru")
+        preferred_language=company_info.get("preferred_language", "ru"),
+        source=source
     )
 
 @app.post("/equipment/search", response_model=EquipmentSearchResult)
 async def search_companies_by_equipment(
     search_request: SearchRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Поиск компаний, которые купили определенное оборудование"""
     equipment_name = search_request.query.strip()
@@ -174,14 +264,14 @@ async def search_companies_by_equipment(
         results_count=0
     )
     db.add(search_log)
-    db.commit()
+    await db.commit()
     
     # Поиск через Polza.AI
     companies_data = await polza_client.search_companies_by_equipment(equipment_name)
     
     # Обновляем лог
     search_log.results_count = len(companies_data)
-    db.commit()
+    await db.commit()
     
     companies = []
     for company_data in companies_data:
@@ -202,11 +292,57 @@ async def search_companies_by_equipment(
         total_found=len(companies)
     )
 
+async def _run_bulk_search_job(ctx: JobContext):
+    """Обработчик фоновой задачи массового поиска компаний"""
+    items_by_name = {}
+    for item in await ctx.pending_items():
+        if item.payload in items_by_name:
+            # Задачи, созданные до очистки названий при загрузке, могут содержать одинаковые строки
+            await ctx.skip_item(item, f"Повторяет строку файла: {item.payload}")
+        else:
+            items_by_name[item.payload] = item
+    
+    # Пропускаем компании, которые уже есть в БД или повторяют строку файла в другом написании
+    # ("ООО Рога и Копыта" и "ROGA I KOPYTA") - до обогащения, чтобы не тратить на них LLM
+    names_to_search, skipped = await ctx.db.run_sync(entity_resolver.filter_new_names, list(items_by_name))
+    for name, reason in skipped.items():
+        await ctx.skip_item(items_by_name[name], reason)
+    
+    enricher = BulkEnricher(polza_client, retry_count=2)
+    
+    async def save_result(result):
+        item = items_by_name[result["name"]]
+        company_info = result["info"]
+        if result["error"]:
+            await ctx.fail_item(item, result["error"])
+        elif company_info:
+            # Сохраняем в БД вместе с отметкой строки - одним коммитом
+            new_company = Company(
+                name=result["name"],
+                website=company_info.get("website", ""),
+                email=company_info.get("email", ""),
+                address=company_info.get("address", ""),
+                phone=company_info.get("phone", ""),
+                description=company_info.get("description", ""),
+                equipment_purchased=company_info.get("equipment", ""),
+                preferred_language=company_info.get("preferred_language", "ru")
+            )
+            await ctx.complete_item(item, result=company_info, found=True, records=[new_company])
+        else:
+            await ctx.complete_item(item)
+        
+        if ctx.cancelled:
+            # Не прерываем соседние воркеры посреди сохранения в общей сессии - только перестаем выдавать компании
+            enricher.stop()
+    
+    # Поиск информации через Polza.AI параллельно, с ограничением одновременных запросов
+    await enricher.run(names_to_search, on_result=save_result)
+
 @app.post("/companies/bulk-search", response_model=FileUploadResponse)
 async def bulk_search_companies(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Массовый поиск информации о компаниях из файла"""
     if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
@@ -222,95 +358,121 @@ async def bulk_search_companies(
             df = pd.read_excel(io.BytesIO(content))
         
         # Предполагаем, что названия компаний в первом столбце
-        company_names = df.iloc[:, 0].dropna().unique().tolist()
-        
-        companies_processed = 0
-        companies_found = 0
-        
-        # Обрабатываем каждую компанию
-        for company_name in company_names:
-            if not company_name or len(str(company_name).strip()) == 0:
-                continue
-                
-            company_name = str(company_name).strip()
-            companies_processed += 1
-            
-            # Проверяем, есть ли уже такая компания в БД
-            existing_company = db.query(Company).filter(Company.name == company_name).first()
-            if existing_company:
-                continue
-            
-            # Поиск информации через Polza.AI с retry механизмом
-            company_info = await polza_client.search_company_info(company_name, retry_count=2)
-            
-            if company_info:
-                companies_found += 1
-                
-                # Сохраняем в БД
-                new_company = Company(
-                    name=company_name,
-                    website=company_info.get("website", ""),
-                    email=company_info.get("email", ""),
-                    address=company_info.get("address", ""),
-                    phone=company_info.get("phone", ""),
-                    description=company_info.get("description", ""),
-                    equipment_purchased=company_info.get("equipment", ""),
-                    preferred_language=company_info.get("preferred_language", "ru")
-                )
-                db.add(new_company)
+        company_names = [str(name).strip() for name in df.iloc[:, 0].dropna().tolist()]
+        # Убираем пустые и повторяющиеся строки после strip(): "Рога " и "Рога" - одна строка задачи
+        company_names = list(dict.fromkeys(name for name in company_names if name))
         
-        db.commit()
+        # Обработка идет в фоне, клиент опрашивает GET /jobs/{job_id}
+        job = await db.run_sync(job_runner.create_job, "bulk_search", company_names, source_name=file.filename)
         
         return FileUploadResponse(
-            message=f"Обработано {companies_processed} компаний, найдено информации для {companies_found}",
-            companies_processed=companies_processed,
-            companies_found=companies_found
+            message=f"Файл принят в обработку: {len(company_names)} компаний",
+            companies_processed=0,
+            companies_found=0,
+            job_id=job.id
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка при обработке файла: {str(e)}")
 
 @app.get("/equipment", response_model=List[EquipmentSchema])
-async def get_equipment(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_equipment(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                        db: AsyncSession = Depends(get_async_db)):
     """Получить список всего оборудования"""
-    equipment = db.query(Equipment).offset(skip).limit(limit).all()
-    return equipment
+    return await _list_page(response, db, select(Equipment), limit, cursor=cursor, skip=skip, keys=(Equipment.id,))
 
 @app.get("/search-logs")
-async def get_search_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Получить историю поисков"""
-    logs = db.query(SearchLog).order_by(SearchLog.created_at.desc()).offset(skip).limit(limit).all()
-    return logs
+async def get_search_logs(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                          db: AsyncSession = Depends(get_async_db)):
+    """Получить историю поисков (новые первыми)"""
+    return await _list_page(response, db, select(SearchLog), limit, cursor=cursor, skip=skip,
+                            keys=(SearchLog.created_at, SearchLog.id), descending=True)
 
 # Заглушки для endpoints диалогов и помощников (для совместимости с frontend)
-@app.get("/dialogs")
-async def get_dialogs(skip: int = 0, limit: int = 100):
-    """Получить список диалогов (заглушка)"""
-    return []
+@app.get("/dialogs", response_model=List[DialogSchema])
+async def get_dialogs(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                      db: AsyncSession = Depends(get_async_db)):
+    """Получить список диалогов (последние измененные первыми).
+
+    Курсор идет по изменяемому updated_at: диалог, в который написали во время
+    листания, переходит на первую страницу и на следующих не встретится -
+    новые сообщения видны при повторном запросе первой страницы.
+    """
+    return await _list_page(response, db, select(Dialog), limit, cursor=cursor, skip=skip,
+                            keys=(Dialog.updated_at, Dialog.id), descending=True)
 
-@app.get("/dialogs/{dialog_id}")
-async def get_dialog(dialog_id: int):
-    """Получить диалог по ID (заглушка)"""
-    raise HTTPException(status_code=404, detail="Диалог не найден")
+@app.get("/dialogs/{dialog_id}", response_model=DialogDetail)
+async def get_dialog(dialog_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Получить диалог по ID вместе с сообщениями"""
+    dialog = await db.get(Dialog, dialog_id)
+    if not dialog:
+        raise HTTPException(status_code=404, detail="Диалог не найден")
+    messages = (await db.scalars(select(DialogMessage).where(DialogMessage.dialog_id == dialog.id).order_by(DialogMessage.id))).all()
+    return {
+        "id": dialog.id,
+        "title": dialog.title,
+        "created_at": dialog.created_at,
+        "updated_at": dialog.updated_at,
+        "messages": [message_dict(message) for message in messages]
+    }
 
-@app.post("/dialogs")
-async def create_dialog(dialog: dict):
-    """Создать новый диалог (заглушка)"""
-    return {"id": 1, "title": dialog.get("title", "Новый диалог")}
+@app.post("/dialogs", response_model=DialogSchema)
+async def create_dialog(dialog: dict, db: AsyncSession = Depends(get_async_db)):
+    """Создать новый диалог"""
+    db_dialog = Dialog(title=(dialog.get("title") or "Новый диалог").strip())
+    db.add(db_dialog)
+    await db.commit()
+    await db.refresh(db_dialog)
+    return db_dialog
 
 @app.delete("/dialogs/{dialog_id}")
-async def delete_dialog(dialog_id: int):
-    """Удалить диалог (заглушка)"""
+async def delete_dialog(dialog_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Удалить диалог вместе с сообщениями"""
+    dialog = await db.get(Dialog, dialog_id)
+    if not dialog:
+        raise HTTPException(status_code=404, detail="Диалог не найден")
+    await db.execute(delete(DialogMessage).where(DialogMessage.dialog_id == dialog.id).execution_options(synchronize_session=False))
+    await db.delete(dialog)
+    await db.commit()
     return {"message": "Диалог удален"}
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Статистика поиска компаний в БД, кэша результатов поиска и объединения одновременных поисков"""
+    return {
+        "local_search": local_resolver.stats(),
+        "entity_resolution": entity_resolver.stats(),
+        "company_info": polza_client.company_cache.stats(),
+        "company_lookups_singleflight": polza_client.company_lookups.stats(),
+        "mx_records": mx_resolver.stats()
+    }
+
+@app.get("/metrics/llm")
+async def get_llm_metrics():
+    """Сводка по вызовам LLM: вызовы, ошибки, повторы, токены, задержка и стоимость по эндпоинтам и моделям,
+    состояние upstream (повторы, circuit breaker), очередей регулятора и уровней моделей"""
+    return {
+        **polza_client.telemetry.summary(),
+        "upstreams": {name: policy.stats() for name, policy in polza_client.upstream_policies.items()},
+        "governor": polza_client.llm_governor.stats(),
+        "routing": polza_client.model_router.stats(),
+        "parsing": {**polza_client.parse_stats, "plain_json_models": sorted(polza_client.plain_json_models)},
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """Метрики вызовов LLM и upstream в текстовом формате Prometheus"""
+    body = polza_client.telemetry.render_prometheus() + render_upstream_prometheus(polza_client.upstream_policies)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 @app.get("/assistants", response_model=List[AssistantSchema])
-async def get_assistants(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_assistants(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                         db: AsyncSession = Depends(get_async_db)):
     """Получить список помощников"""
-    assistants = db.query(Assistant).offset(skip).limit(limit).all()
-    return assistants
+    return await _list_page(response, db, select(Assistant), limit, cursor=cursor, skip=skip, keys=(Assistant.id,))
 
 @app.post("/assistants", response_model=AssistantSchema)
-async def create_assistant(assistant: AssistantCreate, db: Session = Depends(get_db)):
+async def create_assistant(assistant: AssistantCreate, db: AsyncSession = Depends(get_async_db)):
     """Создать нового помощника"""
     db_assistant = Assistant(
         name=assistant.name,
@@ -321,14 +483,14 @@ async def create_assistant(assistant: AssistantCreate, db: Session = Depends(get
         max_tokens=assistant.max_tokens
     )
     db.add(db_assistant)
-    db.commit()
-    db.refresh(db_assistant)
+    await db.commit()
+    await db.refresh(db_assistant)
     return db_assistant
 
 @app.put("/assistants/{assistant_id}", response_model=AssistantSchema)
-async def update_assistant(assistant_id: int, assistant_update: AssistantUpdate, db: Session = Depends(get_db)):
+async def update_assistant(assistant_id: int, assistant_update: AssistantUpdate, db: AsyncSession = Depends(get_async_db)):
     """Обновить помощника"""
-    assistant = db.query(Assistant).filter(Assistant.id == assistant_id).first()
+    assistant = await db.get(Assistant, assistant_id)
     if not assistant:
         raise HTTPException(status_code=404, detail="Помощник не найден")
     
@@ -337,19 +499,19 @@ async def update_assistant(assistant_id: int, assistant_update: AssistantUpdate,
         setattr(assistant, field, value)
     
     assistant.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(assistant)
+    await db.commit()
+    await db.refresh(assistant)
     return assistant
 
 @app.delete("/assistants/{assistant_id}")
-async def delete_assistant(assistant_id: int, db: Session = Depends(get_db)):
+async def delete_assistant(assistant_id: int, db: AsyncSession = Depends(get_async_db)):
     """Удалить помощника"""
-    assistant = db.query(Assistant).filter(Assistant.id == assistant_id).first()
+    assistant = await db.get(Assistant, assistant_id)
     if not assistant:
         raise HTTPException(status_code=404, detail="Помощник не найден")
     
-    db.delete(assistant)
-    db.commit()
+    await db.delete(assistant)
+    await db.commit()
     return {"message": "Помощник удален"}
 
 @app.get("/models")
@@ -385,8 +547,91 @@ async def delete_assistant(assistant_id: int):
     """Удалить помощника (заглушка)"""
     return {"message": "Помощник удален"}
 
+async def _save_companies_from_message(message: str, db: AsyncSession) -> List[str]:
+    """Выполняет команду агента "найди и сохрани компанию X", возвращает сохраненные названия"""
+    # Проверяем, нужно ли выполнить действия агента
+    # Ищем команды типа "найди и сохрани компанию X" или "поищи информацию о Y"
+    company_names = polza_client._extract_company_names_from_message(message)
+    should_save = any(word in message.lower() for word in ['сохрани', 'добавь', 'запиши', 'save', 'add'])
+    
+    saved_companies = []
+    if company_names and should_save:
+        for company_name in company_names:
+            try:
+                # Проверяем, не существует ли уже такая компания - до поиска, чтобы не вызывать LLM зря
+                duplicate = await entity_resolver.find_duplicate(db, company_name)
+                if duplicate:
+                    print(f"♻️ Компания '{company_name}' уже есть в БД: {duplicate[0].name}")
+                    continue
+                
+                # Ищем информацию о компании с retry механизмом
+                company_info = await polza_client.search_company_info(company_name, retry_count=2)
+                if company_info:
+                    # Сохраняем в БД
+                    new_company = Company(
+                        name=company_name,
+                        website=company_info.get("website", ""),
+                        email=company_info.get("email", ""),
+                        address=company_info.get("address", ""),
+                        phone=company_info.get("phone", ""),
+                        description=company_info.get("description", ""),
+                        equipment_purchased=company_info.get("equipment", ""),
+                        preferred_language=company_info.get("preferred_language", "ru")
+                    )
+                    db.add(new_company)
+                    await db.commit()
+                    saved_companies.append(company_name)
+                    print(f"✅ Компания '{company_name}' успешно сохранена в БД")
+            except Exception as e:
+                print(f"❌ Ошибка при сохранении компании {company_name}: {e}")
+                import traceback
+                traceback.print_exc()
+                # Продолжаем работу даже если не удалось сохранить компанию
+    return saved_companies
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+async def _stream_chat_dialog(message: str, dialog_id: int):
+    """События потокового ответа /chat/dialog; done содержит то же, что и обычный ответ"""
+    # Сессия зависимости get_async_db может закрыться раньше, чем закончится поток - работаем со своей
+    async with AsyncSessionLocal() as db:
+        dialog = await db.get(Dialog, dialog_id)
+        history = await history_window.build(db, dialog)
+        user_message = await add_dialog_message(db, dialog, "user", message)
+        
+        with chat_turn() as turn:
+            ai_response = ""
+            try:
+                async for event in polza_client.chat_with_llm_stream(message, history):
+                    if event["event"] == "done":
+                        ai_response = event["data"]["message"]
+                        continue
+                    yield _sse_event(event["event"], event["data"])
+            except Exception as e:
+                print(f"Ошибка при получении потокового ответа от AI: {e}")
+                import traceback
+                traceback.print_exc()
+                ai_response = f"Извините, произошла ошибка при обработке вашего запроса. Попробуйте переформулировать вопрос или обратитесь к администратору. Ошибка: {str(e)[:100]}"
+                yield _sse_event("error", {"message": ai_response})
+            
+            saved_companies = await _save_companies_from_message(message, db)
+        print(f"📊 Обращения к upstream за ход чата: {turn.stats()}")
+        if saved_companies:
+            saved_text = f"\n\n✅ Сохранено компаний в базу данных: {', '.join(saved_companies)}"
+            ai_response += saved_text
+            yield _sse_event("token", {"content": saved_text})
+        
+        assistant_message = await add_dialog_message(db, dialog, "assistant", ai_response)
+        yield _sse_event("done", {
+            "message": ai_response,
+            "messages": [message_dict(user_message), message_dict(assistant_message)],
+            "dialog_id": dialog.id,
+            "turn_stats": turn.stats()
+        })
+
 @app.post("/chat/dialog")
-async def chat_with_dialog(chat_request: dict, db: Session = Depends(get_db)):
+async def chat_with_dialog(chat_request: dict, db: AsyncSession = Depends(get_async_db)):
     """Общение с AI в диалоге с поддержкой функций агента"""
     try:
         message = chat_request.get("message", "")
@@ -398,69 +643,47 @@ async def chat_with_dialog(chat_request: dict, db: Session = Depends(get_db)):
         
         print(f"📨 Получено сообщение в чат: '{message[:100]}...'")
         
-        # Проверяем, нужно ли выполнить действия агента
-        # Ищем команды типа "найди и сохрани компанию X" или "поищи информацию о Y"
-        company_names = polza_client._extract_company_names_from_message(message)
-        should_save = any(word in message.lower() for word in ['сохрани', 'добавь', 'запиши', 'save', 'add'])
+        # История диалога хранится на сервере; conversation_history от клиента нужна только для переноса старых диалогов
+        dialog = await get_or_create_dialog(db, dialog_id, message, conversation_history)
+        
+        if chat_request.get("stream"):
+            # Потоковый режим: события Server-Sent Events по мере готовности поиска и ответа
+            return StreamingResponse(
+                _stream_chat_dialog(message, dialog.id),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
         
-        # Если найдены компании и есть команда на сохранение, выполняем поиск и сохранение
-        saved_companies = []
-        if company_names and should_save:
-            for company_name in company_names:
-                try:
-                    # Ищем информацию о компании с retry механизмом
-                    company_info = await polza_client.search_company_info(company_name, retry_count=2)
-                    
-                    # Проверяем, не существует ли уже такая компания
-                    existing_company = db.query(Company).filter(Company.name == company_name).first()
-                    if not existing_company and company_info:
-                        # Сохраняем в БД
-                        new_company = Company(
-                            name=company_name,
-                            website=company_info.get("website", ""),
-                            email=company_info.get("email", ""),
-                            address=company_info.get("address", ""),
-                            phone=company_info.get("phone", ""),
-                            description=company_info.get("description", ""),
-                            equipment_purchased=company_info.get("equipment", ""),
-                            preferred_language=company_info.get("preferred_language", "ru")
-                        )
-                        db.add(new_company)
-                        db.commit()
-                        db.refresh(new_company)
-                        saved_companies.append(company_name)
-                        print(f"✅ Компания '{company_name}' успешно сохранена в БД")
-                except Exception as e:
-                    print(f"❌ Ошибка при сохранении компании {company_name}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    # Продолжаем работу даже если не удалось сохранить компанию
+        # В LLM уходит резюме старой части диалога и последние сообщения в пределах бюджета токенов
+        history = await history_window.build(db, dialog)
+        user_message = await add_dialog_message(db, dialog, "user", message)
         
-        # Получаем ответ от AI
-        try:
-            ai_response = await polza_client.chat_with_llm(message, conversation_history)
-        except Exception as e:
-            print(f"Ошибка при получении ответа от AI: {e}")
-            import traceback
-            traceback.print_exc()
-            # Возвращаем понятное сообщение об ошибке
-            ai_response = f"Извините, произошла ошибка при обработке вашего запроса. Попробуйте переформулировать вопрос или обратитесь к администратору. Ошибка: {str(e)[:100]}"
+        with chat_turn() as turn:
+            # Если найдены компании и есть команда на сохранение, выполняем поиск и сохранение
+            saved_companies = await _save_companies_from_message(message, db)
+            
+            # Получаем ответ от AI (уже найденные компании берутся из хода чата, а не ищутся заново)
+            try:
+                ai_response = await polza_client.chat_with_llm(message, history)
+            except Exception as e:
+                print(f"Ошибка при получении ответа от AI: {e}")
+                import traceback
+                traceback.print_exc()
+                # Возвращаем понятное сообщение об ошибке
+                ai_response = f"Извините, произошла ошибка при обработке вашего запроса. Попробуйте переформулировать вопрос или обратитесь к администратору. Ошибка: {str(e)[:100]}"
+        print(f"📊 Обращения к upstream за ход чата: {turn.stats()}")
         
         # Добавляем информацию о сохраненных компаниях в ответ
         if saved_companies:
             ai_response += f"\n\n✅ Сохранено компаний в базу данных: {', '.join(saved_companies)}"
         
-        # Создаем новый диалог, если его нет
-        if not dialog_id:
-            dialog_id = 1
+        assistant_message = await add_dialog_message(db, dialog, "assistant", ai_response)
         
         return {
             "message": ai_response,
-            "conversation_history": conversation_history + [
-                {"role": "user", "content": message, "timestamp": datetime.utcnow().isoformat()},
-                {"role": "assistant", "content": ai_response, "timestamp": datetime.utcnow().isoformat()}
-            ],
-            "dialog_id": dialog_id
+            "messages": [message_dict(user_message), message_dict(assistant_message)],
+            "dialog_id": dialog.id,
+            "turn_stats": turn.stats()
         }
     except HTTPException:
         raise
@@ -471,7 +694,7 @@ async def chat_with_dialog(chat_request: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
 
 @app.post("/agent/action", response_model=AgentActionResponse)
-async def agent_action(action_request: AgentActionRequest, db: Session = Depends(get_db)):
+async def agent_action(action_request: AgentActionRequest, db: AsyncSession = Depends(get_async_db)):
     """Выполнение действий агента (поиск, сохранение компаний и т.д.)"""
     action = action_request.action
     params = action_request.parameters
@@ -491,9 +714,9 @@ async def agent_action(action_request: AgentActionRequest, db: Session = Depends
                 return AgentActionResponse(success=False, message="Не указано название компании")
             
             # Проверяем, не существует ли уже такая компания
-            existing_company = db.query(Company).filter(Company.name == company_name).first()
-            if existing_company:
-                return AgentActionResponse(success=False, message=f"Компания '{company_name}' уже существует в базе данных")
+            duplicate = await entity_resolver.find_duplicate(db, company_name)
+            if duplicate:
+                return AgentActionResponse(success=False, message=f"Компания '{duplicate[0].name}' уже существует в базе данных")
             
             # Ищем информацию о компании с retry механизмом
             company_info = await polza_client.search_company_info(company_name, retry_count=2)
@@ -509,8 +732,8 @@ async def agent_action(action_request: AgentActionRequest, db: Session = Depends
                 equipment_purchased=company_info.get("equipment", "")
             )
             db.add(new_company)
-            db.commit()
-            db.refresh(new_company)
+            await db.commit()
+            await db.refresh(new_company)
             
             return AgentActionResponse(
                 success=True, 
@@ -523,18 +746,19 @@ async def agent_action(action_request: AgentActionRequest, db: Session = Depends
             if not company_name:
                 return AgentActionResponse(success=False, message="Не указано название компании")
             
-            # Ищем информацию с retry механизмом
-            company_info = await polza_client.search_company_info(company_name, retry_count=2)
-            
-            # Проверяем, не существует ли уже такая компания
-            existing_company = db.query(Company).filter(Company.name == company_name).first()
-            if existing_company:
+            # Проверяем, не существует ли уже такая компания - тогда отдаем ее данные без поиска
+            duplicate = await entity_resolver.find_duplicate(db, company_name)
+            if duplicate:
+                existing_company = duplicate[0]
                 return AgentActionResponse(
                     success=True, 
-                    message=f"Компания '{company_name}' уже существует в базе данных",
-                    data={"company_id": existing_company.id, "company": company_info}
+                    message=f"Компания '{existing_company.name}' уже существует в базе данных",
+                    data={"company_id": existing_company.id, "company": company_row_data(existing_company)}
                 )
             
+            # Ищем информацию с retry механизмом
+            company_info = await polza_client.search_company_info(company_name, retry_count=2)
+            
             # Сохраняем в БД
             new_company = Company(
                 name=company_name,
@@ -546,8 +770,8 @@ async def agent_action(action_request: AgentActionRequest, db: Session = Depends
                 equipment_purchased=company_info.get("equipment", "")
             )
             db.add(new_company)
-            db.commit()
-            db.refresh(new_company)
+            await db.commit()
+            await db.refresh(new_company)
             
             return AgentActionResponse(
                 success=True, 
@@ -561,13 +785,12 @@ async def agent_action(action_request: AgentActionRequest, db: Session = Depends
     except Exception as e:
         return AgentActionResponse(success=False, message=f"Ошибка при выполнении действия: {str(e)}")
 
-async def _verify_email_internal(email: str, company_id: int = None, db: Session = None) -> EmailVerification:
+async def _verify_email_internal(email: str, company_id: int = None, db: AsyncSession = None) -> EmailVerification:
     """Внутренняя функция для проверки email адреса"""
     email = email.strip().lower()
     
     # Проверяем базовый формат
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    is_valid_format = bool(re.match(email_pattern, email))
+    is_valid_format = is_valid_email_format(email)
     
     if not is_valid_format:
         verification = EmailVerification(
@@ -579,37 +802,28 @@ async def _verify_email_internal(email: str, company_id: int = None, db: Session
             error_message="Неверный формат email адреса"
         )
         db.add(verification)
-        db.commit()
-        db.refresh(verification)
+        await db.commit()
+        await db.refresh(verification)
         return verification
     
     # Проверяем домен
     domain = email.split('@')[1]
-    is_deliverable = False
-    error_message = None
-    
-    try:
-        # Проверяем MX записи
-        mx_records = dns.resolver.resolve(domain, 'MX')
-        if mx_records:
-            is_deliverable = True
-    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.Timeout):
-        error_message = "Домен не найден или не имеет MX записей"
-    except Exception as e:
-        error_message = f"Ошибка при проверке домена: {str(e)}"
+    # Проверяем MX записи (асинхронно, с кэшем по домену)
+    has_mx, error_message = await mx_resolver.check(domain)
+    is_deliverable = bool(has_mx)
     
-    verification_status = "verified" if is_deliverable else "invalid"
+    verification_status = mx_verification_status(has_mx)
     
     # Проверяем, есть ли уже запись об этой проверке
-    existing = db.query(EmailVerification).filter(EmailVerification.email == email).first()
+    existing = await db.scalar(select(EmailVerification).where(EmailVerification.email == email).limit(1))
     if existing:
         existing.is_valid = is_valid_format
         existing.is_deliverable = is_deliverable
         existing.verification_status = verification_status
         existing.error_message = error_message
         existing.last_checked = datetime.utcnow()
-        db.commit()
-        db.refresh(existing)
+        await db.commit()
+        await db.refresh(existing)
         return existing
     
     verification = EmailVerification(
@@ -621,12 +835,12 @@ async def _verify_email_internal(email: str, company_id: int = None, db: Session
         error_message=error_message
     )
     db.add(verification)
-    db.commit()
-    db.refresh(verification)
+    await db.commit()
+    await db.refresh(verification)
     return verification
 
 @app.post("/email/verify", response_model=EmailVerificationSchema)
-async def verify_email(verification_request: EmailVerificationRequest, db: Session = Depends(get_db)):
+async def verify_email(verification_request: EmailVerificationRequest, db: AsyncSession = Depends(get_async_db)):
     """Проверка email адреса на валидность и доставляемость"""
     email = verification_request.email.strip().lower()
     
@@ -636,7 +850,7 @@ async def verify_email(verification_request: EmailVerificationRequest, db: Sessi
     return await _verify_email_internal(email, verification_request.company_id if verification_request.company_id else None, db)
 
 @app.post("/email/campaign", response_model=EmailCampaignSchema)
-async def create_email_campaign(campaign: EmailCampaignCreate, db: Session = Depends(get_db)):
+async def create_email_campaign(campaign: EmailCampaignCreate, db: AsyncSession = Depends(get_async_db)):
     """Создание email рассылки"""
     company_ids_json = json.dumps(campaign.company_ids) if campaign.company_ids else None
     
@@ -647,64 +861,113 @@ async def create_email_campaign(campaign: EmailCampaignCreate, db: Session = Dep
         status="draft"
     )
     db.add(email_campaign)
-    db.commit()
-    db.refresh(email_campaign)
+    await db.commit()
+    await db.refresh(email_campaign)
     return email_campaign
 
 @app.post("/email/campaign/{campaign_id}/send")
-async def send_email_campaign(campaign_id: int, db: Session = Depends(get_db)):
+async def send_email_campaign(campaign_id: int, db: AsyncSession = Depends(get_async_db)):
     """Отправка email рассылки с учетом предпочтительного языка компаний"""
-    campaign = db.query(EmailCampaign).filter(EmailCampaign.id == campaign_id).first()
+    campaign = await db.get(EmailCampaign, campaign_id)
     if not campaign:
         raise HTTPException(status_code=404, detail="Рассылка не найдена")
+    if not email_sender.configured:
+        raise HTTPException(status_code=400, detail="SMTP сервер не настроен (SMTP_HOST, SMTP_FROM)")
     
-    # Получаем список компаний для рассылки
+    # Получаем список компаний для рассылки вместе с последней проверкой их email
     company_ids = json.loads(campaign.company_ids) if campaign.company_ids else []
-    
+    query = select(Company, EmailVerification).outerjoin(
+        EmailVerification, EmailVerification.email == func.lower(func.trim(Company.email))
+    )
     if not company_ids:
         # Если не указаны конкретные компании, берем все с email
-        companies = db.query(Company).filter(Company.email != None, Company.email != "").all()
+        query = query.where(Company.email != None, Company.email != "")
     else:
-        companies = db.query(Company).filter(Company.id.in_(company_ids)).all()
+        query = query.where(Company.id.in_(company_ids))
+    
+    companies = {}
+    latest_verification = {}
+    for company, verification in (await db.execute(query)).all():
+        companies[company.id] = company
+        current = latest_verification.get(company.id)
+        if verification is not None and (current is None or (verification.last_checked or datetime.min) > (current.last_checked or datetime.min)):
+            latest_verification[company.id] = verification
+    companies = [company for company in companies.values() if company.email]
     
-    # Фильтруем только компании с валидными email
+    # Свежие проверки переиспользуем, устаревшие перепроверяем одной параллельной пачкой
+    deliverable, verification_stats = await deliverable_emails(
+        db,
+        [(company.id, company.email, latest_verification.get(company.id)) for company in companies],
+        mx_resolver,
+        verification_policy
+    )
+    print(f"📧 Рассылка {campaign.id}: проверок переиспользовано {verification_stats['reused']}, перепроверено {verification_stats['rechecked']}")
+    
+    # Фильтруем только компании с доставляемыми email
     valid_companies = []
     language_stats = {}
     for company in companies:
-        if company.email:
-            # Проверяем email
-            verification = await _verify_email_internal(company.email, company.id, db)
-            if verification.is_deliverable:
-                valid_companies.append(company)
-                # Собираем статистику по языкам
-                lang = company.preferred_language or "ru"
-                language_stats[lang] = language_stats.get(lang, 0) + 1
+        if deliverable.get(company.email.strip().lower()):
+            valid_companies.append(company)
+            # Собираем статистику по языкам
+            lang = company.preferred_language or "ru"
+            language_stats[lang] = language_stats.get(lang, 0) + 1
     
     # Обновляем статус рассылки
     campaign.status = "sending"
     campaign.sent_at = datetime.utcnow()
-    db.commit()
-    
-    # Отправляем письма (заглушка - в реальности нужна настройка SMTP)
-    sent_count = 0
-    failed_count = 0
-    
-    # TODO: Настроить SMTP сервер для реальной отправки
-    # Для примера просто считаем, что все отправлены успешно
-    for company in valid_companies:
-        try:
-            # Здесь должна быть реальная отправка через SMTP
-            # send_email_via_smtp(company.email, campaign.subject, campaign.body)
-            sent_count += 1
-        except Exception as e:
-            failed_count += 1
-            print(f"Ошибка при отправке письма на {company.email}: {e}")
+    await db.commit()
+    
+    # Статус доставки по каждому получателю хранится в email_deliveries
+    deliveries = [
+        EmailDelivery(campaign_id=campaign.id, company_id=company.id, email=company.email.strip(), status="pending")
+        for company in valid_companies
+    ]
+    db.add_all(deliveries)
+    await db.flush()
+    messages = [
+        {"delivery_id": delivery.id, "to": delivery.email, "subject": campaign.subject, "body": campaign.body}
+        for delivery in deliveries
+    ]
+    await db.commit()
+    
+    pending_updates = []
+    # Воркеры рассылки работают параллельно, а AsyncSession не допускает одновременных операций
+    session_lock = asyncio.Lock()
+    
+    def write_delivery_updates(session, updates):
+        session.bulk_update_mappings(EmailDelivery, updates)
+        session.commit()
+    
+    async def flush_delivery_updates():
+        async with session_lock:
+            if pending_updates:
+                updates = list(pending_updates)
+                pending_updates.clear()
+                await db.run_sync(write_delivery_updates, updates)
+    
+    async def record_delivery(message, result):
+        pending_updates.append({
+            "id": message["delivery_id"],
+            "status": result["status"],
+            "attempts": result["attempts"],
+            "error_message": result["error"],
+            "sent_at": datetime.utcnow() if result["status"] == "sent" else None
+        })
+        if len(pending_updates) >= 100:
+            await flush_delivery_updates()
+    
+    # Отправляем письма пулом SMTP соединений
+    counts = await email_sender.send_all(messages, on_result=record_delivery)
+    await flush_delivery_updates()
+    sent_count = counts["sent"]
+    failed_count = counts["failed"]
     
     # Обновляем статистику
     campaign.sent_count = sent_count
     campaign.failed_count = failed_count
-    campaign.status = "completed" if failed_count == 0 else "completed"
-    db.commit()
+    campaign.status = "failed" if failed_count and not sent_count else "completed"
+    await db.commit()
     
     # Определяем основной язык для рассылки
     main_language = max(language_stats.items(), key=lambda x: x[1])[0] if language_stats else "ru"
@@ -714,13 +977,16 @@ async def send_email_campaign(campaign_id: int, db: Session = Depends(get_db)):
         "sent_count": sent_count,
         "failed_count": failed_count,
         "language_stats": language_stats,
-        "recommended_language": main_language
+        "recommended_language": main_language,
+        "verification_stats": verification_stats
     }
 
 @app.get("/email/campaigns", response_model=List[EmailCampaignSchema])
-async def get_email_campaigns(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_email_campaigns(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                              db: AsyncSession = Depends(get_async_db)):
     """Получить список email рассылок"""
-    campaigns = db.query(EmailCampaign).offset(skip).limit(limit).all()
+    campaigns = await _list_page(response, db, select(EmailCampaign), limit, cursor=cursor, skip=skip,
+                                 keys=(EmailCampaign.id,))
     result = []
     for campaign in campaigns:
         campaign_dict = {
@@ -737,37 +1003,96 @@ async def get_email_campaigns(skip: int = 0, limit: int = 100, db: Session = Dep
         result.append(campaign_dict)
     return result
 
+@app.get("/email/campaign/{campaign_id}/deliveries", response_model=List[EmailDeliverySchema])
+async def get_campaign_deliveries(campaign_id: int, response: Response, skip: int = 0, limit: int = 100,
+                                  cursor: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    """Получить статусы доставки писем рассылки по получателям"""
+    statement = select(EmailDelivery).where(EmailDelivery.campaign_id == campaign_id)
+    return await _list_page(response, db, statement, limit, cursor=cursor, skip=skip, keys=(EmailDelivery.id,))
+
 @app.get("/email/verifications", response_model=List[EmailVerificationSchema])
-async def get_email_verifications(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_email_verifications(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                                  db: AsyncSession = Depends(get_async_db)):
     """Получить список проверок email"""
-    verifications = db.query(EmailVerification).offset(skip).limit(limit).all()
-    return verifications
+    return await _list_page(response, db, select(EmailVerification), limit, cursor=cursor, skip=skip,
+                            keys=(EmailVerification.id,))
 
-@app.post("/companies/bulk-verify-emails")
-async def bulk_verify_emails(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """Массовая проверка всех email адресов компаний"""
-    companies = db.query(Company).filter(Company.email != None, Company.email != "").all()
+async def _run_bulk_verify_emails_job(ctx: JobContext):
+    """Обработчик фоновой задачи массовой проверки email"""
+    items = await ctx.pending_items()
+    rows = [json.loads(item.payload) for item in items]
+    # Резолвим все домены задачи параллельно, дальше проверки отвечают из кэша MX
+    await mx_resolver.prefetch(email_domain(row["email"]) for row in rows)
     
-    verified_count = 0
-    invalid_count = 0
+    chunk_size = int(os.getenv("EMAIL_VERIFY_CHUNK_SIZE", "500"))
+    for start in range(0, len(items), chunk_size):
+        if ctx.cancelled:
+            break
+        chunk_items = items[start:start + chunk_size]
+        chunk_rows = rows[start:start + chunk_size]
+        # Результаты проверки и отметки строк задачи пишутся одним коммитом на чанк
+        results = await verify_emails_batch(
+            ctx.db, [(row.get("company_id"), row["email"]) for row in chunk_rows], mx_resolver, commit=False
+        )
+        results_by_email = {result["email"]: result for result in results}
+        entries = []
+        for item, row in zip(chunk_items, chunk_rows):
+            result = results_by_email[row["email"].strip().lower()]
+            entries.append((
+                item,
+                {"email": result["email"], "verification_status": result["verification_status"]},
+                result["is_deliverable"]
+            ))
+        await ctx.complete_items(entries)
+        print(f"📧 Проверено email: {ctx.job.processed}/{ctx.job.total}")
+
+@app.post("/companies/bulk-verify-emails")
+async def bulk_verify_emails(background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    """Массовая проверка всех email адресов компаний (в фоне, прогресс - GET /jobs/{job_id})"""
+    companies = (await db.execute(select(Company.id, Company.email).where(Company.email != None, Company.email != ""))).all()
     
-    for company in companies:
-        try:
-            verification = await _verify_email_internal(company.email, company.id, db)
-            if verification.is_deliverable:
-                verified_count += 1
-            else:
-                invalid_count += 1
-        except Exception as e:
-            print(f"Ошибка при проверке email {company.email}: {e}")
-            invalid_count += 1
+    job = await db.run_sync(
+        job_runner.create_job,
+        "bulk_verify_emails",
+        [json.dumps({"company_id": company_id, "email": email}) for company_id, email in companies]
+    )
     
     return {
-        "message": f"Проверено email адресов: {verified_count} валидных, {invalid_count} невалидных",
-        "verified_count": verified_count,
-        "invalid_count": invalid_count
+        "message": f"Проверка {len(companies)} email адресов поставлена в очередь",
+        "job_id": job.id,
+        "total": len(companies)
     }
 
+@app.get("/jobs", response_model=List[JobStatus])
+async def get_jobs(response: Response, skip: int = 0, limit: int = 20, cursor: Optional[str] = None,
+                   db: AsyncSession = Depends(get_async_db)):
+    """Получить список фоновых задач"""
+    jobs = await _list_page(response, db, select(Job), limit, cursor=cursor, skip=skip,
+                            keys=(Job.created_at, Job.id), descending=True)
+    return await db.run_sync(lambda session: [describe_job(session, job, error_limit=0) for job in jobs])
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Прогресс фоновой задачи: счетчики, ETA и ошибки по строкам"""
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return await db.run_sync(describe_job, job)
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobStatus)
+async def cancel_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Отменить фоновую задачу (обработанные строки сохраняются)"""
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job.status in ("pending", "running"):
+        job.status = "cancelled"
+        if not job.finished_at:
+            job.finished_at = datetime.utcnow()
+        await db.commit()
+        await db.refresh(job)
+    return await db.run_sync(describe_job, job)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,105 @@
+import os
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# Вес полей в оценке полноты данных компании: описание и сайт модель может вывести почти
+# всегда, телефон и адрес по промпту без данных веб-поиска остаются пустыми
+COMPLETENESS_WEIGHTS = {
+    "description": 0.35,
+    "website": 0.25,
+    "email": 0.2,
+    "equipment": 0.1,
+    "phone": 0.05,
+    "address": 0.05,
+}
+
+
+def company_completeness(data: Dict[str, Any]) -> float:
+    """Оценка полноты проверенных данных компании (_validate_company_data) от 0 до 1"""
+    return round(sum(weight for field, weight in COMPLETENESS_WEIGHTS.items() if data.get(field)), 3)
+
+
+class _TierStats:
+    def __init__(self):
+        self.calls = 0
+        self.accepted = 0
+        self.escalated = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.score_sum = 0.0
+
+
+class ModelRouter:
+    """Маршрутизация запросов к LLM по уровням моделей.
+
+    Запрос сначала уходит на первую (быструю и дешевую) модель из tiers; если
+    ответ не разобрался или оценка полноты ниже min_score, запрос повторяется
+    на следующей модели. Возвращается лучший по оценке результат. Статистика
+    по задачам и уровням (доля принятых ответов, задержка) - в stats().
+    """
+
+    def __init__(self, tiers: List[str] = None, min_score: float = None, fallback_model: str = "gpt-4o"):
+        if tiers is None:
+            value = os.getenv("POLZA_MODEL_TIERS", f"gpt-4o-mini,{fallback_model}")
+            tiers = [model.strip() for model in value.split(",") if model.strip()]
+        # Повторы модели в списке уровней убираем (например, если POLZA_SEARCH_MODEL и есть быстрая модель)
+        self.tiers = list(dict.fromkeys(tiers)) or [fallback_model]
+        self.min_score = min_score if min_score is not None else float(os.getenv("MODEL_ROUTER_MIN_SCORE", "0.7"))
+        self._stats: Dict[Tuple[str, str], _TierStats] = defaultdict(_TierStats)
+
+    async def route(self, task: str, attempt: Callable[[str], Awaitable[Tuple[Any, float]]]) -> Any:
+        """attempt(model) -> (результат, оценка); ValueError (в т.ч. JSONDecodeError) - ответ непригоден.
+
+        Сетевые ошибки не перехватываются: при сбое upstream эскалация только
+        удвоила бы число запросов.
+        """
+        best = None
+        best_score = -1.0
+        last_error = None
+        for position, model in enumerate(self.tiers):
+            is_last = position == len(self.tiers) - 1
+            stats = self._stats[(task, model)]
+            stats.calls += 1
+            started = time.monotonic()
+            try:
+                result, score = await attempt(model)
+            except ValueError as e:
+                stats.errors += 1
+                stats.latency_sum += time.monotonic() - started
+                last_error = e
+                if not is_last:
+                    stats.escalated += 1
+                    print(f"⤴️ {task}: ответ {model} непригоден ({e}), переходим к {self.tiers[position + 1]}")
+                continue
+            stats.latency_sum += time.monotonic() - started
+            stats.score_sum += score
+            if score >= best_score:
+                best, best_score = result, score
+            if score >= self.min_score or is_last:
+                stats.accepted += 1
+                if best is not result:
+                    print(f"↩️ {task}: {model} ответил хуже предыдущей модели, берем лучший результат ({best_score})")
+                return best
+            stats.escalated += 1
+            print(f"⤴️ {task}: полнота ответа {model} {score} < {self.min_score}, переходим к {self.tiers[position + 1]}")
+
+        if best is not None:
+            return best
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        """По задачам и моделям: вызовы, доля принятых ответов, эскалации, ошибки, средние задержка и оценка"""
+        report: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        for (task, model), stats in sorted(self._stats.items()):
+            scored = stats.calls - stats.errors
+            report[task][model] = {
+                "calls": stats.calls,
+                "accepted": stats.accepted,
+                "hit_rate": round(stats.accepted / stats.calls, 3) if stats.calls else None,
+                "escalated": stats.escalated,
+                "errors": stats.errors,
+                "avg_latency": round(stats.latency_sum / stats.calls, 3) if stats.calls else None,
+                "avg_score": round(stats.score_sum / scored, 3) if scored else None,
+            }
+        return {"tiers": self.tiers, "min_score": self.min_score, "tasks": dict(report)}
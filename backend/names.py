@@ -0,0 +1,100 @@
+"""Нормализация названий компаний: общий ключ для сравнения, кэша и поиска в БД"""
+import re
+
+def transliterate_cyrillic(text: str) -> str:
+    """Транслитерация кириллицы в латиницу для формирования доменов"""
+    translit_map = {
+        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+        'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+        'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+        'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+        'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
+    }
+    result = ''
+    for char in text.lower():
+        if char in translit_map:
+            result += translit_map[char]
+        elif char.isalnum():
+            result += char
+        elif char in ' -_':
+            result += '-'
+    return result
+
+# Организационно-правовые формы, которые не влияют на идентичность компании
+LEGAL_FORMS = {
+    'ооо', 'зао', 'оао', 'пао', 'ао', 'ип', 'нко', 'тоо', 'чп', 'гк', 'нпо', 'нпп',
+    'ltd', 'llc', 'inc', 'gmbh', 'corp', 'co', 'plc', 'ag', 'sa', 'bv', 'limited',
+}
+
+def normalize_company_name(name: str) -> str:
+    """Нормализованное название компании для сравнения и ключей кэша.
+
+    "ООО «Рога и Копыта»", "рога  и копыта" и "Рога и Копыта, LLC" дают одно значение:
+    регистр и пробелы свернуты, кавычки и знаки препинания убраны, ОПФ отброшены.
+    """
+    words = re.findall(r'\w+', name.lower().replace('ё', 'е'))
+    significant = [word for word in words if word not in LEGAL_FORMS]
+    # Если название состоит только из ОПФ (например, "АО"), оставляем как есть
+    return ' '.join(significant or words)
+
+# Варианты латинского написания, которые сводятся к одному: транслитерация ГОСТ/BGN и английские написания
+# ("Kh"/"H", "Ts"/"C", "-iy"/"-y") должны давать один ключ для кириллического и латинского названия
+_LATIN_FOLDS = [
+    ('shch', 'sh'), ('sch', 'sh'), ('kh', 'h'), ('ts', 'c'), ('tz', 'c'), ('ck', 'k'), ('ph', 'f'),
+    ('iy', 'y'), ('yy', 'y'), ('yo', 'e'), ('ye', 'e'), ('yu', 'u'), ('ya', 'a'),
+    ('iu', 'u'), ('ia', 'a'),
+    ('w', 'v'), ('x', 'ks'), ('q', 'k'),
+]
+_DOUBLE_LETTERS = re.compile(r'([a-z])\1+')
+
+def fold_latin(word: str) -> str:
+    for old, new in _LATIN_FOLDS:
+        word = word.replace(old, new)
+    return _DOUBLE_LETTERS.sub(r'\1', word)
+
+def company_name_tokens(name: str) -> list:
+    """Слова нормализованного названия в латинице после fold_latin (только a-z и цифры)"""
+    tokens = (re.sub(r'[^a-z0-9]', '', fold_latin(transliterate_cyrillic(word))) for word in normalize_company_name(name or '').split())
+    return [token for token in tokens if token]
+
+def company_name_key(name: str) -> str:
+    """Ключ названия компании независимо от алфавита и пробелов.
+
+    "ООО Рога и Копыта", "Рога и Копыта" и "ROGA I KOPYTA" дают "rogaikopyta":
+    нормализованное название транслитерируется, варианты написания сводятся
+    (fold_latin), пробелы и знаки убираются.
+    """
+    return ''.join(company_name_tokens(name))
+
+# Общие слова названий: по ним одни компании не отличить от других
+GENERIC_NAME_TOKENS = frozenset(company_name_tokens(
+    'Инжиниринг Engineering Групп Group Трейд Trade Сервис Service Холдинг Holding Снаб Проект Project '
+    'Компания Company Торговый дом ТД Завод Plant Технологии Technologies Строй Пром Торг Импорт Экспорт'
+))
+
+# Бесплатные почтовые сервисы: домен такого адреса ничего не говорит о компании
+FREE_EMAIL_DOMAINS = {
+    'mail.ru', 'bk.ru', 'list.ru', 'inbox.ru', 'internet.ru', 'yandex.ru', 'ya.ru', 'yandex.com',
+    'rambler.ru', 'gmail.com', 'googlemail.com', 'yahoo.com', 'outlook.com', 'hotmail.com',
+    'live.com', 'icloud.com', 'me.com', 'aol.com', 'protonmail.com', 'proton.me', 'gmx.de', 'gmx.net',
+}
+
+def website_domain(website: str) -> str:
+    """Домен сайта без схемы, www, порта и пути: "https://www.Roga.ru/about" -> "roga.ru" """
+    host = re.sub(r'^[a-z][a-z0-9+.-]*://', '', (website or '').strip().lower())
+    host = re.split(r'[/?#:]', host, 1)[0].strip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host if '.' in host else ''
+
+def company_domain(website: str = '', email: str = '') -> str:
+    """Домен компании: сайт, а без него - домен корпоративного email (не бесплатной почты)"""
+    domain = website_domain(website)
+    if domain:
+        return domain
+    email = (email or '').strip().lower()
+    if '@' in email:
+        email_host = email.rsplit('@', 1)[1]
+        if email_host not in FREE_EMAIL_DOMAINS and '.' in email_host:
+            return email_host
+    return ''
@@ -0,0 +1,88 @@
+"""Постраничная выдача списков по курсору (keyset) вместо OFFSET"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+
+def encode_cursor(data: dict) -> str:
+    """Непрозрачный курсор: base64url от JSON без выравнивания"""
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Некорректный курсор")
+    if not isinstance(data, dict):
+        raise ValueError("Некорректный курсор")
+    return data
+
+
+def _dump_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _load_value(key, value: Any) -> Any:
+    """Значение из курсора в типе колонки - чужой или подделанный курсор дает ValueError, а не ошибку БД"""
+    python_type = key.type.python_type
+    try:
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        return python_type(value)
+    except (TypeError, ValueError):
+        raise ValueError("Курсор не подходит для этого списка")
+
+
+async def paginate(db: AsyncSession, statement: Select, limit: int, keys: Sequence = None,
+                   cursor: Optional[str] = None, skip: int = 0, descending: bool = False) -> Tuple[List[Any], Optional[str]]:
+    """Страница ORM-объектов и курсор следующей страницы (None - это последняя).
+
+    keys - колонки порядка, последняя уникальна (например, (created_at, id)
+    или (id,)); statement сортируется по ним, а курсор хранит их значения в
+    последней строке, поэтому следующая страница читается по индексу с
+    условием (created_at, id) < (...) вместо OFFSET. Без keys порядок задает
+    statement (например, ранг поиска), и курсор хранит смещение. skip без
+    курсора - прежний OFFSET для совместимости; курсор следующей страницы
+    возвращается и в этом случае.
+    """
+    if limit < 1:
+        raise ValueError("limit должен быть больше 0")
+    data = decode_cursor(cursor) if cursor else {}
+    if keys:
+        statement = statement.order_by(None).order_by(*[key.desc() if descending else key.asc() for key in keys])
+        if "after" in data:
+            values = data["after"]
+            if not isinstance(values, list) or len(values) != len(keys):
+                raise ValueError("Курсор не подходит для этого списка")
+            values = [_load_value(key, value) for key, value in zip(keys, values)]
+            if len(keys) == 1:
+                condition = keys[0] < values[0] if descending else keys[0] > values[0]
+            else:
+                condition = tuple_(*keys) < tuple_(*values) if descending else tuple_(*keys) > tuple_(*values)
+            statement = statement.where(condition)
+        elif skip:
+            statement = statement.offset(skip)
+    else:
+        offset = data.get("offset", skip)
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Курсор не подходит для этого списка")
+        statement = statement.offset(offset)
+
+    # Одна лишняя строка показывает, есть ли следующая страница
+    rows = (await db.scalars(statement.limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    if keys:
+        next_cursor = encode_cursor({"after": [_dump_value(getattr(rows[-1], key.key)) for key in keys]})
+    else:
+        next_cursor = encode_cursor({"offset": data.get("offset", skip) + limit})
+    return rows, next_cursor
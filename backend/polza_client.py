@@ -1,34 +1,30 @@
 import httpx
 import os
-from typing import Dict, Any, List
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Tuple
 import json
 import re
 import asyncio
 from urllib.parse import quote_plus
 
-def transliterate_cyrillic(text: str) -> str:
-    """Транслитерация кириллицы в латиницу для формирования доменов"""
-    translit_map = {
-        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-        'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-        'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-        'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-        'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
-    }
-    result = ''
-    for char in text.lower():
-        if char in translit_map:
-            result += translit_map[char]
-        elif char.isalnum():
-            result += char
-        elif char in ' -_':
-            result += '-'
-    return result
+from http_pool import HTTPClientPool
+from names import normalize_company_name, transliterate_cyrillic
+from rate_limiter import AsyncRateLimiter
+from company_cache import CompanyInfoCache
+from singleflight import SingleFlight
+from chat_turn import current_chat_turn, record_upstream_call
+from llm_telemetry import LLMTelemetry
+from resilience import CircuitOpenError, UpstreamPolicy, retry_after_seconds
+from llm_governor import LLMGovernor, LLMReservation, estimate_request_tokens
+from model_router import ModelRouter, company_completeness
+from extraction import (ADDRESS_MARKERS, ADDRESS_PLACEHOLDERS, PHONE_PLACEHOLDERS, REFUSAL_PHRASES, clean_phone,
+                        extract_company_names, extract_equipment_name, extract_text_info, is_example_phone,
+                        scan_search_page)
+from structured_output import COMPANY_INFO_FORMAT, EQUIPMENT_COMPANIES_FORMAT, parse_company_info, parse_equipment_companies
 
 class PolzaAIClient:
-    def __init__(self):
+    def __init__(self, http_pool: HTTPClientPool = None):
         self.api_key = os.getenv("POLZA_API_KEY", "ak_FojEdiuKBZJwcAdyGQiPUIKt2DDFsTlawov98zr6Npg")
-        self.base_url = "https://api.polza.ai/v1"
+        self.base_url = os.getenv("POLZA_BASE_URL", "https://api.polza.ai/v1")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -36,9 +32,70 @@ class PolzaAIClient:
         # Модель для поиска - используем gpt-4o для лучших результатов
         # Альтернативы: gpt-4o, claude-3-5-haiku-20241022
         self.search_model = os.getenv("POLZA_SEARCH_MODEL", "gpt-4o")
+        # Общий пул соединений: keep-alive к api.polza.ai и поисковикам вместо нового клиента на каждый запрос
+        self.http_pool = http_pool or HTTPClientPool()
+        # Ограничения частоты запросов по upstream (запросов в секунду, 0 - без ограничения),
+        # чтобы параллельная массовая обработка не упиралась в 429 и блокировки поисковика
+        self.upstream_limits = {
+            "polza": AsyncRateLimiter(float(os.getenv("POLZA_RATE_LIMIT_RPS", "0")), burst=int(os.getenv("POLZA_RATE_LIMIT_BURST", "5"))),
+            "duckduckgo": AsyncRateLimiter(float(os.getenv("DUCKDUCKGO_RATE_LIMIT_RPS", "2")), burst=int(os.getenv("DUCKDUCKGO_RATE_LIMIT_BURST", "2"))),
+        }
+        # Кэш результатов поиска компаний по нормализованному названию
+        self.company_cache = CompanyInfoCache()
+        # Режим параллельного веб-поиска и LLM; дедлайн ожидания веб-результатов в секундах
+        self.parallel_search = os.getenv("POLZA_PARALLEL_SEARCH", "false").lower() in ("1", "true", "yes", "on")
+        self.web_search_deadline = float(os.getenv("POLZA_WEB_SEARCH_DEADLINE", "12"))
+        # Одновременные поиски одной и той же компании выполняются один раз
+        self.company_lookups = SingleFlight("company_lookup")
+        # Учет токенов, длительности и исходов вызовов LLM (/metrics, /metrics/llm)
+        self.telemetry = LLMTelemetry()
+        # Общий дедлайн на все поиски компаний и оборудования перед ответом чата, сек
+        self.chat_context_deadline = float(os.getenv("CHAT_CONTEXT_DEADLINE", "60"))
+        # Повторы с jitter, Retry-After и circuit breaker для каждого upstream
+        self.upstream_policies = {
+            "polza": UpstreamPolicy("polza"),
+            "duckduckgo": UpstreamPolicy("duckduckgo", max_attempts=2),
+        }
+        # Бюджеты запросов/токенов в минуту и одновременных вызовов по моделям; чат обслуживается раньше фоновых задач
+        self.llm_governor = LLMGovernor()
+        # Уровни моделей для поиска компаний: сначала быстрая, старшая - если данных не хватает
+        self.model_router = ModelRouter(fallback_model=self.search_model)
+        # Резюме диалога - простая задача: по умолчанию быстрая модель первого уровня
+        self.summary_model = os.getenv("POLZA_SUMMARY_MODEL") or self.model_router.tiers[0]
+        # Ответы о компаниях запрашиваются в режиме structured output (JSON по схеме);
+        # модели, отклонившие response_format, дальше получают обычный запрос
+        self.structured_output = os.getenv("POLZA_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes", "on")
+        self.plain_json_models = set()
+        # Как разобраны ответы: structured - сразу по схеме, repaired - однопроходным парсером, text - эвристиками из текста
+        self.parse_stats = {"structured": 0, "repaired": 0, "text": 0}
+    
+    async def _acquire_upstream(self, upstream: str):
+        """Ждет разрешения лимитера upstream и учитывает обращение в текущем ходе чата"""
+        await self.upstream_limits[upstream].acquire()
+        record_upstream_call(upstream)
+    
+    async def _governed_send(self, slot: LLMReservation, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """Одна попытка запроса к Polza.AI: бюджет модели, лимит upstream, затем сам запрос"""
+        await slot.attempt()
+        await self._acquire_upstream("polza")
+        response = await send()
+        if response.status_code == 429:
+            # Провайдер все же ограничил частоту - придерживаем всю очередь модели, а не только этот вызов
+            slot.throttle(retry_after_seconds(response) or 1.0)
+        return response
     
-    async def _make_request(self, prompt: str, max_tokens: int = 2000, model: str = None, retry_count: int = 2) -> str:
-        """Универсальный метод для отправки запросов к Polza.AI с retry механизмом"""
+    async def aclose(self):
+        """Закрывает пул HTTP соединений (вызывается при остановке приложения)"""
+        await self.http_pool.aclose()
+    
+    async def _make_request(self, prompt: str, max_tokens: int = 2000, model: str = None, retry_count: int = 2,
+                            response_format: Dict[str, Any] = None) -> str:
+        """Универсальный метод для отправки запросов к Polza.AI с retry механизмом.
+
+        response_format - схема structured output (structured_output.COMPANY_INFO_FORMAT и т.п.);
+        если модель ее не поддерживает, запрос повторяется без нее, и дальше для этой модели
+        ответ разбирается из обычного текста.
+        """
         if model is None:
             model = self.search_model
             
@@ -53,152 +110,67 @@ class PolzaAIClient:
             "max_tokens": max_tokens,
             "temperature": 0.3
         }
-        
-        last_error = None
-        for attempt in range(retry_count):
-            try:
-                async with httpx.AsyncClient(timeout=120.0) as client:
-                    print(f"Отправляем запрос к Polza.AI (модель: {model}, попытка {attempt + 1}/{retry_count}): {prompt[:100]}...")
-                    response = await client.post(
-                        f"{self.base_url}/chat/completions",
-                        headers=self.headers,
-                        json=payload
-                    )
+        if response_format is not None and self.structured_output and model not in self.plain_json_models:
+            payload["response_format"] = response_format
+        
+        client = self.http_pool.get_client(self.base_url)
+        
+        async def send() -> httpx.Response:
+            print(f"Отправляем запрос к Polza.AI (модель: {model}): {prompt[:100]}...")
+            return await client.post(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=120.0
+            )
+        
+        tokens = estimate_request_tokens(payload["messages"], max_tokens)
+        async with self.llm_governor.reserve(model, tokens) as slot, self.telemetry.track("completion", model) as call:
+            # Повторы временных ошибок (с учетом Retry-After) и circuit breaker - в политике upstream
+            response = await self.upstream_policies["polza"].call(lambda: self._governed_send(slot, send), max_attempts=retry_count, on_retry=call.count_retry)
+            if response.status_code == 400 and "response_format" in payload and self._rejects_response_format(response):
+                # Модель или API не принимают structured output - запоминаем и повторяем обычным запросом
+                call.outcome = "http_400"
+                self.plain_json_models.add(model)
+            else:
+                try:
                     response.raise_for_status()
-                    
-                    result = response.json()
-                    if "choices" not in result or len(result["choices"]) == 0:
-                        raise ValueError("Пустой ответ от API")
-                    
-                    content = result["choices"][0]["message"]["content"]
-                    print(f"✅ Получен ответ от Polza.AI: {content[:100]}...")
-                    return content
-                    
-            except httpx.HTTPStatusError as e:
-                last_error = e
-                error_msg = f"HTTP {e.response.status_code}"
-                if e.response is not None:
+                except httpx.HTTPStatusError as e:
+                    error_msg = f"HTTP {e.response.status_code}"
                     try:
                         error_data = e.response.json()
                         error_msg = error_data.get("error", {}).get("message", error_msg)
                     except:
                         error_msg = e.response.text[:200]
+                    print(f"⚠️ HTTP ошибка Polza.AI: {error_msg}")
+                    
+                    # Ошибка модели - не сетевой сбой, сообщаем ее явно
+                    if e.response.status_code == 400 and "model" in error_msg.lower():
+                        raise ValueError(f"Ошибка модели: {error_msg}")
+                    raise
                 
-                print(f"⚠️ HTTP ошибка (попытка {attempt + 1}/{retry_count}): {error_msg}")
-                
-                # Если это ошибка модели, не повторяем
-                if e.response.status_code == 400 and "model" in error_msg.lower():
-                    raise ValueError(f"Ошибка модели: {error_msg}")
+                result = response.json()
+                call.add_usage(result.get("usage"))
+                slot.settle(result.get("usage"))
+                if "choices" not in result or len(result["choices"]) == 0:
+                    raise ValueError("Пустой ответ от API")
                 
-                if attempt < retry_count - 1:
-                    await asyncio.sleep(2 ** attempt)  # Экспоненциальная задержка
-                    continue
-                else:
-                    raise e
-                    
-            except httpx.TimeoutException as e:
-                last_error = e
-                print(f"⚠️ Таймаут (попытка {attempt + 1}/{retry_count})")
-                if attempt < retry_count - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                else:
-                    raise e
-                    
-            except Exception as e:
-                last_error = e
-                print(f"⚠️ Ошибка при обращении к Polza.AI (попытка {attempt + 1}/{retry_count}): {e}")
-                if attempt < retry_count - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                else:
-                    raise e
+                content = result["choices"][0]["message"]["content"]
+                print(f"✅ Получен ответ от Polza.AI: {content[:100]}...")
+                return content
         
-        # Если все попытки не удались
-        raise last_error if last_error else Exception("Неизвестная ошибка")
+        print(f"⚠️ Модель {model} не приняла response_format, повторяем без structured output")
+        return await self._make_request(prompt, max_tokens=max_tokens, model=model, retry_count=retry_count)
+    
+    @staticmethod
+    def _rejects_response_format(response: httpx.Response) -> bool:
+        """HTTP 400 именно из-за structured output, а не из-за других ошибок запроса"""
+        body = response.text.lower()
+        return "response_format" in body or "json_schema" in body
     
     def _extract_info_from_text(self, text: str, company_name: str) -> Dict[str, Any]:
         """Извлекает информацию о компании из текстового ответа"""
-        import re
-        
-        result = {
-            "website": "",
-            "email": "",
-            "address": "",
-            "phone": "",
-            "description": "",
-            "equipment": "",
-            "preferred_language": "ru"  # По умолчанию русский
-        }
-        
-        # Ищем сайт
-        website_patterns = [
-            r'https?://[^\s\)]+',
-            r'www\.[^\s\)]+',
-            r'сайт[:\s]+([^\s\)]+)',
-            r'website[:\s]+([^\s\)]+)'
-        ]
-        for pattern in website_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                website = match.group(1) if match.groups() else match.group(0)
-                if not website.startswith('http'):
-                    website = 'https://' + website
-                result["website"] = website
-                break
-        
-        # Ищем email
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        email_match = re.search(email_pattern, text)
-        if email_match:
-            result["email"] = email_match.group(0)
-        
-        # Ищем телефон (международные форматы)
-        phone_patterns = [
-            r'\+?\d{1,3}[\s\-]?[\(\-]?\d{1,4}[\)\-]?[\s\-]?\d{1,4}[\s\-]?\d{1,4}[\s\-]?\d{1,9}',  # Международный формат
-            r'\+?7\s?[\(\-]?\d{3}[\)\-]?\s?\d{3}[\-]?\d{2}[\-]?\d{2}',  # Россия
-            r'\+?1[\s\-]?[\(\-]?\d{3}[\)\-]?[\s\-]?\d{3}[\-]?\d{4}',  # США/Канада
-            r'\+?44[\s\-]?\d{2,4}[\s\-]?\d{3,4}[\s\-]?\d{3,4}',  # UK
-            r'\+?49[\s\-]?\d{2,4}[\s\-]?\d{3,9}',  # Германия
-            r'\+?33[\s\-]?\d{1,2}[\s\-]?\d{2}[\s\-]?\d{2}[\s\-]?\d{2}[\s\-]?\d{2}',  # Франция
-            r'телефон[:\s]+([+\d\s\-\(\)]+)',
-            r'phone[:\s]+([+\d\s\-\(\)]+)',
-            r'tel[:\s]+([+\d\s\-\(\)]+)'
-        ]
-        for pattern in phone_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                phone = match.group(1) if match.groups() else match.group(0)
-                result["phone"] = phone.strip()
-                break
-        
-        # Ищем адрес (международные форматы)
-        address_patterns = [
-            r'адрес[:\s]+([^\n\.]+)',
-            r'address[:\s]+([^\n\.]+)',
-            r'г\.\s*[А-Яа-я]+[^\n\.]*',  # Россия
-            r'Москва[^\n\.]*',
-            r'Санкт-Петербург[^\n\.]*',
-            r'\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Drive|Dr|Lane|Ln)[^\n\.]*',  # Английский
-            r'\d+\s+[A-Za-z\s]+(?:Straße|Str|Platz|Weg)[^\n\.]*',  # Немецкий
-            r'\d+\s+[A-Za-z\s]+(?:Rue|Avenue|Boulevard|Place)[^\n\.]*',  # Французский
-            r'\d+\s+[A-Za-z\s]+(?:Via|Piazza|Corso)[^\n\.]*',  # Итальянский
-            r'\d+\s+[A-Za-z\s]+(?:Calle|Avenida|Plaza)[^\n\.]*',  # Испанский
-        ]
-        for pattern in address_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                address = match.group(1) if match.groups() else match.group(0)
-                result["address"] = address.strip()
-                break
-        
-        # Описание - берем первые несколько предложений
-        sentences = re.split(r'[\.!?]\s+', text)
-        description_sentences = [s for s in sentences if company_name.lower() in s.lower() or len(s) > 20]
-        if description_sentences:
-            result["description"] = '. '.join(description_sentences[:3])
-        
-        return result
+        return extract_text_info(text, company_name)
     
     def _validate_company_data(self, data: Dict[str, Any], company_name: str) -> Dict[str, Any]:
         """Валидация данных компании - проверяем, что данные выглядят реально"""
@@ -228,36 +200,22 @@ class PolzaAIClient:
             # ОТФИЛЬТРОВЫВАЕМ placeholder'ы и фейковые адреса
             address_lower = address.lower()
             # Проверяем на placeholder'ы типа "Примерная", "Примерный", "Test", "Sample"
-            if any(word in address_lower for word in ['примерная', 'примерный', 'пример', 'test', 'sample', 'demo', 'placeholder', 'example']):
+            if ADDRESS_PLACEHOLDERS.found_in(address_lower):
                 print(f"⚠️ Обнаружен placeholder в адресе: {address}, пропускаем")
-            elif any(word in address_lower for word in [
-                "г.", "ул.", "д.", "мск", "спб", "москва", "санкт", "проспект", "проезд", "переулок",  # Россия
-                "street", "st.", "avenue", "ave.", "road", "rd.", "boulevard", "blvd.",  # Английский
-                "strasse", "straße", "platz", "weg",  # Немецкий
-                "rue", "avenue", "boulevard", "place",  # Французский
-                "via", "piazza", "corso",  # Итальянский
-                "calle", "avenida", "plaza",  # Испанский
-                "北京", "上海", "广州", "深圳",  # Китай
-                "東京", "大阪", "横浜",  # Япония
-            ]) or len(address) > 10:  # Если адрес достаточно длинный, считаем его валидным
+            elif ADDRESS_MARKERS.found_in(address_lower) or len(address) > 10:  # Если адрес достаточно длинный, считаем его валидным
                 validated["address"] = address
         
         # Проверяем телефон - должен содержать цифры и выглядеть как телефон (поддерживаем международные форматы)
         phone = data.get("phone", "").strip()
         if phone and any(char.isdigit() for char in phone) and len(phone) > 7:
             # ОТФИЛЬТРОВЫВАЕМ placeholder'ы и фейковые номера
-            phone_clean = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '').replace('x', '').replace('X', '')
+            phone_clean = clean_phone(phone)
             # Проверяем на placeholder'ы типа "123-45-67", "000-00-00", "111-11-11", "+7 (495) 123-45-67", "+7 (XXX) XXX-XX-XX"
-            placeholder_patterns = [
-                '1234567', '0000000', '1111111', '12345', '00000', '11111',
-                '495123', '495000', '495111',  # Москва + placeholder
-                'xxx', 'xxx-xx-xx', 'xxx-xxx-xx'  # Шаблоны с XXX
-            ]
-            if any(pattern in phone_clean.lower() for pattern in placeholder_patterns):
+            if PHONE_PLACEHOLDERS.found_in(phone_clean.lower()):
                 print(f"⚠️ Обнаружен placeholder в телефоне: {phone}, пропускаем")
             elif phone.startswith('+') or (phone_clean.isdigit() and len(phone_clean) >= 8):
                 # Дополнительная проверка: если номер выглядит как пример (495 123-45-67)
-                if '+7' in phone and '495' in phone and ('123' in phone_clean or '000' in phone_clean):
+                if is_example_phone(phone, phone_clean):
                     print(f"⚠️ Обнаружен примерный номер телефона: {phone}, пропускаем")
                 else:
                     # Проверяем, что это похоже на телефон (содержит + или достаточно цифр)
@@ -296,115 +254,50 @@ class PolzaAIClient:
                 f"{company_name} сайт контакты"
             ]
             
-            async with httpx.AsyncClient(timeout=15.0, follow_redirects=True) as client:
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-                }
+            client = self.http_pool.get_client("https://html.duckduckgo.com")
+            headers = {
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+            }
+            
+            async def fetch(query: str) -> httpx.Response:
+                encoded_query = quote_plus(query)
+                # Используем DuckDuckGo (не требует API ключа)
+                url = f"https://html.duckduckgo.com/html/?q={encoded_query}"
                 
-                # Пробуем несколько поисковых запросов
-                for query in search_queries[:2]:  # Ограничиваем до 2 запросов
-                    try:
-                        encoded_query = quote_plus(query)
-                        # Используем DuckDuckGo (не требует API ключа)
-                        url = f"https://html.duckduckgo.com/html/?q={encoded_query}"
+                async def send() -> httpx.Response:
+                    await self._acquire_upstream("duckduckgo")
+                    return await client.get(url, headers=headers, timeout=10.0, follow_redirects=True)
+                
+                return await self.upstream_policies["duckduckgo"].call(send)
+            
+            # Пробуем несколько поисковых запросов - выполняем их одновременно, разбираем по порядку
+            queries = search_queries[:2]  # Ограничиваем до 2 запросов
+            responses = await asyncio.gather(*(fetch(query) for query in queries), return_exceptions=True)
+            for query, response in zip(queries, responses):
+                try:
+                    if isinstance(response, Exception):
+                        raise response
+                    
+                    if response.status_code == 200:
+                        # Пытаемся найти домен, связанный с названием компании
+                        company_name_clean_lower = clean_name.lower().replace(' ', '').replace('-', '')
+                        company_keywords = [kw for kw in company_name_clean_lower.split() if len(kw) > 3]
                         
-                        response = await client.get(url, headers=headers, timeout=10.0)
+                        # Сайт, email и телефон - за один проход по странице
+                        found = scan_search_page(response.text, company_keywords)
+                        for field, label in (("website", "сайт"), ("email", "email"), ("phone", "телефон")):
+                            if found.get(field) and not results[field]:
+                                results[field] = found[field]
+                                print(f"✅ Найден {label} через веб-поиск: {found[field]}")
                         
-                        if response.status_code == 200:
-                            content = response.text
-                            content_lower = content.lower()
-                            
-                            # Ищем сайты (более точные паттерны)
-                            website_patterns = [
-                                r'https?://(?:www\.)?([a-z0-9\-]+\.(?:ru|com|org|net|io|co))',
-                                r'www\.([a-z0-9\-]+\.(?:ru|com|org|net|io|co))',
-                                r'([a-z0-9\-]+\.(?:ru|com|org|net|io|co))',
-                            ]
-                            
-                            # Ищем email
-                            email_pattern = r'\b([a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,})\b'
-                            
-                            # Ищем телефоны
-                            phone_patterns = [
-                                r'\+7\s?\(?\d{3}\)?\s?\d{3}[- ]?\d{2}[- ]?\d{2}',
-                                r'\+7\s?\d{10}',
-                                r'8\s?\(?\d{3}\)?\s?\d{3}[- ]?\d{2}[- ]?\d{2}',
-                            ]
-                            
-                            # Ищем адреса (российские форматы)
-                            address_patterns = [
-                                r'(?:г\.|город)\s+[А-ЯЁа-яё\s]+(?:ул\.|улица|проспект|пр\.|переулок|пер\.)\s+[А-ЯЁа-яё\s]+(?:д\.|дом)\s*\d+',
-                                r'[А-ЯЁа-яё]+\s*область[,\s]+[А-ЯЁа-яё]+\s*район[,\s]+[А-ЯЁа-яё]+',
-                            ]
-                            
-                            # Ищем website
-                            # Список доменов для исключения (поисковики, соцсети, общие домены)
-                            excluded_domains = [
-                                'google', 'yandex', 'duckduckgo', 'facebook', 'twitter', 'linkedin',
-                                'w3.org', 'wikipedia', 'wikimedia', 'github', 'stackoverflow',
-                                'reddit', 'youtube', 'instagram', 'vk.com', 'ok.ru',
-                                'mail.ru', 'rambler', 'livejournal', 'habr', 'geektimes'
-                            ]
-                            
-                            # Пытаемся найти домен, связанный с названием компании
-                            company_name_clean_lower = clean_name.lower().replace(' ', '').replace('-', '')
-                            company_keywords = [kw for kw in company_name_clean_lower.split() if len(kw) > 3]
-                            
-                            for pattern in website_patterns:
-                                matches = re.finditer(pattern, content, re.IGNORECASE)
-                                for match in matches:
-                                    website = match.group(1) if match.groups() else match.group(0)
-                                    website_lower = website.lower()
-                                    
-                                    # Фильтруем нерелевантные домены
-                                    if any(skip in website_lower for skip in excluded_domains):
-                                        continue
-                                    
-                                    # Приоритет: домены, содержащие ключевые слова из названия компании
-                                    is_relevant = any(kw in website_lower for kw in company_keywords) if company_keywords else True
-                                    
-                                    if is_relevant or not results["website"]:
-                                        if not website.startswith('http'):
-                                            website = 'https://' + website
-                                        results["website"] = website
-                                        print(f"✅ Найден сайт через веб-поиск: {website}")
-                                        if is_relevant:
-                                            break  # Нашли релевантный домен - прекращаем поиск
-                                if results["website"] and any(kw in results["website"].lower() for kw in company_keywords):
-                                    break
-                            
-                            # Ищем email
-                            if not results["email"]:
-                                email_matches = re.finditer(email_pattern, content, re.IGNORECASE)
-                                for match in email_matches:
-                                    email = match.group(1)
-                                    # Фильтруем нерелевантные email
-                                    if not any(skip in email.lower() for skip in ['example', 'test', 'sample', 'placeholder']):
-                                        results["email"] = email
-                                        print(f"✅ Найден email через веб-поиск: {email}")
-                                        break
-                            
-                            # Ищем телефон
-                            if not results["phone"]:
-                                for pattern in phone_patterns:
-                                    phone_match = re.search(pattern, content, re.IGNORECASE)
-                                    if phone_match:
-                                        phone = phone_match.group(0).strip()
-                                        # Фильтруем placeholder'ы
-                                        phone_clean = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-                                        if not any(p in phone_clean for p in ['1234567', '0000000', '1111111']):
-                                            results["phone"] = phone
-                                            print(f"✅ Найден телефон через веб-поиск: {phone}")
-                                            break
+                        # Если нашли достаточно информации, прекращаем поиск
+                        if results["website"] or results["email"]:
+                            break
                             
-                            # Если нашли достаточно информации, прекращаем поиск
-                            if results["website"] or results["email"]:
-                                break
-                                
-                    except Exception as e:
-                        print(f"⚠️ Ошибка при запросе '{query}': {e}")
-                        continue
-                        
+                except Exception as e:
+                    print(f"⚠️ Ошибка при запросе '{query}': {e}")
+                    continue
+                    
         except Exception as e:
             print(f"⚠️ Общая ошибка при веб-поиске: {e}")
         
@@ -415,14 +308,59 @@ class PolzaAIClient:
             print(f"⚠️ Веб-поиск не дал результатов для '{company_name}'")
             return {}
     
-    async def search_company_info(self, company_name: str, retry_count: int = 3) -> Dict[str, Any]:
+    async def search_company_info(self, company_name: str, retry_count: int = 3, force_refresh: bool = False) -> Dict[str, Any]:
+        """Поиск информации о компании с кэшем по нормализованному названию"""
+        company_name_clean = company_name.strip()
+        cache_key = normalize_company_name(company_name_clean)
+        
+        # В пределах одного хода чата компанию, уже найденную эндпоинтом или контекстом LLM, не ищем повторно
+        turn = current_chat_turn()
+        if turn is not None and not force_refresh:
+            known = turn.known_company(cache_key)
+            if known is not None:
+                print(f"♻️ Информация о компании '{company_name_clean}' уже найдена в этом запросе")
+                return dict(known, name=company_name_clean)
+        
+        if not force_refresh:
+            cached = await self.company_cache.get(cache_key)
+            if cached is not None:
+                print(f"⚡ Информация о компании '{company_name_clean}' взята из кэша")
+                cached["name"] = company_name_clean
+                if turn is not None:
+                    turn.remember_company(cache_key, dict(cached))
+                return cached
+        
+        async def lookup():
+            result = await self._search_company_info_uncached(company_name_clean, retry_count=retry_count)
+            # Fallback-данные сгенерированы без поиска - не кэшируем их, чтобы следующий запрос попробовал снова
+            if not result.pop("_fallback", False):
+                await self.company_cache.set(cache_key, company_name_clean, result)
+            return result
+        
+        # Если такой же поиск уже идет (другой пользователь, чат, агент) - ждем его результат
+        result = dict(await self.company_lookups.do(cache_key, lookup))
+        result["name"] = company_name_clean
+        if turn is not None:
+            turn.remember_company(cache_key, dict(result))
+        return result
+    
+    async def _search_company_info_uncached(self, company_name: str, retry_count: int = 3) -> Dict[str, Any]:
         """Поиск информации о компании через Polza.AI с retry механизмом и улучшенной обработкой"""
         
         # Очищаем название компании от лишних символов
         company_name_clean = company_name.strip()
         
-        # Сначала пробуем найти через веб-поиск
-        web_results = await self._search_company_via_web(company_name_clean)
+        web_task = None
+        web_deadline = None
+        if self.parallel_search:
+            # Веб-поиск идет параллельно с LLM: промпт уходит сразу, без данных из интернета,
+            # а найденное в интернете подмешивается к ответу модели, если успело до дедлайна
+            web_task = asyncio.create_task(self._search_company_via_web(company_name_clean))
+            web_deadline = asyncio.get_running_loop().time() + self.web_search_deadline
+            web_results = {}
+        else:
+            # Сначала пробуем найти через веб-поиск
+            web_results = await self._search_company_via_web(company_name_clean)
         web_context = ""
         if web_results.get("website") or web_results.get("email") or web_results.get("phone"):
             web_context = f"\n\n⚠️⚠️⚠️ КРИТИЧЕСКИ ВАЖНО - РЕАЛЬНЫЕ ДАННЫЕ ИЗ ИНТЕРНЕТА: ⚠️⚠️⚠️\n"
@@ -528,157 +466,149 @@ class PolzaAIClient:
     "preferred_language": "ru"
 }}"""
         
-        last_error = None
-        for attempt in range(retry_count):
-            try:
-                print(f"Попытка {attempt + 1}/{retry_count} поиска информации о компании '{company_name_clean}'")
-                
-                # Делаем запрос с увеличенным таймаутом
-                content = await self._make_request(prompt, max_tokens=2000, model='gpt-4o')
-                
-                # Проверяем на отказ модели
-                if any(phrase in content.lower() for phrase in ["sorry", "can't", "cannot", "не могу", "не имею"]):
-                    if attempt < retry_count - 1:
-                        print(f"Модель отказалась, пробуем упрощенный запрос (попытка {attempt + 2})...")
-                        # Упрощенный промпт
-                        simple_prompt = f"""Найди информацию о компании "{company_name_clean}". Верни ТОЛЬКО JSON без дополнительного текста:
-{{
-    "website": "",
-    "email": "",
-    "address": "",
-    "phone": "",
-    "description": "краткое описание",
-    "equipment": "",
-    "preferred_language": "ru"
-}}"""
-                        content = await self._make_request(simple_prompt, max_tokens=1000, model='gpt-4o')
-                    else:
-                        # Последняя попытка - используем fallback
-                        print("Используем fallback стратегию...")
-                        return self._generate_fallback_company_data(company_name_clean)
-                
-                # Извлекаем JSON из ответа
-                result = self._extract_json_from_response(content, company_name_clean)
-                
-                # ПРИОРИТЕТ: Используем данные из веб-поиска, если они есть
-                # И ОБЯЗАТЕЛЬНО очищаем придуманные данные, если веб-поиск их не нашел
-                if web_results:
-                    # Перезаписываем данными из веб-поиска (они имеют приоритет)
-                    if web_results.get("website"):
-                        result["website"] = web_results.get("website")
-                        print(f"✅ Используем сайт из веб-поиска: {web_results.get('website')}")
-                    if web_results.get("email"):
-                        result["email"] = web_results.get("email")
-                        print(f"✅ Используем email из веб-поиска: {web_results.get('email')}")
-                    if web_results.get("phone"):
-                        result["phone"] = web_results.get("phone")
-                        print(f"✅ Используем телефон из веб-поиска: {web_results.get('phone')}")
-                    else:
-                        # Если веб-поиск не нашел телефон - очищаем придуманный
-                        if result.get("phone"):
-                            phone_clean = result.get("phone", "").replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-                            if any(p in phone_clean for p in ['1234567', '0000000', '1111111', '495123', 'xxx']):
-                                print(f"⚠️ Очищаем придуманный телефон: {result.get('phone')}")
-                                result["phone"] = ""
+        try:
+            last_error = None
+            for attempt in range(retry_count):
+                try:
+                    print(f"Попытка {attempt + 1}/{retry_count} поиска информации о компании '{company_name_clean}'")
+                    is_last_attempt = attempt == retry_count - 1
                     
-                    if web_results.get("address"):
-                        result["address"] = web_results.get("address")
-                        print(f"✅ Используем адрес из веб-поиска: {web_results.get('address')}")
-                    else:
-                        # Если веб-поиск не нашел адрес - очищаем придуманный
-                        if result.get("address"):
-                            address_lower = result.get("address", "").lower()
-                            if any(word in address_lower for word in ['примерная', 'примерный', 'пример', 'test', 'sample']):
-                                print(f"⚠️ Очищаем придуманный адрес: {result.get('address')}")
-                                result["address"] = ""
-                
-                # Валидируем данные
-                validated_result = self._validate_company_data(result, company_name_clean)
-                validated_result["name"] = company_name_clean
+                    async def evaluate(model: str):
+                        nonlocal web_results
+                        content = await self._make_request(prompt, max_tokens=2000, model=model, response_format=COMPANY_INFO_FORMAT)
+                    
+                        # Проверяем на отказ модели
+                        if REFUSAL_PHRASES.found_in(content.lower()):
+                            if model != self.model_router.tiers[-1]:
+                                # Модель младшего уровня отказалась - запрос уйдет на следующую
+                                raise ValueError("модель отказалась отвечать")
+                            if not is_last_attempt:
+                                print(f"Модель отказалась, пробуем упрощенный запрос (попытка {attempt + 2})...")
+                                # Упрощенный промпт
+                                simple_prompt = f"""Найди информацию о компании "{company_name_clean}". Верни ТОЛЬКО JSON без дополнительного текста:
+    {{
+        "website": "",
+        "email": "",
+        "address": "",
+        "phone": "",
+        "description": "краткое описание",
+        "equipment": "",
+        "preferred_language": "ru"
+    }}"""
+                                content = await self._make_request(simple_prompt, max_tokens=1000, model=model, response_format=COMPANY_INFO_FORMAT)
+                            else:
+                                # Последняя попытка - используем fallback
+                                print("Используем fallback стратегию...")
+                                return {**self._generate_fallback_company_data(company_name_clean), "_fallback": True}, 0.0
+                    
+                        # Извлекаем JSON из ответа
+                        result = self._extract_json_from_response(content, company_name_clean)
+                        
+                        if web_task is not None:
+                            web_results = await self._collect_web_results(web_task, web_deadline)
+                    
+                        # ПРИОРИТЕТ: Используем данные из веб-поиска, если они есть
+                        # И ОБЯЗАТЕЛЬНО очищаем придуманные данные, если веб-поиск их не нашел
+                        if web_results:
+                            # Перезаписываем данными из веб-поиска (они имеют приоритет)
+                            if web_results.get("website"):
+                                result["website"] = web_results.get("website")
+                                print(f"✅ Используем сайт из веб-поиска: {web_results.get('website')}")
+                            if web_results.get("email"):
+                                result["email"] = web_results.get("email")
+                                print(f"✅ Используем email из веб-поиска: {web_results.get('email')}")
+                            if web_results.get("phone"):
+                                result["phone"] = web_results.get("phone")
+                                print(f"✅ Используем телефон из веб-поиска: {web_results.get('phone')}")
+                            else:
+                                # Если веб-поиск не нашел телефон - очищаем придуманный
+                                if result.get("phone"):
+                                    phone_clean = result.get("phone", "").replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
+                                    if any(p in phone_clean for p in ['1234567', '0000000', '1111111', '495123', 'xxx']):
+                                        print(f"⚠️ Очищаем придуманный телефон: {result.get('phone')}")
+                                        result["phone"] = ""
+                        
+                            if web_results.get("address"):
+                                result["address"] = web_results.get("address")
+                                print(f"✅ Используем адрес из веб-поиска: {web_results.get('address')}")
+                            else:
+                                # Если веб-поиск не нашел адрес - очищаем придуманный
+                                if result.get("address"):
+                                    address_lower = result.get("address", "").lower()
+                                    if any(word in address_lower for word in ['примерная', 'примерный', 'пример', 'test', 'sample']):
+                                        print(f"⚠️ Очищаем придуманный адрес: {result.get('address')}")
+                                        result["address"] = ""
+                    
+                        # Валидируем данные
+                        validated = self._validate_company_data(result, company_name_clean)
+                        validated["name"] = company_name_clean
+                        return validated, company_completeness(validated)
+                    
+                    # Сначала быстрая модель, старшая - только если данных не хватает
+                    validated_result = await self.model_router.route("company_search", evaluate)
+                    if validated_result.get("_fallback"):
+                        return validated_result
                 
-                # Проверяем, что получили хотя бы минимальные данные
-                if validated_result.get("description") or validated_result.get("website"):
-                    print(f"✅ Успешно найдена информация о компании '{company_name_clean}'")
-                    return validated_result
-                else:
-                    print(f"⚠️ Получены пустые данные, пробуем еще раз...")
-                    if attempt < retry_count - 1:
-                        continue
-                    else:
+                    # Проверяем, что получили хотя бы минимальные данные
+                    if validated_result.get("description") or validated_result.get("website"):
+                        print(f"✅ Успешно найдена информация о компании '{company_name_clean}'")
                         return validated_result
+                    else:
+                        print(f"⚠️ Получены пустые данные, пробуем еще раз...")
+                        if attempt < retry_count - 1:
+                            continue
+                        else:
+                            return validated_result
                         
-            except httpx.HTTPError as e:
-                last_error = e
-                print(f"HTTP ошибка при попытке {attempt + 1}: {e}")
-                if attempt < retry_count - 1:
-                    await asyncio.sleep(2 ** attempt)  # Экспоненциальная задержка
-                    continue
-                else:
-                    break
-            except json.JSONDecodeError as e:
-                last_error = e
-                print(f"Ошибка парсинга JSON при попытке {attempt + 1}: {e}")
-                if attempt < retry_count - 1:
-                    continue
-                else:
-                    # Пытаемся извлечь из текста
-                    result = self._extract_info_from_text(content if 'content' in locals() else "", company_name_clean)
-                    validated_result = self._validate_company_data(result, company_name_clean)
-                    validated_result["name"] = company_name_clean
-                    return validated_result
-            except Exception as e:
-                last_error = e
-                print(f"Неожиданная ошибка при попытке {attempt + 1}: {e}")
-                import traceback
-                traceback.print_exc()
-                if attempt < retry_count - 1:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                else:
+                except (httpx.HTTPError, CircuitOpenError) as e:
+                    # Временные сбои уже повторены политикой upstream - повтор здесь лишь умножил бы нагрузку
+                    last_error = e
+                    print(f"HTTP ошибка при попытке {attempt + 1}: {e}")
                     break
-        
-        # Если все попытки не удались, возвращаем fallback данные
-        print(f"❌ Все попытки не удались для компании '{company_name_clean}', используем fallback")
-        return self._generate_fallback_company_data(company_name_clean)
+                except Exception as e:
+                    last_error = e
+                    print(f"Неожиданная ошибка при попытке {attempt + 1}: {e}")
+                    import traceback
+                    traceback.print_exc()
+                    if attempt < retry_count - 1:
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    else:
+                        break
+        
+            # Если все попытки не удались, возвращаем fallback данные
+            print(f"❌ Все попытки не удались для компании '{company_name_clean}', используем fallback")
+            return {**self._generate_fallback_company_data(company_name_clean), "_fallback": True}
+        finally:
+            if web_task is not None and not web_task.done():
+                web_task.cancel()
     
-    def _extract_json_from_response(self, content: str, company_name: str) -> Dict[str, Any]:
-        """Извлекает JSON из ответа модели с улучшенной обработкой"""
-        # Убираем markdown форматирование если есть
-        content = content.replace("```json", "").replace("```", "").strip()
-        
-        # Ищем JSON объект
-        start_idx = content.find('{')
-        end_idx = content.rfind('}') + 1
-        
-        if start_idx != -1 and end_idx > start_idx:
-            json_str = content[start_idx:end_idx]
+    async def _collect_web_results(self, web_task: asyncio.Task, deadline: float) -> Dict[str, Any]:
+        """Ждет результаты параллельного веб-поиска, но не дольше дедлайна"""
+        if not web_task.done():
+            remaining = deadline - asyncio.get_running_loop().time()
             try:
-                result = json.loads(json_str)
-                print(f"✅ JSON успешно извлечен из ответа")
-                return result
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Ошибка парсинга JSON: {e}")
-                print(f"Пробуем исправить JSON...")
-                # Пытаемся исправить распространенные ошибки
-                json_str = self._fix_json_string(json_str)
-                try:
-                    return json.loads(json_str)
-                except:
-                    pass
-        
-        # Если не удалось извлечь JSON, пытаемся из текста
-        print(f"⚠️ JSON не найден, извлекаем из текста...")
-        return self._extract_info_from_text(content, company_name)
+                await asyncio.wait_for(asyncio.shield(web_task), timeout=max(0.0, remaining))
+            except asyncio.TimeoutError:
+                print(f"⏱️ Веб-поиск не успел к дедлайну ({self.web_search_deadline} с), используем только ответ модели")
+                web_task.cancel()
+                return {}
+        if web_task.cancelled() or web_task.exception() is not None:
+            return {}
+        return web_task.result()
     
-    def _fix_json_string(self, json_str: str) -> str:
-        """Исправляет распространенные ошибки в JSON строке"""
-        # Убираем trailing commas
-        json_str = re.sub(r',\s*}', '}', json_str)
-        json_str = re.sub(r',\s*]', ']', json_str)
-        # Исправляем одинарные кавычки
-        json_str = re.sub(r"'([^']*)':", r'"\1":', json_str)
-        json_str = re.sub(r":\s*'([^']*)'", r': "\1"', json_str)
-        return json_str
+    def _extract_json_from_response(self, content: str, company_name: str) -> Dict[str, Any]:
+        """Данные компании из ответа модели: JSON по схеме, иначе однопроходный разбор, иначе эвристики по тексту"""
+        try:
+            result, method = parse_company_info(content)
+            self.parse_stats[method] += 1
+            if method == "repaired":
+                print(f"⚠️ Ответ не по схеме, JSON восстановлен из текста ответа")
+            return result
+        except ValueError as e:
+            print(f"⚠️ JSON не найден ({e}), извлекаем из текста...")
+            self.parse_stats["text"] += 1
+            return self._extract_info_from_text(content, company_name)
     
     def _generate_fallback_company_data(self, company_name: str) -> Dict[str, Any]:
         """Генерирует базовые данные компании на основе названия (fallback)"""
@@ -759,164 +689,66 @@ class PolzaAIClient:
 - Для адреса: укажи полный адрес с указанием страны, города, улицы
 - Для телефона: используй международный формат с кодом страны (например, +7 для России, +1 для США, +44 для UK)
 
-Ответь ТОЛЬКО в формате JSON массива без дополнительного текста:
-[
-    {{
-        "name": "Название компании",
-        "website": "https://example.com",
-        "email": "email@example.com",
-        "address": "полный адрес с указанием страны",
-        "phone": "телефон в международном формате",
-        "description": "описание деятельности"
-    }}
-]"""
+Ответь ТОЛЬКО в формате JSON без дополнительного текста:
+{{
+    "companies": [
+        {{
+            "name": "Название компании",
+            "website": "https://example.com",
+            "email": "email@example.com",
+            "address": "полный адрес с указанием страны",
+            "phone": "телефон в международном формате",
+            "description": "описание деятельности"
+        }}
+    ]
+}}"""
         
-        try:
-            content = await self._make_request(prompt, max_tokens=4000)
+        async def evaluate(model: str):
+            content = await self._make_request(prompt, max_tokens=4000, model=model, response_format=EQUIPMENT_COMPANIES_FORMAT)
             
-            # Пытаемся извлечь JSON массив из ответа
             try:
-                # Ищем JSON массив в ответе
-                start_idx = content.find('[')
-                end_idx = content.rfind(']') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = content[start_idx:end_idx]
-                    result = json.loads(json_str)
-                    
-                    # Валидация каждой компании в списке
-                    validated_companies = []
-                    for company in result:
-                        if isinstance(company, dict):
-                            validated_company = self._validate_company_data(company, company.get("name", "Unknown"))
-                            # Проверяем, что у компании есть хотя бы название
-                            if validated_company.get("name") or company.get("name"):
-                                validated_company["name"] = company.get("name", "")
-                                validated_companies.append(validated_company)
-                    
-                    print(f"Успешно распарсили и валидировали {len(validated_companies)} компаний для оборудования {equipment_name}")
-                    return validated_companies
-            except json.JSONDecodeError as e:
+                result, method = parse_equipment_companies(content)
+            except ValueError as e:
                 print(f"Ошибка парсинга JSON: {e}")
                 print(f"Содержимое ответа: {content}")
+                raise
+            self.parse_stats[method] += 1
             
+            # Валидация каждой компании в списке
+            validated_companies = []
+            for company in result:
+                validated_company = self._validate_company_data(company, company.get("name") or "Unknown")
+                # Проверяем, что у компании есть хотя бы название
+                if company.get("name"):
+                    validated_company["name"] = company["name"]
+                    validated_companies.append(validated_company)
+            
+            if not validated_companies:
+                return validated_companies, 0.0
+            score = sum(company_completeness(company) for company in validated_companies) / len(validated_companies)
+            return validated_companies, round(score, 3)
+        
+        try:
+            validated_companies = await self.model_router.route("equipment_search", evaluate)
+            print(f"Успешно распарсили и валидировали {len(validated_companies)} компаний для оборудования {equipment_name}")
+            return validated_companies
+        except ValueError:
             # Если не удалось распарсить JSON, возвращаем пустой список
             return []
-            
         except Exception as e:
             print(f"Ошибка при поиске компаний по оборудованию {equipment_name}: {e}")
             return []
     
     def _extract_company_names_from_message(self, message: str) -> List[str]:
         """Извлекает названия компаний из сообщения пользователя"""
-        import re
-        
-        companies = []
-        message_lower = message.lower()
-        
-        # Проверяем, есть ли упоминание компаний или запрос на поиск
-        company_keywords = ['компани', 'фирм', 'организац', 'предприяти', 'ооо', 'зао', 'ао', 'ип', 
-                           'найди', 'найти', 'ищу', 'искать', 'информация', 'знаешь', 'расскажи']
-        
-        if any(word in message_lower for word in company_keywords):
-            # Паттерны для поиска компаний (в порядке приоритета)
-            patterns = [
-                # Прямые запросы: "найди информацию о компании X"
-                r'(?:найди|найти|ищу|искать|расскажи|что\s+ты\s+знаешь)\s+(?:информацию\s+)?(?:о\s+)?(?:компани[ияюе]|фирм[еыу]|организаци[июе])\s+["\']?([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+)["\']?',
-                # "компания X" или "фирма X"
-                r'(?:компани[яиюе]|фирм[аыуе]|организаци[яиюе]|предприяти[еяю])\s+["\']?([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+(?:ООО|ЗАО|АО|ИП|Ltd|Inc|LLC|GmbH|Corp)?)["\']?',
-                # "ООО X", "ЗАО X" и т.д.
-                r'(?:ООО|ЗАО|АО|ИП|Ltd|Inc|LLC|GmbH|Corp)\s+["\']?([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+)["\']?',
-                # Названия в кавычках
-                r'["\']([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+(?:ООО|ЗАО|АО|ИП|Ltd|Inc|LLC|GmbH|Corp)?)["\']',
-            ]
-            
-            for pattern in patterns:
-                matches = re.findall(pattern, message, re.IGNORECASE)
-                for match in matches:
-                    company = match.strip()
-                    # Очищаем от лишних слов
-                    company = re.sub(r'\s+(компани[ияюе]|фирм[ыуе]|организаци[июе]|предприяти[еяю])\s*$', '', company, flags=re.IGNORECASE)
-                    company = company.strip('.,!?;:')
-                    
-                    if len(company) > 2 and len(company) < 200:
-                        # Проверяем, что это не просто общее слово
-                        if not company.lower() in ['информация', 'компания', 'фирма', 'организация', 'предприятие']:
-                            companies.append(company)
-            
-            # Если не нашли по паттернам, но есть упоминание компаний, пробуем извлечь после ключевых слов
-            if not companies:
-                # Ищем текст после "о компании", "фирма" и т.д.
-                fallback_patterns = [
-                    r'(?:о|про)\s+(?:компани[ияюе]|фирм[еыу]|организаци[июе])\s+([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]{3,50})',
-                    r'(?:компани[ияюе]|фирм[аыуе])\s+([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]{3,50})',
-                ]
-                for pattern in fallback_patterns:
-                    match = re.search(pattern, message, re.IGNORECASE)
-                    if match:
-                        company = match.group(1).strip().strip('.,!?;:')
-                        if len(company) > 2 and len(company) < 200:
-                            companies.append(company)
-                            break
-        
-        # Удаляем дубликаты, сохраняя порядок
-        seen = set()
-        unique_companies = []
-        for company in companies:
-            company_lower = company.lower().strip()
-            if company_lower not in seen and len(company_lower) > 2:
-                seen.add(company_lower)
-                unique_companies.append(company)
-        
-        return unique_companies[:5]  # Максимум 5 компаний за раз
+        return extract_company_names(message)
     
     def _extract_equipment_from_message(self, message: str) -> str:
         """Извлекает название оборудования из сообщения"""
-        import re
-        
-        message_lower = message.lower()
-        
-        # Проверяем, есть ли упоминание оборудования или запрос на поиск компаний по оборудованию
-        equipment_keywords = ['оборудован', 'техник', 'использует', 'пользуется', 'применяет', 'имеет', 'работает с', 'используют']
-        search_keywords = ['найди', 'найти', 'ищу', 'искать', 'кто', 'какие компании']
-        
-        has_search = any(word in message_lower for word in search_keywords)
-        has_equipment = any(word in message_lower for word in equipment_keywords)
-        
-        # Если есть ключевые слова поиска И упоминание использования оборудования
-        if has_search and has_equipment:
-            # Упрощенный подход: ищем текст после "используют" или "использует"
-            # Паттерн: все что идет после "используют" до конца строки или до знаков препинания
-            simple_patterns = [
-                r'(?:используют?|пользуются?|применяют?|имеют?|работают?\s+с)\s+["\']?([^"\'\n\.!?]{3,100})["\']?',
-            ]
-            
-            for pattern in simple_patterns:
-                match = re.search(pattern, message, re.IGNORECASE)
-                if match:
-                    equipment = match.group(1).strip().strip('.,!?;:')
-                    # Очищаем от лишних слов в конце
-                    equipment = re.sub(r'\s+(оборудован[иемя]|техник[аой]|компани[ияюе]|фирм[ыуе]|используют?|пользуются?)\s*$', '', equipment, flags=re.IGNORECASE)
-                    # Убираем фразы типа "которые используют" в начале
-                    equipment = re.sub(r'^(?:котор[ыеая]|кто)\s+(?:используют?|пользуются?)\s+', '', equipment, flags=re.IGNORECASE)
-                    equipment = equipment.strip()
-                    if len(equipment) > 2 and len(equipment) < 200:
-                        print(f"Обнаружено упоминание оборудования: {equipment}")
-                        return equipment
-        
-        # Также проверяем паттерн "компании с оборудованием X"
-        if any(word in message_lower for word in equipment_keywords):
-            pattern = r'(?:компани[ияюе]|фирм[ыуе])\s+(?:с\s+)?(?:оборудованием|техникой)\s+["\']?([А-ЯЁA-Z][А-Яа-яёA-Za-z0-9\s\-\.]+)["\']?'
-            match = re.search(pattern, message, re.IGNORECASE)
-            if match:
-                equipment = match.group(1).strip().strip('.,!?;:')
-                if len(equipment) > 2 and len(equipment) < 200:
-                    return equipment
-        
-        return None
+        return extract_equipment_name(message)
     
-    async def chat_with_llm(self, message: str, conversation_history: List[Dict[str, Any]] = None, custom_settings: Dict[str, Any] = None) -> str:
-        """Общение с LLM в режиме чата с автоматическим поиском информации о компаниях"""
-        
+    def _detect_chat_targets(self, message: str) -> Tuple[Optional[str], List[str]]:
+        """Оборудование и компании, упомянутые в сообщении чата"""
         # СНАЧАЛА проверяем запрос на поиск по оборудованию (это приоритетнее)
         equipment_name = self._extract_equipment_from_message(message)
         
@@ -940,106 +772,146 @@ class PolzaAIClient:
                                 company_names = [message_stripped]
                                 print(f"Предполагаем, что '{message_stripped}' - это название компании")
         
-        # Собираем информацию о компаниях, если они упомянуты
-        company_info_context = ""
-        if company_names:
-            print(f"🔍 Обнаружены упоминания компаний в сообщении: {company_names}")
-            for company_name in company_names:
-                try:
-                    print(f"🔍 Начинаем поиск информации о компании '{company_name}'...")
-                    # Используем улучшенный поиск с retry, но с ограничением времени
-                    try:
-                        company_info = await asyncio.wait_for(
-                            self.search_company_info(company_name, retry_count=2),
-                            timeout=60.0  # Максимум 60 секунд на поиск
-                        )
-                        print(f"✅ Поиск информации о компании '{company_name}' завершен")
-                        if company_info:
-                            info_text = f"\n\n## Информация о компании '{company_name}':\n"
-                            if company_info.get("website"):
-                                info_text += f"- **Сайт**: {company_info.get('website')}\n"
-                            if company_info.get("email"):
-                                info_text += f"- **Email**: {company_info.get('email')}\n"
-                            
-                            # ФИЛЬТРАЦИЯ: Проверяем телефон на placeholder'ы перед добавлением
-                            phone = company_info.get("phone", "").strip()
-                            if phone:
-                                phone_clean = phone.replace(' ', '').replace('-', '').replace('(', '').replace(')', '').replace('x', '').replace('X', '')
-                                placeholder_patterns = [
-                                    '1234567', '0000000', '1111111', '12345', '00000', '11111',
-                                    '495123', '495000', '495111', 'xxx', 'xxx-xx-xx'
-                                ]
-                                if not any(pattern in phone_clean.lower() for pattern in placeholder_patterns):
-                                    if not ('+7' in phone and '495' in phone and ('123' in phone_clean or '000' in phone_clean)):
-                                        info_text += f"- **Телефон**: {phone}\n"
-                                    else:
-                                        print(f"⚠️ Пропускаем примерный телефон в чате: {phone}")
-                                else:
-                                    print(f"⚠️ Пропускаем placeholder телефон в чате: {phone}")
-                            
-                            # ФИЛЬТРАЦИЯ: Проверяем адрес на placeholder'ы перед добавлением
-                            address = company_info.get("address", "").strip()
-                            if address:
-                                address_lower = address.lower()
-                                if not any(word in address_lower for word in ['примерная', 'примерный', 'пример', 'test', 'sample', 'demo', 'placeholder']):
-                                    info_text += f"- **Адрес**: {address}\n"
-                                else:
-                                    print(f"⚠️ Пропускаем placeholder адрес в чате: {address}")
-                            
-                            if company_info.get("description"):
-                                info_text += f"- **Описание**: {company_info.get('description')}\n"
-                            if company_info.get("equipment"):
-                                info_text += f"- **Оборудование**: {company_info.get('equipment')}\n"
-                            company_info_context += info_text
-                        else:
-                            print(f"⚠️ Не удалось получить информацию о компании '{company_name}'")
-                            company_info_context += f"\n\n## Информация о компании '{company_name}':\n"
-                            company_info_context += f"- К сожалению, не удалось найти полную информацию о компании. Попробуйте уточнить запрос.\n"
-                    except asyncio.TimeoutError:
-                        print(f"⏱️ Таймаут при поиске информации о компании '{company_name}' (превышено 60 секунд)")
-                        company_info_context += f"\n\n## Информация о компании '{company_name}':\n"
-                        company_info_context += f"- Поиск информации занял слишком много времени. Попробуйте уточнить название компании или повторить запрос позже.\n"
-                except Exception as e:
-                    print(f"❌ Ошибка при поиске информации о компании {company_name}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    # Добавляем базовую информацию даже при ошибке
-                    company_info_context += f"\n\n## Информация о компании '{company_name}':\n"
-                    company_info_context += f"- Произошла ошибка при поиске информации. Попробуйте уточнить запрос или повторить позже.\n"
-        
-        # Если упомянуто оборудование, ищем компании
+        return equipment_name, company_names
+
+    def _format_company_context(self, company_name: str, company_info: Optional[Dict[str, Any]]) -> str:
+        """Блок контекста для LLM с найденной информацией о компании"""
+        if company_info:
+            info_text = f"\n\n## Информация о компании '{company_name}':\n"
+            if company_info.get("website"):
+                info_text += f"- **Сайт**: {company_info.get('website')}\n"
+            if company_info.get("email"):
+                info_text += f"- **Email**: {company_info.get('email')}\n"
+
+            # ФИЛЬТРАЦИЯ: Проверяем телефон на placeholder'ы перед добавлением
+            phone = company_info.get("phone", "").strip()
+            if phone:
+                phone_clean = clean_phone(phone)
+                if not PHONE_PLACEHOLDERS.found_in(phone_clean.lower()):
+                    if not is_example_phone(phone, phone_clean):
+                        info_text += f"- **Телефон**: {phone}\n"
+                    else:
+                        print(f"⚠️ Пропускаем примерный телефон в чате: {phone}")
+                else:
+                    print(f"⚠️ Пропускаем placeholder телефон в чате: {phone}")
+
+            # ФИЛЬТРАЦИЯ: Проверяем адрес на placeholder'ы перед добавлением
+            address = company_info.get("address", "").strip()
+            if address:
+                address_lower = address.lower()
+                if not ADDRESS_PLACEHOLDERS.found_in(address_lower):
+                    info_text += f"- **Адрес**: {address}\n"
+                else:
+                    print(f"⚠️ Пропускаем placeholder адрес в чате: {address}")
+
+            if company_info.get("description"):
+                info_text += f"- **Описание**: {company_info.get('description')}\n"
+            if company_info.get("equipment"):
+                info_text += f"- **Оборудование**: {company_info.get('equipment')}\n"
+            return info_text
+        print(f"⚠️ Не удалось получить информацию о компании '{company_name}'")
+        return (f"\n\n## Информация о компании '{company_name}':\n"
+                f"- К сожалению, не удалось найти полную информацию о компании. Попробуйте уточнить запрос.\n")
+
+    async def _company_context(self, company_name: str) -> str:
+        """Ищет компанию и возвращает блок контекста для LLM (время ограничивает _iter_chat_context)"""
+        try:
+            print(f"🔍 Начинаем поиск информации о компании '{company_name}'...")
+            company_info = await self.search_company_info(company_name, retry_count=2)
+            print(f"✅ Поиск информации о компании '{company_name}' завершен")
+            return self._format_company_context(company_name, company_info)
+        except Exception as e:
+            print(f"❌ Ошибка при поиске информации о компании {company_name}: {e}")
+            import traceback
+            traceback.print_exc()
+            # Добавляем базовую информацию даже при ошибке
+            return (f"\n\n## Информация о компании '{company_name}':\n"
+                    f"- Произошла ошибка при поиске информации. Попробуйте уточнить запрос или повторить позже.\n")
+
+    async def _equipment_context(self, message: str, equipment_name: str) -> str:
+        """Ищет компании, использующие оборудование, и возвращает блок контекста для LLM"""
+        print(f"Обнаружено упоминание оборудования: {equipment_name}")
         equipment_companies_context = ""
+        try:
+            # Проверяем, указана ли страна в запросе
+            country_mentioned = ""
+            if "в россии" in message.lower() or "россия" in message.lower():
+                country_mentioned = " в России"
+            elif "в сша" in message.lower() or "сша" in message.lower():
+                country_mentioned = " в США"
+            elif "в германии" in message.lower() or "германия" in message.lower():
+                country_mentioned = " в Германии"
+
+            # Добавляем страну к названию оборудования для поиска
+            search_query = equipment_name + country_mentioned if country_mentioned else equipment_name
+            companies = await self.search_companies_by_equipment(search_query)
+            if companies:
+                equipment_companies_context = f"\n\n## Компании, использующие '{equipment_name}'{country_mentioned}:\n\n"
+                for i, company in enumerate(companies[:10], 1):  # Максимум 10 компаний
+                    equipment_companies_context += f"{i}. **{company.get('name', 'Неизвестно')}**\n"
+                    if company.get("website"):
+                        equipment_companies_context += f"   - Сайт: {company.get('website')}\n"
+                    if company.get("email"):
+                        equipment_companies_context += f"   - Email: {company.get('email')}\n"
+                    if company.get("phone"):
+                        equipment_companies_context += f"   - Телефон: {company.get('phone')}\n"
+                    if company.get("address"):
+                        equipment_companies_context += f"   - Адрес: {company.get('address')}\n"
+                    equipment_companies_context += "\n"
+        except Exception as e:
+            print(f"Ошибка при поиске компаний по оборудованию {equipment_name}: {e}")
+        return equipment_companies_context
+
+    async def _iter_chat_context(self, message: str, equipment_name: Optional[str],
+                                 company_names: List[str]) -> AsyncIterator[Tuple[int, str, str, str]]:
+        """Параллельный поиск упомянутых компаний и оборудования под общим дедлайном.
+
+        Отдает (позиция, "company" | "equipment", название, блок контекста) по мере
+        готовности. Поиски, не успевшие за chat_context_deadline, отменяются: для
+        компании в контекст идет сообщение о таймауте, для оборудования - ничего.
+        Сам поиск компании при этом доходит до конца в SingleFlight и попадает в кэш.
+        """
+        lookups = [("company", company_name, self._company_context(company_name)) for company_name in company_names]
         if equipment_name:
-            print(f"Обнаружено упоминание оборудования: {equipment_name}")
-            try:
-                # Проверяем, указана ли страна в запросе
-                country_mentioned = ""
-                if "в россии" in message.lower() or "россия" in message.lower():
-                    country_mentioned = " в России"
-                elif "в сша" in message.lower() or "сша" in message.lower():
-                    country_mentioned = " в США"
-                elif "в германии" in message.lower() or "германия" in message.lower():
-                    country_mentioned = " в Германии"
-                
-                # Добавляем страну к названию оборудования для поиска
-                search_query = equipment_name + country_mentioned if country_mentioned else equipment_name
-                companies = await self.search_companies_by_equipment(search_query)
-                if companies:
-                    equipment_companies_context = f"\n\n## Компании, использующие '{equipment_name}'{country_mentioned}:\n\n"
-                    for i, company in enumerate(companies[:10], 1):  # Максимум 10 компаний
-                        equipment_companies_context += f"{i}. **{company.get('name', 'Неизвестно')}**\n"
-                        if company.get("website"):
-                            equipment_companies_context += f"   - Сайт: {company.get('website')}\n"
-                        if company.get("email"):
-                            equipment_companies_context += f"   - Email: {company.get('email')}\n"
-                        if company.get("phone"):
-                            equipment_companies_context += f"   - Телефон: {company.get('phone')}\n"
-                        if company.get("address"):
-                            equipment_companies_context += f"   - Адрес: {company.get('address')}\n"
-                        equipment_companies_context += "\n"
-            except Exception as e:
-                print(f"Ошибка при поиске компаний по оборудованию {equipment_name}: {e}")
+            lookups.append(("equipment", equipment_name, self._equipment_context(message, equipment_name)))
+        tasks = {asyncio.ensure_future(coro): position for position, (_, _, coro) in enumerate(lookups)}
         
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.chat_context_deadline
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.get):
+                    kind, name, _ = lookups[tasks[task]]
+                    yield tasks[task], kind, name, task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        for task in sorted(pending, key=tasks.get):
+            kind, name, _ = lookups[tasks[task]]
+            print(f"⏱️ Поиск '{name}' не успел к дедлайну чата ({self.chat_context_deadline} с)")
+            context = ""
+            if kind == "company":
+                context = (f"\n\n## Информация о компании '{name}':\n"
+                           f"- Поиск информации занял слишком много времени. Попробуйте уточнить название компании или повторить запрос позже.\n")
+            yield tasks[task], kind, name, context
+
+    @staticmethod
+    def _join_chat_context(contexts: Dict[int, Tuple[str, str]]) -> Tuple[str, str]:
+        """Склеивает блоки {позиция: (kind, context)} в порядке упоминания в сообщении"""
+        ordered = [contexts[position] for position in sorted(contexts)]
+        company_info_context = "".join(context for kind, context in ordered if kind == "company")
+        equipment_companies_context = "".join(context for kind, context in ordered if kind == "equipment")
+        return company_info_context, equipment_companies_context
+
+    def _build_chat_payload(self, message: str, conversation_history: List[Dict[str, Any]], custom_settings: Dict[str, Any],
+                            company_info_context: str, equipment_companies_context: str) -> Dict[str, Any]:
+        """Запрос к chat/completions: системный промпт, история и сообщение с найденным контекстом"""
         # Формируем контекст для чата
         system_prompt = """Ты - умный AI агент-помощник по поиску информации о компаниях и оборудовании по всему миру. 
         Ты имеешь доступ ко всему приложению и можешь самостоятельно выполнять действия.
@@ -1156,50 +1028,163 @@ class PolzaAIClient:
             "max_tokens": max_tokens,
             "temperature": temperature
         }
+        return payload
+
+    @staticmethod
+    def _chat_error_message(error: Exception) -> str:
+        """Понятный пользователю текст ошибки обращения к LLM"""
+        if isinstance(error, httpx.HTTPStatusError):
+            print(f"Ошибка HTTP запроса к Polza.AI для чата: {error}")
+            if error.response is not None:
+                print(f"Статус код: {error.response.status_code}")
+                try:
+                    error_data = error.response.json()
+                    error_msg = error_data.get("error", {}).get("message", str(error))
+                except:
+                    error_msg = error.response.text[:200]
+                print(f"Ответ: {error_msg}")
+            return f"Извините, произошла ошибка при обращении к AI (HTTP {error.response.status_code if error.response is not None else 'unknown'}). Попробуйте переформулировать запрос или повторить позже."
+        if isinstance(error, httpx.TimeoutException):
+            print(f"Таймаут при обращении к Polza.AI для чата: {error}")
+            return "Извините, запрос к AI занял слишком много времени. Попробуйте упростить запрос или повторить позже."
+        if isinstance(error, CircuitOpenError):
+            print(f"Запрос к Polza.AI не отправлен: {error}")
+            return f"Извините, AI сервис временно недоступен. Повторите запрос примерно через {error.retry_in:.0f} с."
+        print(f"Ошибка при общении с LLM: {error}")
+        import traceback
+        traceback.print_exc()
+        return f"Извините, произошла ошибка при общении с AI: {str(error)[:100]}. Попробуйте переформулировать запрос."
+
+    async def chat_with_llm(self, message: str, conversation_history: List[Dict[str, Any]] = None, custom_settings: Dict[str, Any] = None) -> str:
+        """Общение с LLM в режиме чата с автоматическим поиском информации о компаниях"""
+        equipment_name, company_names = self._detect_chat_targets(message)
+        if company_names:
+            print(f"🔍 Обнаружены упоминания компаний в сообщении: {company_names}")
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            try:
-                print(f"💬 Отправляем сообщение в чат: {message[:50]}...")
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=120.0  # Увеличиваем таймаут для долгих ответов
-                )
+        # Компании и оборудование ищем параллельно, берем то, что успело к дедлайну
+        contexts = {}
+        async for position, kind, _, context in self._iter_chat_context(message, equipment_name, company_names):
+            contexts[position] = (kind, context)
+        company_info_context, equipment_companies_context = self._join_chat_context(contexts)
+        
+        payload = self._build_chat_payload(message, conversation_history, custom_settings,
+                                           company_info_context, equipment_companies_context)
+        
+        client = self.http_pool.get_client(self.base_url)
+        
+        async def send() -> httpx.Response:
+            print(f"💬 Отправляем сообщение в чат: {message[:50]}...")
+            return await client.post(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=120.0  # Увеличиваем таймаут для долгих ответов
+            )
+        
+        try:
+            tokens = estimate_request_tokens(payload["messages"], payload["max_tokens"])
+            async with self.llm_governor.reserve(payload["model"], tokens) as slot, self.telemetry.track("chat", payload["model"]) as call:
+                response = await self.upstream_policies["polza"].call(lambda: self._governed_send(slot, send), on_retry=call.count_retry)
                 response.raise_for_status()
                 
                 result = response.json()
+                call.add_usage(result.get("usage"))
+                slot.settle(result.get("usage"))
                 if "choices" not in result or len(result["choices"]) == 0:
                     raise ValueError("Пустой ответ от API")
                 content = result["choices"][0]["message"]["content"]
-                print(f"✅ Получен ответ от LLM: {content[:100]}...")
-                return content
-                
-            except httpx.HTTPStatusError as e:
-                print(f"Ошибка HTTP запроса к Polza.AI для чата: {e}")
-                if hasattr(e, 'response') and e.response is not None:
-                    print(f"Статус код: {e.response.status_code}")
-                    try:
-                        error_data = e.response.json()
-                        error_msg = error_data.get("error", {}).get("message", str(e))
-                    except:
-                        error_msg = e.response.text[:200]
-                    print(f"Ответ: {error_msg}")
-                return f"Извините, произошла ошибка при обращении к AI (HTTP {e.response.status_code if hasattr(e, 'response') else 'unknown'}). Попробуйте переформулировать запрос или повторить позже."
-            except httpx.TimeoutException as e:
-                print(f"Таймаут при обращении к Polza.AI для чата: {e}")
-                return "Извините, запрос к AI занял слишком много времени. Попробуйте упростить запрос или повторить позже."
-            except Exception as e:
-                print(f"Ошибка при общении с LLM: {e}")
-                import traceback
-                traceback.print_exc()
-                return f"Извините, произошла ошибка при общении с AI: {str(e)[:100]}. Попробуйте переформулировать запрос."
-    
-    async def summarize_conversation(self, conversation_history: List[Dict[str, Any]]) -> str:
-        """Создает краткое резюме диалога для сохранения контекста"""
+            print(f"✅ Получен ответ от LLM: {content[:100]}...")
+            return content
+        except Exception as e:
+            return self._chat_error_message(e)
+
+    async def chat_with_llm_stream(self, message: str, conversation_history: List[Dict[str, Any]] = None,
+                                   custom_settings: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Потоковый вариант chat_with_llm, отдает события {"event", "data"}.
+
+        start - сразу, со списком найденных в сообщении компаний и оборудования;
+        company / equipment - по мере готовности каждого поиска; token - фрагменты
+        ответа LLM по мере генерации; в конце error (если запрос к LLM не удался)
+        и done с полным текстом ответа.
+        """
+        equipment_name, company_names = self._detect_chat_targets(message)
+        yield {"event": "start", "data": {"companies": company_names, "equipment": equipment_name}}
+        
+        contexts = {}
+        async for position, kind, name, context in self._iter_chat_context(message, equipment_name, company_names):
+            contexts[position] = (kind, context)
+            yield {"event": kind, "data": {"name": name, "context": context}}
+        company_info_context, equipment_companies_context = self._join_chat_context(contexts)
+        payload = self._build_chat_payload(message, conversation_history, custom_settings,
+                                           company_info_context, equipment_companies_context)
+        payload["stream"] = True
+        # Без include_usage OpenAI-совместимый API не присылает usage в потоке - токены не попали бы в телеметрию
+        payload["stream_options"] = {"include_usage": True}
+        
+        client = self.http_pool.get_client(self.base_url)
+        
+        async def send() -> httpx.Response:
+            print(f"💬 Отправляем сообщение в чат (поток): {message[:50]}...")
+            request = client.build_request(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=120.0
+            )
+            return await client.send(request, stream=True)
+        
+        content_parts = []
+        try:
+            tokens = estimate_request_tokens(payload["messages"], payload["max_tokens"])
+            async with self.llm_governor.reserve(payload["model"], tokens) as slot, self.telemetry.track("chat_stream", payload["model"]) as call:
+                # Повторяется только установка соединения и статус ответа: начатый поток не переотправляем
+                response = await self.upstream_policies["polza"].call(lambda: self._governed_send(slot, send), on_retry=call.count_retry)
+                try:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        # Формат OpenAI: строки "data: {...}", поток завершает "data: [DONE]"
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except ValueError:
+                            continue
+                        # usage приходит последним чанком (с пустым choices) по stream_options.include_usage
+                        call.add_usage(chunk.get("usage"))
+                        slot.settle(chunk.get("usage"))
+                        choices = chunk.get("choices") or []
+                        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if delta:
+                            content_parts.append(delta)
+                            yield {"event": "token", "data": {"content": delta}}
+                finally:
+                    await response.aclose()
+        except Exception as e:
+            error_message = self._chat_error_message(e)
+            yield {"event": "error", "data": {"message": error_message}}
+            content_parts = [error_message]
+        
+        content = "".join(content_parts)
+        print(f"✅ Получен потоковый ответ от LLM: {content[:100]}...")
+        yield {"event": "done", "data": {"message": content}}
+
+    async def summarize_conversation(self, conversation_history: List[Dict[str, Any]], previous_summary: str = None) -> Optional[str]:
+        """Создает краткое резюме диалога для сохранения контекста.
+
+        previous_summary - резюме более ранней части диалога: новое резюме
+        дополняет его сообщениями conversation_history. При ошибке возвращает None.
+        """
         
         # Формируем текст диалога для сумаризации
         conversation_text = ""
+        if previous_summary:
+            conversation_text += f"Резюме предыдущей части диалога: {previous_summary}\n\n"
         for msg in conversation_history:
             # Проверяем, это словарь или объект ChatMessage
             if hasattr(msg, 'role'):
@@ -1225,28 +1210,36 @@ class PolzaAIClient:
         ]
         
         payload = {
-            "model": "gpt-4o",
+            "model": self.summary_model,
             "messages": messages,
             "max_tokens": 300,
             "temperature": 0.3
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                print("Создаем резюме диалога...")
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=60.0
-                )
+        client = self.http_pool.get_client(self.base_url)
+        
+        async def send() -> httpx.Response:
+            print("Создаем резюме диалога...")
+            return await client.post(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=60.0
+            )
+        
+        try:
+            tokens = estimate_request_tokens(payload["messages"], payload["max_tokens"])
+            async with self.llm_governor.reserve(payload["model"], tokens) as slot, self.telemetry.track("summary", payload["model"]) as call:
+                response = await self.upstream_policies["polza"].call(lambda: self._governed_send(slot, send), on_retry=call.count_retry)
                 response.raise_for_status()
-                
+            
                 result = response.json()
+                call.add_usage(result.get("usage"))
+                slot.settle(result.get("usage"))
                 summary = result["choices"][0]["message"]["content"]
-                print(f"Создано резюме: {summary[:100]}...")
-                return summary
-                
-            except Exception as e:
-                print(f"Ошибка при создании резюме: {e}")
-                return "Резюме диалога недоступно."
+            print(f"Создано резюме: {summary[:100]}...")
+            return summary
+            
+        except Exception as e:
+            print(f"Ошибка при создании резюме: {e}")
+            return None
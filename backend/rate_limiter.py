@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """Token bucket для ограничения частоты запросов к одному upstream.
+
+    rate - запросов в секунду (0 или меньше - без ограничения), burst - сколько
+    запросов можно выпустить подряд после простоя. Ожидающие корутины встают
+    в очередь, а не получают ошибку.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
@@ -0,0 +1,233 @@
+import asyncio
+import contextvars
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Iterator, Optional
+
+import httpx
+
+# Статусы, при которых повтор имеет смысл: перегрузка и временная недоступность upstream
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Upstream временно отключен circuit breaker'ом - запрос не отправлялся"""
+
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"Сервис {upstream} временно недоступен, повторите через {retry_in:.0f} с")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+class RetryBudget:
+    """Сколько повторов разрешено на один входящий запрос по всем upstream вместе"""
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+
+    def try_spend(self) -> bool:
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+_current_budget: contextvars.ContextVar[Optional[RetryBudget]] = contextvars.ContextVar("retry_budget", default=None)
+
+
+@contextmanager
+def retry_budget(retries: int = None) -> Iterator[RetryBudget]:
+    """Общий бюджет повторов для всех вызовов upstream внутри блока (и созданных в нем задач)"""
+    budget = RetryBudget(retries if retries is not None else int(os.getenv("UPSTREAM_RETRY_BUDGET", "4")))
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        try:
+            _current_budget.reset(token)
+        except ValueError:
+            pass
+
+
+class CircuitBreaker:
+    """Размыкает цепь, когда доля ошибок upstream за окно превышает порог.
+
+    closed - запросы идут как обычно; open - сразу CircuitOpenError без
+    обращения к upstream; по истечении open_seconds - half_open: пропускается
+    один пробный запрос, его успех замыкает цепь, ошибка снова размыкает.
+    """
+
+    def __init__(self, name: str, failure_ratio: float = None, min_calls: int = None,
+                 window: float = None, open_seconds: float = None):
+        self.name = name
+        self.failure_ratio = failure_ratio if failure_ratio is not None else float(os.getenv("CIRCUIT_FAILURE_RATIO", "0.5"))
+        self.min_calls = min_calls or int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+        self.window = window or float(os.getenv("CIRCUIT_WINDOW", "30"))
+        self.open_seconds = open_seconds or float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+        self.state = "closed"
+        self._outcomes = deque()  # (время, успех)
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self.counters = {"rejected": 0, "opened": 0}
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def before_call(self):
+        if self.state == "open":
+            retry_in = self._opened_at + self.open_seconds - time.monotonic()
+            if retry_in > 0:
+                self.counters["rejected"] += 1
+                raise CircuitOpenError(self.name, retry_in)
+            self.state = "half_open"
+        if self.state == "half_open":
+            now = time.monotonic()
+            # Пробный запрос один; если он так и не завершился (отменен), через open_seconds пускаем следующий
+            if self._probe_started is not None and now - self._probe_started < self.open_seconds:
+                self.counters["rejected"] += 1
+                raise CircuitOpenError(self.name, self._probe_started + self.open_seconds - now)
+            self._probe_started = now
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        if self.state == "half_open":
+            self._probe_started = None
+            if success:
+                print(f"✅ Цепь {self.name} снова замкнута")
+                self.state = "closed"
+                self._outcomes.clear()
+            else:
+                self._open(now)
+            return
+
+        self._outcomes.append((now, success))
+        self._trim(now)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_ratio:
+            self._open(now)
+
+    def _open(self, now: float):
+        print(f"⛔ Цепь {self.name} разомкнута на {self.open_seconds:.0f} с из-за ошибок upstream")
+        self.state = "open"
+        self._opened_at = now
+        self._outcomes.clear()
+        self.counters["opened"] += 1
+
+    def stats(self):
+        return {"state": self.state, **self.counters}
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Значение Retry-After в секундах (число или HTTP-дата), None если заголовка нет"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class UpstreamPolicy:
+    """Повторы и circuit breaker для одного upstream.
+
+    Повторяются только временные ошибки: таймауты, обрывы соединения и статусы
+    из RETRYABLE_STATUSES. Пауза - Retry-After, если upstream его прислал, иначе
+    экспоненциальная с полным jitter. Каждый повтор списывается с бюджета
+    текущего запроса (retry_budget), поэтому сбой upstream не размножается
+    вложенными циклами повторов.
+    """
+
+    def __init__(self, name: str, max_attempts: int = None, base_delay: float = None, max_delay: float = None,
+                 breaker: CircuitBreaker = None):
+        self.name = name
+        self.max_attempts = max_attempts or int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3"))
+        self.base_delay = base_delay if base_delay is not None else float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "1"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "20"))
+        self.breaker = breaker or CircuitBreaker(name)
+        self.counters = {"calls": 0, "retries": 0, "budget_exhausted": 0}
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]], max_attempts: int = None,
+                   on_retry: Callable[[int, str], None] = None) -> httpx.Response:
+        """Выполняет send() с повторами; возвращает последний ответ (статус проверяет вызывающий)"""
+        max_attempts = max(1, max_attempts or self.max_attempts)
+        self.counters["calls"] += 1
+        for attempt in range(max_attempts):
+            self.breaker.before_call()
+            response = None
+            try:
+                response = await send()
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                self.breaker.record(False)
+                reason = e.__class__.__name__
+                if not self._may_retry(attempt, max_attempts):
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUSES:
+                    self.breaker.record(True)
+                    return response
+                # 429 - это лимит частоты, а не отказ upstream: цепь из-за него не размыкаем
+                self.breaker.record(response.status_code == 429)
+                reason = f"HTTP {response.status_code}"
+                if not self._may_retry(attempt, max_attempts):
+                    return response
+                await response.aclose()
+
+            delay = self._backoff(attempt, response)
+            self.counters["retries"] += 1
+            print(f"🔁 {self.name}: {reason}, повтор {attempt + 2}/{max_attempts} через {delay:.1f} с")
+            if on_retry is not None:
+                on_retry(attempt + 1, reason)
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def _may_retry(self, attempt: int, max_attempts: int) -> bool:
+        if attempt >= max_attempts - 1:
+            return False
+        budget = _current_budget.get()
+        if budget is not None and not budget.try_spend():
+            self.counters["budget_exhausted"] += 1
+            print(f"⚠️ {self.name}: бюджет повторов запроса исчерпан")
+            return False
+        return True
+
+    def stats(self):
+        return {**self.counters, "circuit": self.breaker.stats()}
+
+
+def render_prometheus(policies: Dict[str, UpstreamPolicy]) -> str:
+    """Счетчики повторов и состояние circuit breaker'ов в текстовом формате Prometheus"""
+    lines = []
+    for name, kind, help_text, value in (
+        ("upstream_calls_total", "counter", "Вызовы upstream через политику повторов", lambda p: p.counters["calls"]),
+        ("upstream_retries_total", "counter", "Повторные попытки вызовов upstream", lambda p: p.counters["retries"]),
+        ("upstream_retry_budget_exhausted_total", "counter", "Повторы, не выполненные из-за исчерпанного бюджета запроса", lambda p: p.counters["budget_exhausted"]),
+        ("upstream_circuit_rejected_total", "counter", "Запросы, отклоненные разомкнутой цепью", lambda p: p.breaker.counters["rejected"]),
+        ("upstream_circuit_opened_total", "counter", "Сколько раз цепь размыкалась", lambda p: p.breaker.counters["opened"]),
+        ("upstream_circuit_open", "gauge", "1 - цепь разомкнута или в пробном режиме", lambda p: int(p.breaker.state != "closed")),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for upstream, policy in sorted(policies.items()):
+            lines.append(f'{name}{{upstream="{upstream}"}} {value(policy)}')
+    return "\n".join(lines) + "\n"
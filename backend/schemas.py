@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -61,16 +61,48 @@ class CompanySearchResult(BaseModel):
     description: Optional[str] = None
     equipment: Optional[str] = None
     preferred_language: Optional[str] = None
+    source: Optional[str] = None  # Откуда ответ поиска компании: database, database_stale или enrichment
 
 class EquipmentSearchResult(BaseModel):
     companies: List[CompanySearchResult]
     equipment_name: str
     total_found: int
 
+class CompanyInfoOutput(BaseModel):
+    """Ответ LLM о компании (structured output): те же поля, что у CompanySearchResult, без name.
+
+    Пустые и отсутствующие поля приходят как "", чтобы валидация данных
+    компании работала со строками.
+    """
+    website: str = ""
+    email: str = ""
+    address: str = ""
+    phone: str = ""
+    description: str = ""
+    equipment: str = ""
+    preferred_language: str = "ru"
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def _to_string(cls, value):
+        if value is None:
+            return ""
+        if isinstance(value, (list, tuple)):
+            return ", ".join(str(item) for item in value if item is not None)
+        return value if isinstance(value, str) else str(value)
+
+class EquipmentCompanyOutput(CompanyInfoOutput):
+    name: str = ""
+
+class EquipmentCompaniesOutput(BaseModel):
+    """Ответ LLM со списком компаний по оборудованию (structured output)"""
+    companies: List[EquipmentCompanyOutput] = []
+
 class FileUploadResponse(BaseModel):
     message: str
     companies_processed: int
     companies_found: int
+    job_id: Optional[int] = None
 
 class AssistantBase(BaseModel):
     name: str
@@ -135,6 +167,38 @@ class EmailVerification(BaseModel):
     class Config:
         from_attributes = True
 
+class EmailDelivery(BaseModel):
+    id: int
+    campaign_id: int
+    company_id: Optional[int] = None
+    email: str
+    status: str
+    attempts: int
+    error_message: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class DialogMessage(BaseModel):
+    id: Optional[int] = None
+    role: str
+    content: str
+    timestamp: datetime
+
+class Dialog(BaseModel):
+    id: int
+    title: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class DialogDetail(Dialog):
+    messages: List[DialogMessage] = []
+
 class AgentActionRequest(BaseModel):
     action: str  # search_company, save_company, navigate_to_page, etc.
     parameters: dict
@@ -143,3 +207,24 @@ class AgentActionResponse(BaseModel):
     success: bool
     message: str
     data: Optional[dict] = None
+
+class JobItemError(BaseModel):
+    position: int
+    payload: str
+    error: Optional[str] = None
+
+class JobStatus(BaseModel):
+    id: int
+    job_type: str
+    status: str
+    source_name: Optional[str] = None
+    total: int
+    processed: int
+    found: int
+    failed: int
+    eta_seconds: Optional[float] = None
+    error_message: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    errors: List[JobItemError] = []
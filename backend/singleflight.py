@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+import functools
+from typing import Any, Awaitable, Callable, Dict
+
+from chat_turn import SharedChatTurns, current_chat_turns, shared_chat_turns
+from llm_governor import SharedPriority, current_llm_priority, shared_llm_priority
+from llm_telemetry import current_llm_endpoint, llm_endpoint
+from resilience import retry_budget
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task, priority: SharedPriority, turns: SharedChatTurns):
+        self.task = task
+        self.priority = priority
+        self.turns = turns
+
+
+class SingleFlight:
+    """Объединение одновременных одинаковых вызовов в один.
+
+    Первый вызывающий по ключу запускает работу отдельной задачей, остальные
+    ждут ту же задачу. Отмена одного из ожидающих не прерывает работу для
+    остальных.
+
+    Общая задача выполняется в чистом контексте, а не в копии контекста
+    первого вызывающего: у нее свой бюджет повторов, а приоритет LLM - самый
+    высокий среди ожидающих (чат, присоединившийся к поиску из массового
+    обогащения, не ждет в очереди фоновых вызовов). Ходы чата всех ожидающих
+    присоединяются к работе: обращения к upstream учитываются в каждом из них.
+    Вызовы LLM в телеметрии относятся к эндпоинту, который начал работу, -
+    один раз, без повторного учета за присоединившихся.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._inflight: Dict[str, _Flight] = {}
+        self.counters = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def _forget(self, key: str, task: asyncio.Task):
+        flight = self._inflight.get(key)
+        if flight is not None and flight.task is task:
+            del self._inflight[key]
+
+    @staticmethod
+    def _consume_exception(task: asyncio.Task):
+        # Помечаем исключение как полученное, если все ожидающие уже ушли
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    async def _run_shared(fn: Callable[[], Awaitable[Any]], priority: SharedPriority,
+                          turns: SharedChatTurns, endpoint: str) -> Any:
+        with shared_llm_priority(priority), shared_chat_turns(turns), retry_budget(), llm_endpoint(endpoint):
+            return await fn()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.counters["calls"] += 1
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.counters["coalesced"] += 1
+            flight.priority.raise_to(current_llm_priority())
+        else:
+            self.counters["executions"] += 1
+            priority = SharedPriority(current_llm_priority())
+            turns = SharedChatTurns()
+            task = asyncio.get_running_loop().create_task(
+                self._run_shared(fn, priority, turns, current_llm_endpoint()), context=contextvars.Context()
+            )
+            flight = _Flight(task, priority, turns)
+            self._inflight[key] = flight
+            task.add_done_callback(functools.partial(self._forget, key))
+            task.add_done_callback(self._consume_exception)
+        for turn in current_chat_turns():
+            flight.turns.attach(turn)
+        return await asyncio.shield(flight.task)
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.counters["calls"]
+        return {
+            **self.counters,
+            "in_flight": len(self._inflight),
+            "coalesced_ratio": round(self.counters["coalesced"] / calls, 4) if calls else 0.0,
+        }
@@ -0,0 +1,156 @@
+import json
+from typing import Any, Dict, List, Tuple, Type, get_args
+
+from pydantic import BaseModel, ValidationError
+
+from schemas import CompanyInfoOutput, EquipmentCompaniesOutput
+
+
+def _strict_schema(node: Any) -> Any:
+    """JSON Schema модели в виде, который принимает strict structured output:
+    все поля обязательны, лишние запрещены, без title/default"""
+    if isinstance(node, list):
+        return [_strict_schema(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    result = {}
+    for key, value in node.items():
+        if key in ("title", "default") or (key == "description" and isinstance(value, str)):
+            continue
+        if key in ("properties", "$defs"):
+            result[key] = {name: _strict_schema(schema) for name, schema in value.items()}
+        else:
+            result[key] = _strict_schema(value)
+    if "properties" in result:
+        result["required"] = list(result["properties"])
+        result["additionalProperties"] = False
+    return result
+
+
+def response_format(model_cls: Type[BaseModel], name: str) -> Dict[str, Any]:
+    """Поле response_format запроса chat/completions: ответ строго по схеме Pydantic модели"""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": _strict_schema(model_cls.model_json_schema())},
+    }
+
+
+COMPANY_INFO_FORMAT = response_format(CompanyInfoOutput, "company_info")
+EQUIPMENT_COMPANIES_FORMAT = response_format(EquipmentCompaniesOutput, "equipment_companies")
+
+
+def tolerant_json(text: str) -> Any:
+    """Первый JSON объект или массив в тексте ответа, разобранный за один проход.
+
+    Исправляет типичные отклонения LLM без регулярных выражений: markdown и
+    текст вокруг JSON, одинарные кавычки, висячие запятые, переводы строк
+    внутри строк, комментарии // и обрезанный по max_tokens конец (незакрытые
+    строки и скобки). Бросает ValueError, если JSON не найден или не чинится.
+    """
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        raise ValueError("в ответе нет JSON")
+    out: List[str] = []
+    closers: List[str] = []
+    quote = None
+    i = min(starts)
+    length = len(text)
+    while i < length:
+        ch = text[i]
+        if quote is not None:
+            if ch == "\\" and i + 1 < length:
+                following = text[i + 1]
+                # \' допустимо в строке с одинарными кавычками, но не в JSON
+                out.append("'" if following == "'" else ch + following)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch != "\r":
+                out.append(ch)
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            out.append(closers.pop() if closers else ch)
+            if not closers:
+                break
+        elif ch == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = length if newline == -1 else newline
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if quote is not None:
+        out.append('"')
+    if closers:
+        _drop_trailing_comma(out)
+        if out and out[-1] == ":":
+            out.append('""')
+        out.extend(reversed(closers))
+    try:
+        return json.loads("".join(out))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON не удалось разобрать: {e}") from e
+
+
+def _drop_trailing_comma(out: List[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _has_schema_keys(data: Any, model_cls: Type[BaseModel]) -> bool:
+    """Объект содержит ровно поля модели (и вложенных моделей в списках), как ответ strict structured output"""
+    if not isinstance(data, dict) or set(data) != set(model_cls.model_fields):
+        return False
+    for name, field in model_cls.model_fields.items():
+        item_cls = next((arg for arg in get_args(field.annotation) if isinstance(arg, type) and issubclass(arg, BaseModel)), None)
+        if item_cls is not None and not (isinstance(data[name], list) and all(_has_schema_keys(item, item_cls) for item in data[name])):
+            return False
+    return True
+
+
+def _parse(content: str, model_cls: Type[BaseModel], wrap_list: str = None) -> Tuple[BaseModel, str]:
+    # Быстрый путь: ответ в режиме structured output - ровно JSON по схеме. У полей модели
+    # есть значения по умолчанию, поэтому сверяем ключи: {} или посторонний JSON не structured
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        data = None
+    if _has_schema_keys(data, model_cls):
+        try:
+            return model_cls.model_validate(data), "structured"
+        except ValidationError:
+            pass
+    data = tolerant_json(content)
+    if wrap_list and isinstance(data, list):
+        data = {wrap_list: data}
+    if not isinstance(data, dict) or not set(data) & set(model_cls.model_fields):
+        raise ValueError("JSON в ответе не похож на ответ по схеме")
+    # ValidationError - подкласс ValueError, вызывающий обрабатывает оба случая одинаково
+    return model_cls.model_validate(data), "repaired"
+
+
+def parse_company_info(content: str) -> Tuple[Dict[str, Any], str]:
+    """Данные компании из ответа LLM и способ разбора: structured или repaired"""
+    parsed, method = _parse(content, CompanyInfoOutput)
+    return parsed.model_dump(), method
+
+
+def parse_equipment_companies(content: str) -> Tuple[List[Dict[str, Any]], str]:
+    """Компании по оборудованию из ответа LLM; принимает и объект {"companies": [...]}, и голый массив"""
+    parsed, method = _parse(content, EquipmentCompaniesOutput, wrap_list="companies")
+    return [company.model_dump() for company in parsed.companies], method
@@ -0,0 +1,65 @@
+import asyncio
+
+from sqlalchemy import select
+
+import main
+from database import AsyncSessionLocal, JobItem, create_tables
+from enrichment import BulkEnricher
+from jobs import JobRunner
+from test_jobs import _create_job, _wait_finished
+
+
+class _StubClient:
+    def __init__(self):
+        self.searched = []
+
+    async def search_company_info(self, company_name, retry_count=2):
+        self.searched.append(company_name)
+        await asyncio.sleep(0)
+        return {}
+
+
+def test_stop_lets_in_flight_results_finish():
+    saved = []
+
+    async def scenario():
+        enricher = BulkEnricher(_StubClient(), concurrency=2)
+
+        async def on_result(result):
+            if result["name"] == "a":
+                enricher.stop()
+            else:
+                # Соседний воркер сохраняет результат, пока первый останавливает обработку
+                await asyncio.sleep(0.01)
+            saved.append(result["name"])
+
+        return await enricher.run(["a", "b", "c", "d"], on_result=on_result)
+
+    results = asyncio.run(scenario())
+    assert sorted(saved) == ["a", "b"]
+    assert len(results) == 2
+
+
+def test_duplicate_payloads_do_not_leave_items_pending(monkeypatch):
+    create_tables()
+    stub = _StubClient()
+    monkeypatch.setattr(main, "polza_client", stub)
+
+    async def scenario():
+        runner = JobRunner(poll_interval=0.05)
+        runner.register("bulk_search", main._run_bulk_search_job)
+        # Задача, созданная до очистки названий при загрузке: одинаковые строки в payload
+        job_id = _create_job(runner, "bulk_search", ["Квазарбур Тест", "Квазарбур Тест", "Эпсилонмаш Тест"])
+        runner.start()
+        try:
+            job = await _wait_finished(job_id)
+        finally:
+            await runner.stop()
+        async with AsyncSessionLocal() as db:
+            statuses = (await db.scalars(select(JobItem.status).where(JobItem.job_id == job_id).order_by(JobItem.position))).all()
+        return job, statuses
+
+    job, statuses = asyncio.run(scenario())
+    assert job.status == "completed"
+    assert statuses == ["done", "skipped", "done"]
+    assert sorted(stub.searched) == ["Квазарбур Тест", "Эпсилонмаш Тест"]
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from polza_client import PolzaAIClient
+
+DELAYS = {"Альфа": 0.03, "Бета": 0.01, "Гамма": 5}
+
+
+def _client(deadline: float) -> PolzaAIClient:
+    client = PolzaAIClient()
+    client.chat_context_deadline = deadline
+    client.state = {"active": 0, "peak": 0}
+
+    async def search_company_info(company_name, retry_count=3, force_refresh=False):
+        client.state["active"] += 1
+        client.state["peak"] = max(client.state["peak"], client.state["active"])
+        try:
+            await asyncio.sleep(DELAYS[company_name])
+            return {"website": f"https://{company_name}.ru", "description": company_name}
+        finally:
+            client.state["active"] -= 1
+
+    client.search_company_info = search_company_info
+    return client
+
+
+def test_companies_are_looked_up_concurrently_under_one_deadline():
+    client = _client(deadline=0.2)
+
+    async def scenario():
+        return [item async for item in client._iter_chat_context("расскажи", None, ["Альфа", "Бета", "Гамма"])]
+
+    started = time.monotonic()
+    items = asyncio.run(scenario())
+    elapsed = time.monotonic() - started
+
+    assert client.state["peak"] == 3
+    assert elapsed < 1
+    # Результаты отдаются по мере готовности, опоздавший поиск - сообщением о таймауте
+    assert [(position, name) for position, _, name, _ in items] == [(1, "Бета"), (0, "Альфа"), (2, "Гамма")]
+    assert "https://Альфа.ru" in items[1][3]
+    assert "слишком много времени" in items[2][3]
+    company_context, _ = client._join_chat_context({position: (kind, context) for position, kind, _, context in items})
+    assert company_context.index("Альфа") < company_context.index("Бета") < company_context.index("Гамма")
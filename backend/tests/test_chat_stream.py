@@ -0,0 +1,53 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+from database import create_tables
+
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_sends_events_in_order_and_stores_the_answer(monkeypatch):
+    create_tables()
+
+    async def fake_stream(message, conversation_history=None, custom_settings=None):
+        yield {"event": "start", "data": {"companies": [], "equipment": None}}
+        yield {"event": "token", "data": {"content": "Добрый "}}
+        yield {"event": "token", "data": {"content": "день"}}
+        yield {"event": "done", "data": {"message": "Добрый день"}}
+
+    monkeypatch.setattr(main.polza_client, "chat_with_llm_stream", fake_stream)
+    client = TestClient(main.app)
+
+    response = client.post("/chat/dialog", json={"message": "привет", "stream": True})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert [event for event, _ in events] == ["start", "token", "token", "done"]
+    done = events[-1][1]
+    assert done["message"] == "Добрый день"
+    assert [message["role"] for message in done["messages"]] == ["user", "assistant"]
+    history = client.get(f"/dialogs/{done['dialog_id']}").json()["messages"]
+    assert [message["content"] for message in history][-2:] == ["привет", "Добрый день"]
+
+
+def test_stream_reports_llm_failure_as_error_event(monkeypatch):
+    create_tables()
+
+    async def failing_stream(message, conversation_history=None, custom_settings=None):
+        yield {"event": "start", "data": {"companies": [], "equipment": None}}
+        raise RuntimeError("upstream оборвал поток")
+
+    monkeypatch.setattr(main.polza_client, "chat_with_llm_stream", failing_stream)
+    response = TestClient(main.app).post("/chat/dialog", json={"message": "привет", "stream": True})
+
+    events = _events(response.text)
+    assert [event for event, _ in events] == ["start", "error", "done"]
+    assert "upstream оборвал поток" in events[-1][1]["message"]
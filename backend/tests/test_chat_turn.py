@@ -0,0 +1,50 @@
+import asyncio
+
+from chat_turn import chat_turn
+from company_cache import CompanyInfoCache
+from polza_client import PolzaAIClient
+
+
+def _client() -> PolzaAIClient:
+    client = PolzaAIClient()
+    client.company_cache = CompanyInfoCache(ttl=0, persistent=False)
+    client.searches = []
+
+    async def uncached(company_name, retry_count=3):
+        client.searches.append(company_name)
+        await client._acquire_upstream("polza")
+        return {"website": "https://roga.ru"}
+
+    client._search_company_info_uncached = uncached
+    return client
+
+
+def test_company_found_by_endpoint_is_reused_by_llm_context_in_same_turn():
+    client = _client()
+
+    async def scenario():
+        with chat_turn() as turn:
+            saved = await client.search_company_info("ООО Рога и Копыта")
+            context = await client.search_company_info("Рога и Копыта")
+        with chat_turn() as next_turn:
+            await client.search_company_info("Рога и Копыта")
+        return turn, next_turn, saved, context
+
+    turn, next_turn, saved, context = asyncio.run(scenario())
+    assert len(client.searches) == 2
+    assert context == {"website": "https://roga.ru", "name": "Рога и Копыта"}
+    assert saved["name"] == "ООО Рога и Копыта"
+    assert turn.stats() == {"upstream_calls": {"polza": 1}, "company_lookups": {"requested": 2, "reused": 1}}
+    assert next_turn.stats()["company_lookups"] == {"requested": 1, "reused": 0}
+
+
+def test_force_refresh_bypasses_turn_memory():
+    client = _client()
+
+    async def scenario():
+        with chat_turn():
+            await client.search_company_info("Рога и Копыта")
+            await client.search_company_info("Рога и Копыта", force_refresh=True)
+
+    asyncio.run(scenario())
+    assert len(client.searches) == 2
@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import delete
+
+import company_cache
+from company_cache import CompanyInfoCache
+from database import CompanyInfoCacheEntry, SessionLocal, create_tables
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = _Clock()
+    # Подменяем часы только модулю: asyncio пользуется тем же time.monotonic
+    monkeypatch.setattr(company_cache, "time", SimpleNamespace(monotonic=clock.monotonic))
+
+    async def scenario():
+        cache = CompanyInfoCache(ttl=60, max_size=10, persistent=False)
+        await cache.set("roga", "Рога", {"website": "https://roga.ru"})
+        clock.now += 59
+        fresh = await cache.get("roga")
+        clock.now += 2
+        expired = await cache.get("roga")
+        return cache, fresh, expired
+
+    cache, fresh, expired = asyncio.run(scenario())
+    assert fresh == {"website": "https://roga.ru"}
+    assert expired is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def scenario():
+        cache = CompanyInfoCache(ttl=60, max_size=2, persistent=False)
+        await cache.set("a", "A", {"n": 1})
+        await cache.set("b", "B", {"n": 2})
+        await cache.get("a")
+        await cache.set("c", "C", {"n": 3})
+        return cache, [await cache.get(key) for key in ("a", "b", "c")]
+
+    cache, values = asyncio.run(scenario())
+    assert values == [{"n": 1}, None, {"n": 3}]
+    assert cache.counters["evictions"] == 1
+
+
+def test_cached_value_is_a_copy():
+    async def scenario():
+        cache = CompanyInfoCache(ttl=60, max_size=10, persistent=False)
+        await cache.set("roga", "Рога", {"email": ""})
+        (await cache.get("roga"))["email"] = "changed@roga.ru"
+        return await cache.get("roga")
+
+    assert asyncio.run(scenario()) == {"email": ""}
+
+
+def test_persistent_entry_survives_restart():
+    create_tables()
+    db = SessionLocal()
+    db.execute(delete(CompanyInfoCacheEntry).where(CompanyInfoCacheEntry.normalized_name == "тест кэша"))
+    db.commit()
+    db.close()
+
+    async def scenario():
+        await CompanyInfoCache(ttl=60, max_size=10, persistent=True).set("тест кэша", "Тест кэша", {"phone": "+7"})
+        restarted = CompanyInfoCache(ttl=60, max_size=10, persistent=True)
+        return restarted, await restarted.get("тест кэша"), await restarted.get("тест кэша")
+
+    restarted, from_db, from_memory = asyncio.run(scenario())
+    assert from_db == from_memory == {"phone": "+7"}
+    assert (restarted.counters["db_hits"], restarted.counters["hits"]) == (1, 1)
@@ -0,0 +1,48 @@
+import asyncio
+
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql
+
+from company_search import search_companies_query
+from database import AsyncSessionLocal, Company, create_tables
+
+
+def _names(query, **filters):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            return [company.name for company in await db.scalars(search_companies_query(query, "sqlite", **filters))]
+
+    return asyncio.run(scenario())
+
+
+def test_like_search_ranks_name_matches_first_and_applies_filters():
+    # В SQLite регистр не учитывается только для латиницы
+    create_tables()
+
+    async def setup():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Company).where(Company.name.like("Поисктест%")))
+            db.add_all([
+                Company(name="Поисктест Сервис", description="Ремонт установок xenonbur", email="", preferred_language="en"),
+                Company(name="Поисктест Xenonbur", email="info@xenon.ru", is_verified=True),
+                Company(name="Поисктест 100%", address="ул. XENONBUR, 5", email="a@b.ru", preferred_language=None),
+            ])
+            await db.commit()
+
+    asyncio.run(setup())
+
+    assert _names("XenonBur") == ["Поисктест Xenonbur", "Поисктест Сервис", "Поисктест 100%"]
+    assert _names("XenonBur", has_email=True) == ["Поисктест Xenonbur", "Поисктест 100%"]
+    assert _names("XenonBur", verified=False, language="ru") == ["Поисктест 100%"]
+    assert _names("XenonBur", language="en") == ["Поисктест Сервис"]
+    # % в строке поиска - символ, а не шаблон LIKE
+    assert _names("Поисктест 100%") == ["Поисктест 100%"]
+
+
+def test_postgres_query_uses_full_text_and_trigram_indexes():
+    statement = search_companies_query("буровые \"Atlas Copco\"", "postgresql", has_email=True)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    assert "companies.search_vector @@ websearch_to_tsquery" in sql
+    assert "ILIKE" in sql and "similarity(companies.name" in sql
+    assert "ts_rank_cd" in sql
@@ -0,0 +1,67 @@
+import asyncio
+
+from database import AsyncSessionLocal, create_tables
+from dialog_history import DialogHistoryWindow, add_dialog_message, get_or_create_dialog
+
+
+class _Summarizer:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    async def summarize_conversation(self, conversation_history, previous_summary=None):
+        self.calls.append(([message["content"] for message in conversation_history], previous_summary))
+        if self.fail:
+            return None
+        return f"{previous_summary or ''}+{len(conversation_history)}"
+
+
+def _history(summarizer, contents, token_budget=100, migrated=None):
+    async def scenario():
+        window = DialogHistoryWindow(summarizer, token_budget=token_budget, min_recent=2)
+        async with AsyncSessionLocal() as db:
+            dialog = await get_or_create_dialog(db, None, contents[0], conversation_history=migrated)
+            history = []
+            for index, content in enumerate(contents):
+                await add_dialog_message(db, dialog, "user" if index % 2 == 0 else "assistant", content)
+                history = await window.build(db, dialog)
+            return dialog, history
+
+    return asyncio.run(scenario())
+
+
+def test_short_dialog_is_sent_as_is():
+    create_tables()
+    summarizer = _Summarizer()
+    dialog, history = _history(summarizer, ["привет", "здравствуйте"], migrated=[{"role": "user", "content": "старое"}])
+
+    assert summarizer.calls == []
+    assert [message["content"] for message in history] == ["старое", "привет", "здравствуйте"]
+    assert dialog.title == "привет"
+
+
+def test_long_dialog_is_summarized_incrementally():
+    create_tables()
+    summarizer = _Summarizer()
+    # Каждое сообщение - 10 токенов: бюджет 100 переполняется на 11-м, окно ужимается до 50
+    contents = [f"сообщение {index:02d} xxxxx" for index in range(20)]
+    dialog, history = _history(summarizer, contents)
+
+    # Резюме пересчитывается раз в несколько сообщений и дополняет предыдущее
+    assert [(len(messages), previous) for messages, previous in summarizer.calls] == [(6, None), (6, "+6")]
+    assert dialog.summary == "+6+6"
+    assert history[0] == {"role": "system", "content": "Краткое резюме предыдущей части диалога:\n+6+6"}
+    assert [message["content"] for message in history[1:]] == contents[12:]
+
+
+def test_failed_summary_keeps_messages_for_next_attempt():
+    create_tables()
+    summarizer = _Summarizer(fail=True)
+    # Каждое сообщение ~34 токена: бюджет 100 вмещает два
+    contents = [f"сообщение {index} " + "x" * 80 for index in range(4)]
+    dialog, history = _history(summarizer, contents)
+
+    assert dialog.summary is None and not dialog.summarized_until
+    assert [message["content"] for message in history] == contents[-2:]
+    # Следующая попытка резюме снова получает все вытесненные сообщения
+    assert len(summarizer.calls[-1][0]) == 2
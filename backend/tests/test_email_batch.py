@@ -0,0 +1,53 @@
+import asyncio
+
+from sqlalchemy import delete, select
+
+from database import AsyncSessionLocal, EmailVerification, create_tables
+from email_verifier import MXResolver, verify_emails_batch
+
+
+class _DNS:
+    def __init__(self):
+        self.domains = []
+
+    async def resolve(self, domain, record_type):
+        self.domains.append(domain)
+
+        class Answer:
+            class rrset:
+                ttl = 300
+
+            def __len__(self):
+                return 1
+
+        return Answer()
+
+
+def test_batch_dedupes_addresses_and_writes_in_chunks():
+    create_tables()
+    dns_stub = _DNS()
+    resolver = MXResolver()
+    resolver._resolver = dns_stub
+    emails = [f"user{index}@batch-test.ru" for index in range(7)]
+    progress = []
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(EmailVerification).where(EmailVerification.email.like("%@batch-test.ru")))
+            # Адрес уже проверялся раньше - запись обновляется, а не дублируется
+            db.add(EmailVerification(email=emails[0], verification_status="pending"))
+            await db.commit()
+
+            rows = [(1, email) for email in emails] + [(2, " USER1@Batch-Test.ru "), (3, "not-an-email")]
+            results = await verify_emails_batch(db, rows, resolver, chunk_size=3,
+                                                on_progress=lambda done, total: progress.append((done, total)))
+            stored = (await db.scalars(select(EmailVerification).where(EmailVerification.email.like("%@batch-test.ru")))).all()
+            return results, stored
+
+    results, stored = asyncio.run(scenario())
+    assert len(results) == 8
+    assert {result["email"]: result["company_id"] for result in results}["user1@batch-test.ru"] == 1
+    assert dns_stub.domains == ["batch-test.ru"]
+    assert progress == [(3, 8), (6, 8), (8, 8)]
+    assert len(stored) == 7
+    assert {verification.verification_status for verification in stored} == {"verified"}
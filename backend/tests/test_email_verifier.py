@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+import dns.exception
+import dns.resolver
+from sqlalchemy import delete, select
+
+import email_verifier
+from database import AsyncSessionLocal, EmailVerification, create_tables
+from email_verifier import MXResolver, VerificationFreshnessPolicy, check_emails, deliverable_emails
+
+
+class _Answer:
+    class rrset:
+        ttl = 300
+
+    def __len__(self):
+        return 1
+
+
+class _StubDNS:
+    def __init__(self):
+        self.timeout = True
+        self.calls = 0
+
+    async def resolve(self, domain, record_type):
+        self.calls += 1
+        if self.timeout:
+            raise dns.exception.Timeout()
+        return _Answer()
+
+
+def _resolver(dns_stub: _StubDNS) -> MXResolver:
+    resolver = MXResolver()
+    resolver._resolver = dns_stub
+    return resolver
+
+
+def test_dns_timeout_is_failed_not_invalid():
+    dns_stub = _StubDNS()
+    results = asyncio.run(check_emails([(None, "info@roga.ru")], _resolver(dns_stub)))
+
+    assert results[0]["verification_status"] == "failed"
+    assert results[0]["is_valid"] is True
+    assert results[0]["is_deliverable"] is False
+
+
+def test_dns_timeout_is_rechecked_after_failed_ttl():
+    create_tables()
+    policy = VerificationFreshnessPolicy({"verified": 604800, "invalid": 86400, "failed": 3600})
+    dns_stub = _StubDNS()
+    resolver = _resolver(dns_stub)
+
+    async def latest(db):
+        return await db.scalar(select(EmailVerification).where(EmailVerification.email == "info@roga.ru"))
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(EmailVerification).where(EmailVerification.email == "info@roga.ru"))
+            await db.commit()
+
+            # Кампания во время сбоя DNS: адрес пропускается, но не помечается недоставляемым
+            deliverable, counts = await deliverable_emails(db, [(None, "info@roga.ru", None)], resolver, policy)
+            assert deliverable == {"info@roga.ru": False} and counts["rechecked"] == 1
+            verification = await latest(db)
+            assert verification.verification_status == "failed"
+
+            # В пределах срока failed результат переиспользуется
+            dns_stub.timeout = False
+            deliverable, counts = await deliverable_emails(db, [(None, "info@roga.ru", verification)], resolver, policy)
+            assert counts == {"reused": 1, "rechecked": 0}
+
+            # Через час (а не через сутки, как invalid) адрес перепроверяется и становится доставляемым
+            verification.last_checked = datetime.utcnow() - timedelta(seconds=3601)
+            await db.commit()
+            deliverable, counts = await deliverable_emails(db, [(None, "info@roga.ru", verification)], resolver, policy)
+            assert deliverable == {"info@roga.ru": True} and counts["rechecked"] == 1
+            db.expire_all()
+            assert (await latest(db)).verification_status == "verified"
+
+    asyncio.run(scenario())
+    assert dns_stub.calls == 2
+
+
+class _NoMX:
+    def __init__(self):
+        self.calls = 0
+
+    async def resolve(self, domain, record_type):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if domain == "nx.example":
+            raise dns.resolver.NXDOMAIN()
+        return _Answer()
+
+
+def test_mx_results_are_cached_and_concurrent_lookups_coalesced():
+    dns_stub = _NoMX()
+    resolver = _resolver(dns_stub)
+
+    async def scenario():
+        prefetched = await resolver.prefetch(["roga.ru", "ROGA.RU.", "nx.example", "roga.ru"])
+        again = [await resolver.check("roga.ru"), await resolver.check("nx.example")]
+        return prefetched, again
+
+    prefetched, again = asyncio.run(scenario())
+    assert prefetched == {"roga.ru": (True, None), "nx.example": (False, "Домен не найден или не имеет MX записей")}
+    assert again == [(True, None), (False, "Домен не найден или не имеет MX записей")]
+    assert dns_stub.calls == 2
+    assert (resolver.counters["hits"], resolver.counters["negative_hits"]) == (1, 1)
+
+
+def test_positive_answer_expires_after_dns_ttl(monkeypatch):
+    dns_stub = _NoMX()
+    resolver = MXResolver(min_ttl=60, max_ttl=120)
+    resolver._resolver = dns_stub
+    now = [1000.0]
+    # Подменяем часы только модулю: asyncio пользуется тем же time.monotonic
+    monkeypatch.setattr(email_verifier, "time", SimpleNamespace(monotonic=lambda: now[0]))
+
+    async def scenario():
+        await resolver.check("roga.ru")
+        now[0] += 299  # TTL ответа 300 с ограничен max_ttl=120
+        await resolver.check("roga.ru")
+
+    asyncio.run(scenario())
+    assert dns_stub.calls == 2
@@ -0,0 +1,61 @@
+import asyncio
+
+from enrichment import BulkEnricher
+from llm_governor import BULK, current_llm_priority
+
+
+class _SlowClient:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.active = 0
+        self.peak = 0
+        self.priorities = set()
+
+    async def search_company_info(self, company_name, retry_count=2):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.priorities.add(current_llm_priority())
+        try:
+            await asyncio.sleep(0.01)
+            if company_name in self.fail:
+                raise RuntimeError("upstream недоступен")
+            return {"website": f"https://{company_name}.ru"}
+        finally:
+            self.active -= 1
+
+
+def test_concurrency_is_bounded_and_errors_are_isolated():
+    client = _SlowClient(fail={"c3"})
+    saved = []
+
+    async def on_result(result):
+        saved.append(result["name"])
+
+    names = [f"c{index}" for index in range(10)]
+    results = asyncio.run(BulkEnricher(client, concurrency=3).run(names, on_result=on_result))
+
+    assert client.peak == 3
+    assert client.priorities == {BULK}
+    assert sorted(saved) == sorted(names)
+    errors = {result["name"]: result["error"] for result in results if result["error"]}
+    assert errors == {"c3": "upstream недоступен"}
+
+
+def test_outside_cancellation_stops_workers():
+    client = _SlowClient()
+
+    async def scenario():
+        enricher = BulkEnricher(client, concurrency=2)
+        task = asyncio.create_task(enricher.run([f"c{index}" for index in range(10)]))
+        await asyncio.sleep(0.005)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0.02)
+        return enricher
+
+    enricher = asyncio.run(scenario())
+    assert enricher.cancelled
+    assert client.active == 0
@@ -0,0 +1,55 @@
+import asyncio
+
+from sqlalchemy import delete
+
+from database import AsyncSessionLocal, Company, create_tables
+from entity_resolution import EntityResolver
+
+
+def test_find_duplicate_by_shared_free_mail_address():
+    create_tables()
+
+    async def scenario():
+        resolver = EntityResolver()
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Company).where(Company.email.in_(["Ivanov.Master@mail.ru", "petrov@mail.ru"])))
+            existing = Company(name="ИП Иванов", email="Ivanov.Master@mail.ru")
+            db.add(existing)
+            await db.commit()
+
+            # Название другое, домен бесплатной почты не ключ - кандидат находится только по адресу
+            match = await resolver.find_duplicate(db, "Мастер Ремонт", email="ivanov.master@mail.ru")
+            other = await resolver.find_duplicate(db, "Мастер Ремонт", email="petrov@mail.ru")
+            return existing.id, match, other
+
+    existing_id, match, other = asyncio.run(scenario())
+    company, score, reasons = match
+    assert company.id == existing_id
+    assert (score, reasons) == (1.0, ["email"])
+    assert other is None
+
+
+def test_bulk_names_are_matched_fuzzily_against_database_and_file():
+    create_tables()
+    resolver = EntityResolver()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Company).where(Company.name.like("%Гиперборей%") | Company.name.like("Квазартехник%")))
+            db.add(Company(name="ООО Гиперборей Бурение"))
+            await db.commit()
+            return await db.run_sync(resolver.filter_new_names, [
+                "Гиперборей Буренье",  # ключ отличается от ключа в БД - только нечеткое совпадение
+                "Квазартехника",
+                "KVAZARTEHNIKA",
+                "Квазартехнико",
+                "Ультрамаш Сервиз",
+            ])
+
+    new_names, skipped = asyncio.run(scenario())
+    assert new_names == ["Квазартехника", "Ультрамаш Сервиз"]
+    assert skipped == {
+        "Гиперборей Буренье": "Компания уже есть в базе данных: ООО Гиперборей Бурение",
+        "KVAZARTEHNIKA": "Повторяет строку файла: Квазартехника",
+        "Квазартехнико": "Повторяет строку файла: Квазартехника",
+    }
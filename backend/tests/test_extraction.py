@@ -0,0 +1,41 @@
+from extraction import (ADDRESS_PLACEHOLDERS, REFUSAL_PHRASES, clean_phone, extract_company_names,
+                        extract_equipment_name, extract_text_info, is_example_phone, scan_search_page)
+
+
+def test_search_page_prefers_company_domain_over_directories():
+    page = ('<a href="https://yandex.ru/maps">Карта</a> <a href="https://catalog.ru/firms">x</a> '
+            '<a href="https://www.almazgeobur.ru/contacts">Алмазгеобур</a> '
+            'test@example.com info@almazgeobur.ru +7 (495) 765-43-21')
+
+    assert scan_search_page(page, ["almazgeobur"]) == {
+        "website": "https://almazgeobur.ru",
+        "email": "info@almazgeobur.ru",
+        "phone": "+7 (495) 765-43-21",
+    }
+    assert scan_search_page("<html>ничего</html>", ["almazgeobur"]) == {}
+
+
+def test_contacts_are_extracted_from_plain_text_answer():
+    text = ("Website: https://roga.ru\nEmail: sales@roga.ru\nТелефон: +7 (812) 333-22-11\n"
+            "Адрес: 190000, Санкт-Петербург, Садовая улица, 5\nДелает копыта.")
+
+    info = extract_text_info(text, "Рога")
+
+    assert (info["website"], info["email"], info["phone"]) == ("https://roga.ru", "sales@roga.ru", "+7 (812) 333-22-11")
+    assert info["address"] == "190000, Санкт-Петербург, Садовая улица, 5"
+    assert info["preferred_language"] == "ru"
+
+
+def test_company_and_equipment_mentions_in_chat_message():
+    assert extract_company_names('найди компанию "Алмазгеобур"') == ["Алмазгеобур"]
+    assert extract_company_names("привет, как дела?") == []
+    assert extract_equipment_name("какие компании используют буровые установки Atlas Copco") == "буровые установки Atlas Copco"
+    assert extract_equipment_name("привет") is None
+
+
+def test_placeholder_keyword_sets():
+    assert is_example_phone("+7 (495) 123-45-67", clean_phone("+7 (495) 123-45-67"))
+    assert not is_example_phone("+7 (495) 765-43-21", clean_phone("+7 (495) 765-43-21"))
+    assert REFUSAL_PHRASES.found_in("i'm sorry, i can't help")
+    assert ADDRESS_PLACEHOLDERS.found_in("г. москва, ул. примерная, д. 1")
+    assert not ADDRESS_PLACEHOLDERS.found_in("г. москва, ул. тверская, д. 1")
@@ -0,0 +1,41 @@
+import asyncio
+
+from http_pool import HTTPClientPool
+
+
+def test_one_client_per_origin_reused_until_closed():
+    async def scenario():
+        pool = HTTPClientPool(http2=False)
+        first = pool.get_client("https://api.polza.ai/v1/chat/completions")
+        same = pool.get_client("HTTPS://API.POLZA.AI/v1/models")
+        other = pool.get_client("https://html.duckduckgo.com/html/")
+        await pool.aclose()
+        reopened = pool.get_client("https://api.polza.ai/v1")
+        await pool.aclose()
+        return first, same, other, reopened
+
+    first, same, other, reopened = asyncio.run(scenario())
+    assert first is same
+    assert other is not first
+    assert first.is_closed and other.is_closed
+    assert reopened is not first
+
+
+def test_closed_client_is_recreated():
+    async def scenario():
+        pool = HTTPClientPool(http2=False)
+        client = pool.get_client("https://api.polza.ai")
+        await client.aclose()
+        recreated = pool.get_client("https://api.polza.ai")
+        await pool.aclose()
+        return client, recreated
+
+    client, recreated = asyncio.run(scenario())
+    assert recreated is not client
+
+
+def test_pool_limits_come_from_environment(monkeypatch):
+    monkeypatch.setenv("HTTP_POOL_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("HTTP_POOL_KEEPALIVE_EXPIRY", "not-a-number")
+    pool = HTTPClientPool(http2=False, max_keepalive_connections=3)
+    assert (pool.max_connections, pool.max_keepalive_connections, pool.keepalive_expiry) == (7, 3, 30.0)
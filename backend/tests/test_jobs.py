@@ -0,0 +1,131 @@
+import asyncio
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal, Company, Job, JobItem, SessionLocal, create_tables
+from jobs import JobContext, JobRunner, describe_job
+
+
+def _create_job(runner: JobRunner, job_type: str, payloads):
+    db = SessionLocal()
+    try:
+        return runner.create_job(db, job_type, payloads).id
+    finally:
+        db.close()
+
+
+async def _wait_finished(job_id: int) -> Job:
+    for _ in range(200):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(Job, job_id)
+            if job.status in ("completed", "failed", "cancelled") and job.finished_at:
+                return job
+        await asyncio.sleep(0.02)
+    raise AssertionError("задача не завершилась")
+
+
+def test_parallel_workers_complete_items_through_one_async_session():
+    create_tables()
+
+    async def handler(ctx: JobContext):
+        items = await ctx.pending_items()
+
+        async def worker(item):
+            await asyncio.sleep(0)
+            await ctx.complete_item(item, result={"name": item.payload}, found=True,
+                                    records=[Company(name=f"Тест задач {item.payload}")])
+
+        await asyncio.gather(*(worker(item) for item in items))
+
+    async def scenario():
+        runner = JobRunner(poll_interval=0.05)
+        runner.register("test_parallel", handler)
+        job_id = _create_job(runner, "test_parallel", [str(index) for index in range(20)])
+        runner.start()
+        try:
+            job = await _wait_finished(job_id)
+        finally:
+            await runner.stop()
+        async with AsyncSessionLocal() as db:
+            statuses = (await db.scalars(select(JobItem.status).where(JobItem.job_id == job_id))).all()
+            companies = (await db.scalars(select(Company.name).where(Company.name.like("Тест задач %")))).all()
+        return job, statuses, companies
+
+    job, statuses, companies = asyncio.run(scenario())
+    assert (job.status, job.processed, job.found) == ("completed", 20, 20)
+    assert set(statuses) == {"done"}
+    assert len(companies) == 20
+
+
+def test_cancel_from_api_session_is_seen_by_running_job():
+    create_tables()
+    handled = []
+
+    async def handler(ctx: JobContext):
+        for item in await ctx.pending_items():
+            if ctx.cancelled:
+                break
+            if item.position == 2:
+                # Отмена приходит из другой сессии, как POST /jobs/{job_id}/cancel
+                async with AsyncSessionLocal() as api_db:
+                    job = await api_db.get(Job, ctx.job.id)
+                    job.status = "cancelled"
+                    await api_db.commit()
+            await ctx.complete_item(item)
+            handled.append(item.position)
+
+    async def scenario():
+        runner = JobRunner(poll_interval=0.05)
+        runner.register("test_cancel", handler)
+        job_id = _create_job(runner, "test_cancel", [str(index) for index in range(10)])
+        runner.start()
+        try:
+            return await _wait_finished(job_id)
+        finally:
+            await runner.stop()
+
+    job = asyncio.run(scenario())
+    assert job.status == "cancelled"
+    assert handled == [0, 1, 2]
+    assert job.processed == 3
+
+
+def test_interrupted_job_resumes_pending_items_and_reports_errors():
+    create_tables()
+    handled = []
+
+    async def handler(ctx: JobContext):
+        for item in await ctx.pending_items():
+            handled.append(item.payload)
+            if item.payload == "3":
+                await ctx.fail_item(item, "нет ответа")
+            else:
+                await ctx.complete_item(item)
+
+    async def scenario():
+        runner = JobRunner(poll_interval=0.05)
+        runner.register("test_resume", handler)
+        job_id = _create_job(runner, "test_resume", [str(index) for index in range(5)])
+        # Приложение остановилось посреди задачи: две строки уже обработаны
+        async with AsyncSessionLocal() as db:
+            job = await db.get(Job, job_id)
+            job.status = "running"
+            job.processed = 2
+            for item in (await db.scalars(select(JobItem).where(JobItem.job_id == job_id, JobItem.position < 2))).all():
+                item.status = "done"
+            await db.commit()
+        runner.start()
+        try:
+            await _wait_finished(job_id)
+        finally:
+            await runner.stop()
+        db = SessionLocal()
+        try:
+            return describe_job(db, db.get(Job, job_id))
+        finally:
+            db.close()
+
+    described = asyncio.run(scenario())
+    assert handled == ["2", "3", "4"]
+    assert (described["status"], described["processed"], described["failed"]) == ("completed", 5, 1)
+    assert described["errors"] == [{"position": 3, "payload": "3", "error": "нет ответа"}]
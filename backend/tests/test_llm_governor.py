@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from llm_governor import BULK, LLMGovernor, _parse_model_limits, llm_priority
+
+
+def test_interactive_calls_overtake_queued_bulk_calls():
+    async def scenario():
+        governor = LLMGovernor(model_limits={"m": (0, 0, 1)})
+        admitted = []
+
+        async def call(name, priority):
+            with llm_priority(priority):
+                async with governor.reserve("m", 10):
+                    admitted.append(name)
+
+        async with governor.reserve("m", 10):
+            tasks = [asyncio.create_task(call("bulk-1", BULK)), asyncio.create_task(call("bulk-2", BULK))]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(call("chat", 0)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return admitted
+
+    assert asyncio.run(scenario()) == ["chat", "bulk-1", "bulk-2"]
+
+
+def test_concurrency_limit_holds_when_a_running_call_is_cancelled():
+    async def scenario():
+        governor = LLMGovernor(model_limits={"m": (0, 0, 2)})
+        state = {"active": 0, "peak": 0}
+
+        async def call():
+            async with governor.reserve("m", 10):
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+                try:
+                    await asyncio.sleep(0.01)
+                finally:
+                    state["active"] -= 1
+
+        cancelled = asyncio.create_task(call())
+        tasks = [asyncio.create_task(call()) for _ in range(5)]
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(*tasks)
+        return state, governor.stats()["m"]
+
+    state, stats = asyncio.run(scenario())
+    assert state["peak"] == 2
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == {"retry": 0, "interactive": 0, "bulk": 0}
+
+
+def test_token_budget_delays_call_until_refilled():
+    async def scenario():
+        # 6000 токенов в минуту - 100 в секунду
+        governor = LLMGovernor(model_limits={"m": (0, 6000, 0)})
+        async with governor.reserve("m", 6000):
+            pass
+        started = time.monotonic()
+        async with governor.reserve("m", 20):
+            pass
+        return time.monotonic() - started, governor.stats()["m"]
+
+    waited, stats = asyncio.run(scenario())
+    assert 0.15 <= waited < 1
+    assert stats["waited"] == 1
+
+
+def test_upstream_429_pauses_the_model_queue():
+    async def scenario():
+        governor = LLMGovernor(model_limits={"m": (0, 0, 0)})
+        async with governor.reserve("m", 10) as slot:
+            slot.throttle(0.2)
+        started = time.monotonic()
+        async with governor.reserve("m", 10):
+            pass
+        return time.monotonic() - started, governor.stats()["m"]["throttled"]
+
+    waited, throttled = asyncio.run(scenario())
+    assert waited >= 0.15 and throttled == 1
+
+
+def test_model_limits_are_parsed_from_environment_format():
+    assert _parse_model_limits("gpt-4o:500:30000:8, broken, gpt-4o-mini:1000:0:x") == {"gpt-4o": (500.0, 30000.0, 8)}
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import httpx
+
+from llm_telemetry import LLMTelemetry, llm_endpoint
+from polza_client import PolzaAIClient
+
+
+def test_retries_of_several_policy_calls_are_summed():
+    async def scenario():
+        telemetry = LLMTelemetry(prices={"gpt-4o": (1.0, 2.0)})
+        with llm_endpoint("chat"):
+            async with telemetry.track("completion", "gpt-4o") as call:
+                # Две попытки в первом call() и одна во втором: номер попытки не затирает сумму
+                call.count_retry(1, "HTTP 429")
+                call.count_retry(2, "HTTP 429")
+                call.count_retry(1, "timeout")
+                call.add_usage({"prompt_tokens": 1000, "completion_tokens": 500})
+        return telemetry.summary()
+
+    summary = asyncio.run(scenario())
+    assert summary["by_endpoint"]["chat"]["retries"] == 3
+    assert summary["totals"]["cost"] == 2.0
+
+
+def test_streamed_chat_requests_and_records_usage():
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payloads.append(json.loads(request.content))
+        chunks = [
+            {"choices": [{"delta": {"content": "Здрав"}}]},
+            {"choices": [{"delta": {"content": "ствуйте"}}]},
+            {"choices": [], "usage": {"prompt_tokens": 120, "completion_tokens": 7}},
+        ]
+        body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    async def scenario():
+        client = PolzaAIClient()
+        transport_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client.http_pool.get_client = lambda url: transport_client
+        with llm_endpoint("chat_stream"):
+            events = [event async for event in client.chat_with_llm_stream("привет")]
+        return client, events
+
+    client, events = asyncio.run(scenario())
+    assert events[-1] == {"event": "done", "data": {"message": "Здравствуйте"}}
+    assert payloads[0]["stream_options"] == {"include_usage": True}
+    tokens = client.telemetry.summary()["by_endpoint"]["chat_stream"]
+    assert (tokens["prompt_tokens"], tokens["completion_tokens"]) == (120, 7)
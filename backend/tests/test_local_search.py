@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+import main
+from database import AsyncSessionLocal, Company, create_tables
+from local_search import LocalCompanyResolver
+
+COMPLETE = dict(website="https://tundrabur.ru", email="info@tundrabur.ru", description="Бурение скважин")
+
+
+def _store(*companies):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(Company).where(Company.name.like("%Тундрабур%") | Company.name.like("%TUNDRABUR%")))
+            db.add_all(companies)
+            await db.commit()
+
+    create_tables()
+    asyncio.run(scenario())
+
+
+def _resolve(resolver, name):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            company, status = await resolver.resolve(db, name)
+            return (company.name if company else None), status
+
+    return asyncio.run(scenario())
+
+
+def test_resolver_statuses():
+    old = datetime.utcnow() - timedelta(days=40)
+    _store(
+        Company(name="ООО Тундрабур", **COMPLETE),
+        Company(name="Тундрабур Север", description="Бурение"),
+        Company(name="Тундрабур Старый", updated_at=old, created_at=old, **COMPLETE),
+    )
+    resolver = LocalCompanyResolver(max_age=30 * 86400, min_score=0.8)
+
+    # Другой алфавит и без организационной формы - та же строка
+    assert _resolve(resolver, "TUNDRABUR") == ("ООО Тундрабур", "fresh")
+    assert _resolve(resolver, "Тундрабур Север") == ("Тундрабур Север", "incomplete")
+    assert _resolve(resolver, "Тундрабур Старый") == ("Тундрабур Старый", "stale")
+    assert _resolve(resolver, "Тундрабур Юг") == (None, "missing")
+    assert resolver.counters == {"hits": 1, "stale": 1, "incomplete": 1, "misses": 1}
+
+
+def test_search_endpoint_answers_from_database_before_llm(monkeypatch):
+    _store(Company(name="ООО Тундрабур", **COMPLETE), Company(name="Тундрабур Север", description="Бурение"))
+    searched = []
+
+    async def search_company_info(company_name, retry_count=3, force_refresh=False):
+        searched.append(company_name)
+        return {}
+
+    monkeypatch.setattr(main.polza_client, "search_company_info", search_company_info)
+    client = TestClient(main.app)
+
+    fresh = client.post("/companies/search", json={"query": "Тундрабур"}).json()
+    assert (fresh["source"], fresh["website"], searched) == ("database", "https://tundrabur.ru", [])
+
+    # Неполная строка обогащается заново, а при неудаче отдается как есть
+    fallback = client.post("/companies/search", json={"query": "Тундрабур Север"}).json()
+    assert (fallback["source"], fallback["description"], searched) == ("database_stale", "Бурение", ["Тундрабур Север"])
@@ -0,0 +1,90 @@
+import asyncio
+import smtplib
+
+from mailer import SMTPSender, _parse_rate_limits
+
+
+class _FakeSMTP:
+    def __init__(self, server):
+        self.server = server
+
+    def send_message(self, mime):
+        to = mime["To"]
+        self.server.attempts.append(to)
+        script = self.server.script.get(to)
+        if script:
+            error = script.pop(0)
+            if error is not None:
+                raise error
+        self.server.delivered.append(to)
+
+    def quit(self):
+        self.server.quits += 1
+
+
+class _FakeServer:
+    def __init__(self, script=None):
+        self.script = script or {}
+        self.connects = 0
+        self.quits = 0
+        self.attempts = []
+        self.delivered = []
+
+    def connect(self):
+        self.connects += 1
+        return _FakeSMTP(self)
+
+
+def _sender(server: _FakeServer, **kwargs) -> SMTPSender:
+    options = dict(host="smtp.test", from_address="sales@agb.ru", workers=1, batch_size=100, max_retries=3,
+                   retry_base_delay=0, default_rate=0, provider_rates={})
+    options.update(kwargs)
+    sender = SMTPSender(**options)
+    sender._connect = server.connect
+    return sender
+
+
+def _messages(*addresses):
+    return [{"to": address, "subject": "Предложение", "body": "Здравствуйте"} for address in addresses]
+
+
+def test_connection_is_reused_up_to_batch_size():
+    server = _FakeServer()
+    counts = asyncio.run(_sender(server, batch_size=2).send_all(_messages(*[f"u{i}@roga.ru" for i in range(5)])))
+
+    assert counts == {"sent": 5, "failed": 0}
+    assert server.connects == 3
+    assert server.quits == 3
+
+
+def test_transient_errors_are_retried_and_permanent_are_not():
+    server = _FakeServer({
+        "busy@roga.ru": [smtplib.SMTPResponseException(421, b"try later"), None],
+        "gone@roga.ru": [smtplib.SMTPResponseException(550, b"no such user")],
+        "refused@roga.ru": [smtplib.SMTPRecipientsRefused({"refused@roga.ru": (550, b"refused")})],
+        "down@roga.ru": [ConnectionResetError("reset")] * 3,
+    })
+    results = {}
+
+    def on_result(message, result):
+        results[message["to"]] = (result["status"], result["attempts"])
+
+    counts = asyncio.run(_sender(server).send_all(
+        _messages("busy@roga.ru", "gone@roga.ru", "refused@roga.ru", "down@roga.ru"), on_result=on_result))
+
+    assert counts == {"sent": 1, "failed": 3}
+    assert results == {
+        "busy@roga.ru": ("sent", 2),
+        "gone@roga.ru": ("failed", 1),
+        "refused@roga.ru": ("failed", 1),
+        "down@roga.ru": ("failed", 3),
+    }
+
+
+def test_rate_limit_is_per_recipient_provider():
+    sender = _sender(_FakeServer(), default_rate=5, provider_rates=_parse_rate_limits("gmail.com:1, mail.ru:2.5, bad"))
+
+    assert sender._limiter_for("a@gmail.com") is sender._limiter_for("b@GMAIL.com")
+    assert sender._limiter_for("a@gmail.com").rate == 1
+    assert sender._limiter_for("a@mail.ru").rate == 2.5
+    assert sender._limiter_for("a@roga.ru").rate == 5
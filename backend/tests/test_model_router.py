@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from model_router import ModelRouter
+from polza_client import PolzaAIClient
+
+
+def test_low_score_escalates_and_best_result_wins():
+    router = ModelRouter(tiers=["fast", "strong"], min_score=0.7)
+    scores = {"fast": 0.5, "strong": 0.3}
+
+    async def attempt(model):
+        return model, scores[model]
+
+    assert asyncio.run(router.route("company_info", attempt)) == "fast"
+    stats = router.stats()["tasks"]["company_info"]
+    assert stats["fast"]["escalated"] == 1 and stats["strong"]["accepted"] == 1
+
+
+def test_unparsable_answers_escalate_and_last_error_is_raised():
+    router = ModelRouter(tiers=["fast", "strong"], min_score=0.7)
+
+    async def attempt(model):
+        raise ValueError(f"{model}: пустой ответ")
+
+    with pytest.raises(ValueError, match="strong"):
+        asyncio.run(router.route("company_info", attempt))
+
+
+def test_summary_uses_first_tier_or_configured_model(monkeypatch):
+    models = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        models.append(json.loads(request.content)["model"])
+        return httpx.Response(200, json={"choices": [{"message": {"content": "резюме"}}]})
+
+    async def summarize(client: PolzaAIClient):
+        transport_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client.http_pool.get_client = lambda url: transport_client
+        return await client.summarize_conversation([{"role": "user", "content": "привет"}])
+
+    monkeypatch.setenv("POLZA_MODEL_TIERS", "fast-model,strong-model")
+    monkeypatch.delenv("POLZA_SUMMARY_MODEL", raising=False)
+    assert asyncio.run(summarize(PolzaAIClient())) == "резюме"
+    monkeypatch.setenv("POLZA_SUMMARY_MODEL", "summary-model")
+    asyncio.run(summarize(PolzaAIClient()))
+    assert models == ["fast-model", "summary-model"]
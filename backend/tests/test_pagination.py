@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+
+import main
+from database import AsyncSessionLocal, SearchLog, create_tables
+from pagination import decode_cursor, encode_cursor, paginate
+
+MOMENT = datetime(2030, 1, 1, 12, 0, 0)
+
+
+def _pages(statement, limit, keys=None, descending=False):
+    async def scenario():
+        pages, cursor = [], None
+        async with AsyncSessionLocal() as db:
+            while True:
+                rows, cursor = await paginate(db, statement, limit, keys=keys, cursor=cursor, descending=descending)
+                pages.append([row.query for row in rows])
+                if cursor is None:
+                    return pages
+
+    return asyncio.run(scenario())
+
+
+def _setup_logs(count):
+    create_tables()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(SearchLog).where(SearchLog.search_type == "pagination_test"))
+            # Одинаковое время у всех строк: порядок и курсор держатся на id
+            db.add_all(SearchLog(search_type="pagination_test", query=f"q{index}", created_at=MOMENT) for index in range(count))
+            await db.commit()
+
+    asyncio.run(scenario())
+
+
+def test_keyset_pages_cover_all_rows_once_with_ties_in_first_key():
+    _setup_logs(7)
+    statement = select(SearchLog).where(SearchLog.search_type == "pagination_test")
+
+    pages = _pages(statement, 3, keys=(SearchLog.created_at, SearchLog.id), descending=True)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == [f"q{index}" for index in reversed(range(7))]
+
+
+def test_offset_cursor_for_ranked_statements():
+    _setup_logs(5)
+    statement = select(SearchLog).where(SearchLog.search_type == "pagination_test").order_by(SearchLog.id)
+
+    assert _pages(statement, 2) == [["q0", "q1"], ["q2", "q3"], ["q4"]]
+
+
+def test_malformed_or_foreign_cursors_are_rejected():
+    assert decode_cursor(encode_cursor({"after": ["2030-01-01T12:00:00", 5]})) == {"after": ["2030-01-01T12:00:00", 5]}
+    with pytest.raises(ValueError):
+        decode_cursor("не курсор")
+
+    async def scenario(cursor):
+        async with AsyncSessionLocal() as db:
+            await paginate(db, select(SearchLog), 10, keys=(SearchLog.created_at, SearchLog.id), cursor=cursor)
+
+    create_tables()
+    for cursor in (encode_cursor({"after": [1]}), encode_cursor({"after": ["вчера", 1]})):
+        with pytest.raises(ValueError):
+            asyncio.run(scenario(cursor))
+
+
+def test_list_endpoint_returns_next_cursor_header_and_400_for_bad_cursor():
+    _setup_logs(3)
+    client = TestClient(main.app)
+
+    first = client.get("/search-logs", params={"limit": 1})
+    assert first.status_code == 200 and len(first.json()) == 1
+    second = client.get("/search-logs", params={"limit": 1, "cursor": first.headers["X-Next-Cursor"]})
+    assert second.json()[0]["id"] < first.json()[0]["id"]
+    assert client.get("/search-logs", params={"cursor": "!!"}).status_code == 400
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import httpx
+
+from polza_client import PolzaAIClient
+
+MODEL_ANSWER = json.dumps({
+    "website": "https://model-guess.ru",
+    "email": "info@model-guess.ru",
+    "address": "Москва, ул. Строителей, 5",
+    "phone": "",
+    "description": "Производство буровых станков",
+    "equipment": "Буровые станки",
+    "preferred_language": "ru",
+})
+
+
+def _parallel_client(web_delay: float, deadline: float) -> PolzaAIClient:
+    client = PolzaAIClient()
+    client.parallel_search = True
+    client.web_search_deadline = deadline
+    client.events = []
+
+    async def web(company_name):
+        client.events.append("web_started")
+        await asyncio.sleep(web_delay)
+        client.events.append("web_done")
+        return {"website": "https://real-site.ru", "email": "", "phone": "", "address": ""}
+
+    async def make_request(prompt, **kwargs):
+        client.events.append("llm_started")
+        return MODEL_ANSWER
+
+    client._search_company_via_web = web
+    client._make_request = make_request
+    return client
+
+
+def test_llm_starts_without_waiting_for_web_search_and_web_data_wins():
+    client = _parallel_client(web_delay=0.05, deadline=5)
+    result = asyncio.run(client._search_company_info_uncached("Буртехника", retry_count=1))
+
+    assert client.events.index("llm_started") < client.events.index("web_done")
+    assert result["website"] == "https://real-site.ru"
+    assert result["email"] == "info@model-guess.ru"
+
+
+def test_late_web_search_is_dropped_at_deadline():
+    client = _parallel_client(web_delay=5, deadline=0.01)
+    result = asyncio.run(client._search_company_info_uncached("Буртехника", retry_count=1))
+
+    assert "web_done" not in client.events
+    assert result["website"] == "https://model-guess.ru"
+
+
+def test_web_search_queries_run_concurrently():
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.02)
+        state["active"] -= 1
+        return httpx.Response(200, text="<html>ничего</html>")
+
+    async def scenario():
+        client = PolzaAIClient()
+        transport_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client.http_pool.get_client = lambda url: transport_client
+        client.upstream_limits["duckduckgo"].rate = 0
+        return await client._search_company_via_web("Буртехника")
+
+    assert asyncio.run(scenario()) == {}
+    assert state["peak"] == 2
@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, UpstreamPolicy, retry_after_seconds, retry_budget
+
+
+def _sender(*outcomes):
+    calls = []
+
+    async def send():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome[0], headers=outcome[1] if len(outcome) > 1 else {})
+
+    return send, calls
+
+
+def _policy(**kwargs) -> UpstreamPolicy:
+    breaker = CircuitBreaker("test", failure_ratio=0.5, min_calls=4, window=60, open_seconds=30)
+    return UpstreamPolicy("test", base_delay=0, max_delay=0, breaker=breaker, **kwargs)
+
+
+def test_transient_errors_are_retried_and_others_returned():
+    send, calls = _sender(httpx.ConnectError("reset"), (503,), (200,))
+    retries = []
+    response = asyncio.run(_policy(max_attempts=3).call(send, on_retry=lambda attempt, reason: retries.append(reason)))
+
+    assert response.status_code == 200
+    assert retries == ["ConnectError", "HTTP 503"]
+
+    send, calls = _sender((400,), (200,))
+    assert asyncio.run(_policy(max_attempts=3).call(send)).status_code == 400
+    assert len(calls) == 1
+
+
+def test_retry_after_is_honoured_up_to_max_delay(monkeypatch):
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(resilience.asyncio, "sleep", fake_sleep)
+    send, _ = _sender((429, {"Retry-After": "2"}), (429, {"Retry-After": "90"}), (200,))
+    policy = UpstreamPolicy("test", max_attempts=3, base_delay=0, max_delay=20)
+    assert asyncio.run(policy.call(send)).status_code == 200
+    assert delays == [2.0, 20]
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+
+
+def test_retry_budget_is_shared_by_all_calls_of_a_request():
+    async def scenario():
+        policy = _policy(max_attempts=5)
+        with retry_budget(2):
+            first, first_calls = _sender((503,), (503,), (200,))
+            second, second_calls = _sender((503,), (200,))
+            return (await policy.call(first)).status_code, (await policy.call(second)).status_code, first_calls, second_calls, policy
+
+    first_status, second_status, first_calls, second_calls, policy = asyncio.run(scenario())
+    assert (first_status, len(first_calls)) == (200, 3)
+    # Бюджет исчерпан первым вызовом - второй возвращает ошибку без повтора
+    assert (second_status, len(second_calls)) == (503, 1)
+    assert policy.counters["budget_exhausted"] == 1
+
+
+def test_circuit_opens_rejects_and_closes_after_successful_probe(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    breaker = CircuitBreaker("test", failure_ratio=0.5, min_calls=4, window=60, open_seconds=30)
+
+    for success in (True, False, True, False):
+        breaker.before_call()
+        breaker.record(success)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] += 31
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # Пока пробный запрос не завершился, остальные отклоняются
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.stats() == {"state": "closed", "rejected": 2, "opened": 1}
+
+
+def test_rate_limit_responses_do_not_open_circuit():
+    breaker = CircuitBreaker("test", failure_ratio=0.5, min_calls=4, window=60, open_seconds=30)
+    send, _ = _sender(*[(429,)] * 6)
+    policy = UpstreamPolicy("test", max_attempts=6, base_delay=0, max_delay=0, breaker=breaker)
+    assert asyncio.run(policy.call(send)).status_code == 429
+    assert breaker.state == "closed"
@@ -0,0 +1,172 @@
+import asyncio
+
+import llm_telemetry
+import resilience
+from chat_turn import chat_turn, record_upstream_call
+from llm_governor import BULK, INTERACTIVE, LLMGovernor, current_llm_priority, llm_priority
+from llm_telemetry import llm_endpoint
+from resilience import retry_budget
+from singleflight import SingleFlight
+
+
+def test_shared_call_keeps_own_budget_and_originating_endpoint():
+    async def scenario():
+        flight = SingleFlight("company_lookup")
+        seen = {}
+
+        async def lookup():
+            seen["priority"] = current_llm_priority()
+            seen["endpoint"] = llm_telemetry.current_llm_endpoint()
+            seen["budget"] = resilience._current_budget.get()
+            return "ok"
+
+        with llm_endpoint("job:bulk_search"), retry_budget(1) as budget, llm_priority(BULK):
+            assert await flight.do("roga", lookup) == "ok"
+        return seen, budget
+
+    seen, budget = asyncio.run(scenario())
+    assert seen["priority"] == BULK
+    assert seen["endpoint"] == "job:bulk_search"
+    assert seen["budget"] is not None and seen["budget"] is not budget
+
+
+def test_upstream_calls_of_shared_call_are_counted_on_every_waiting_turn():
+    async def scenario():
+        flight = SingleFlight("company_lookup")
+        joined = asyncio.Event()
+
+        async def lookup():
+            record_upstream_call("duckduckgo")
+            await joined.wait()
+            record_upstream_call("polza")
+            return "ok"
+
+        async def chat(started: asyncio.Event = None):
+            with chat_turn() as turn:
+                task = asyncio.create_task(flight.do("roga", lookup))
+                await asyncio.sleep(0)
+                if started is not None:
+                    started.set()
+                record_upstream_call("polza")
+                assert await task == "ok"
+                return turn
+
+        first_started = asyncio.Event()
+        first = asyncio.create_task(chat(first_started))
+        await first_started.wait()
+        await asyncio.sleep(0)
+        # Второй ход присоединяется после первого обращения общей работы
+        second = asyncio.create_task(chat())
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        joined.set()
+        return await first, await second
+
+    first, second = asyncio.run(scenario())
+    assert first.stats()["upstream_calls"] == {"polza": 2, "duckduckgo": 1}
+    assert second.stats()["upstream_calls"] == {"polza": 2, "duckduckgo": 1}
+
+
+def test_interactive_caller_raises_priority_of_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        joined = asyncio.Event()
+        seen = []
+
+        async def lookup():
+            seen.append(current_llm_priority())
+            await joined.wait()
+            seen.append(current_llm_priority())
+            return "ok"
+
+        async def bulk_caller():
+            with llm_priority(BULK):
+                return await flight.do("roga", lookup)
+
+        bulk = asyncio.create_task(bulk_caller())
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(flight.do("roga", lookup))
+        await asyncio.sleep(0)
+        joined.set()
+        assert await bulk == await interactive == "ok"
+        return seen
+
+    assert asyncio.run(scenario()) == [BULK, INTERACTIVE]
+
+
+def test_queued_llm_call_is_promoted_when_interactive_caller_joins():
+    async def scenario():
+        governor = LLMGovernor(default_concurrency=1, model_limits={})
+        flight = SingleFlight()
+        admitted = []
+
+        async def llm_call(name: str):
+            async with governor.reserve("gpt-4o-mini", 100):
+                admitted.append(name)
+
+        async def bulk_call(name: str):
+            with llm_priority(BULK):
+                await llm_call(name)
+
+        async def shared_lookup_from_bulk():
+            with llm_priority(BULK):
+                return await flight.do("roga", lambda: llm_call("shared"))
+
+        async with governor.reserve("gpt-4o-mini", 100):
+            # Слот занят: фоновый вызов встает в очередь раньше общего поиска
+            other = asyncio.create_task(bulk_call("bulk"))
+            await asyncio.sleep(0)
+            bulk_waiter = asyncio.create_task(shared_lookup_from_bulk())
+            await asyncio.sleep(0)
+            chat_waiter = asyncio.create_task(flight.do("roga", lambda: llm_call("unused")))
+            await asyncio.sleep(0)
+            assert governor.stats()["gpt-4o-mini"]["queued"] == {"retry": 0, "interactive": 1, "bulk": 1}
+        await asyncio.gather(other, bulk_waiter, chat_waiter)
+        return admitted
+
+    assert asyncio.run(scenario()) == ["shared", "bulk"]
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        executions = []
+
+        async def lookup():
+            executions.append(1)
+            await release.wait()
+            return "ok"
+
+        first = asyncio.create_task(flight.do("roga", lookup))
+        second = asyncio.create_task(flight.do("roga", lookup))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        result = await second
+        return first.cancelled(), result, executions, flight.stats()
+
+    first_cancelled, result, executions, stats = asyncio.run(scenario())
+    assert first_cancelled and result == "ok"
+    assert executions == [1]
+    assert (stats["executions"], stats["coalesced"], stats["in_flight"]) == (1, 1, 0)
+
+
+def test_error_is_shared_and_next_call_runs_again():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream")
+
+        results = await asyncio.gather(flight.do("roga", failing), flight.do("roga", failing), return_exceptions=True)
+        retry = await asyncio.gather(flight.do("roga", failing), return_exceptions=True)
+        return results, retry, calls
+
+    results, retry, calls = asyncio.run(scenario())
+    assert [str(error) for error in results + retry] == ["upstream"] * 3
+    assert len(calls) == 2
@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from polza_client import PolzaAIClient
+from structured_output import COMPANY_INFO_FORMAT, parse_company_info, parse_equipment_companies
+
+
+COMPANY = {
+    "website": "https://roga.ru",
+    "email": "info@roga.ru",
+    "address": "Москва, ул. Ленина, 1",
+    "phone": "+7 495 000-00-00",
+    "description": "Буровое оборудование",
+    "equipment": "Буровые установки",
+    "preferred_language": "ru",
+}
+
+
+def test_schema_response_is_structured():
+    info, method = parse_company_info(json.dumps(COMPANY))
+    assert method == "structured"
+    assert info == COMPANY
+
+
+def test_empty_or_unrelated_json_is_not_structured():
+    with pytest.raises(ValueError):
+        parse_company_info("{}")
+    with pytest.raises(ValueError):
+        parse_company_info('{"error": "rate limited"}')
+
+
+def test_partial_json_is_repaired_not_structured():
+    info, method = parse_company_info('Ответ: {"website": "https://roga.ru", "email": "info@roga.ru",}')
+    assert method == "repaired"
+    assert info["website"] == "https://roga.ru" and info["phone"] == ""
+
+
+def test_equipment_companies_require_full_items_for_structured():
+    full = json.dumps({"companies": [{**COMPANY, "name": "Рога и копыта"}]})
+    assert parse_equipment_companies(full)[1] == "structured"
+    partial = json.dumps({"companies": [{"name": "Рога и копыта"}]})
+    companies, method = parse_equipment_companies(partial)
+    assert method == "repaired" and companies[0]["name"] == "Рога и копыта"
+
+
+def _client(handler) -> PolzaAIClient:
+    client = PolzaAIClient()
+    transport_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client.http_pool.get_client = lambda url: transport_client
+    return client
+
+
+def _completion(content: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 1, "completion_tokens": 1}})
+
+
+def test_response_format_rejection_falls_back_to_plain_request():
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        payloads.append(payload)
+        if "response_format" in payload:
+            return httpx.Response(400, json={"error": {"message": "Invalid parameter: 'response_format' of type 'json_schema' is not supported with this model"}})
+        return _completion("ok")
+
+    client = _client(handler)
+    content = asyncio.run(client._make_request("q", model="old-model", response_format=COMPANY_INFO_FORMAT))
+    assert content == "ok"
+    assert ["response_format" in payload for payload in payloads] == [True, False]
+    assert client.plain_json_models == {"old-model"}
+
+
+def test_other_bad_request_does_not_disable_structured_output():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, json={"error": {"message": "This model's maximum context length is 128000 tokens"}})
+
+    client = _client(handler)
+    with pytest.raises((httpx.HTTPStatusError, ValueError)):
+        asyncio.run(client._make_request("q", model="gpt-4o", response_format=COMPANY_INFO_FORMAT))
+    assert client.plain_json_models == set()
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { 
   Upload, 
   Card, 
@@ -6,27 +6,70 @@ import {
   Alert, 
   Progress,
   Space,
-  Divider
+  Divider,
+  Button
 } from 'antd';
 import { UploadOutlined, FileExcelOutlined } from '@ant-design/icons';
-import { companyService } from '../services/api';
+import { companyService, jobService } from '../services/api';
 
 const { Title, Text } = Typography;
 const { Dragger } = Upload;
 
+const JOB_POLL_INTERVAL_MS = 2000;
+const FINISHED_JOB_STATUSES = ['completed', 'failed', 'cancelled'];
+
+const formatEta = (seconds) => {
+  if (seconds === null || seconds === undefined) return '—';
+  if (seconds < 60) return `${Math.round(seconds)} сек`;
+  return `${Math.round(seconds / 60)} мин`;
+};
+
 const BulkUpload = () => {
   const [uploading, setUploading] = useState(false);
   const [result, setResult] = useState(null);
+  const [job, setJob] = useState(null);
   const [error, setError] = useState(null);
+  const pollTimer = useRef(null);
+
+  const stopPolling = () => {
+    if (pollTimer.current) {
+      clearInterval(pollTimer.current);
+      pollTimer.current = null;
+    }
+  };
+
+  useEffect(() => stopPolling, []);
+
+  const startPolling = (jobId) => {
+    stopPolling();
+    const poll = async () => {
+      try {
+        const data = await jobService.getJob(jobId);
+        setJob(data);
+        if (FINISHED_JOB_STATUSES.includes(data.status)) {
+          stopPolling();
+        }
+      } catch (err) {
+        setError(err.message || 'Не удалось получить прогресс обработки');
+        stopPolling();
+      }
+    };
+    poll();
+    pollTimer.current = setInterval(poll, JOB_POLL_INTERVAL_MS);
+  };
 
   const handleUpload = async (file) => {
     setUploading(true);
     setError(null);
     setResult(null);
+    setJob(null);
 
     try {
       const data = await companyService.bulkSearchCompanies(file);
       setResult(data);
+      if (data.job_id) {
+        startPolling(data.job_id);
+      }
     } catch (err) {
       setError(err.response?.data?.detail || 'Произошла ошибка при загрузке файла');
     } finally {
@@ -36,6 +79,18 @@ const BulkUpload = () => {
     return false; // Предотвращаем автоматическую загрузку
   };
 
+  const handleCancel = async () => {
+    if (!job) return;
+    try {
+      setJob(await jobService.cancelJob(job.id));
+    } catch (err) {
+      setError(err.message || 'Не удалось отменить обработку');
+    }
+  };
+
+  const jobFinished = job && FINISHED_JOB_STATUSES.includes(job.status);
+  const jobPercent = job && job.total ? Math.round((job.processed / job.total) * 100) : 0;
+
   const uploadProps = {
     name: 'file',
     multiple: false,
@@ -79,13 +134,28 @@ const BulkUpload = () => {
 
           {uploading && (
             <div style={{ textAlign: 'center' }}>
-              <Progress percent={50} status="active" />
+              <Progress percent={0} status="active" />
               <div style={{ marginTop: 16 }}>
-                <Text>Поиск информации о компаниях через Polza.AI...</Text>
+                <Text>Загрузка файла...</Text>
               </div>
             </div>
           )}
 
+          {job && !jobFinished && (
+            <div style={{ textAlign: 'center' }}>
+              <Progress percent={jobPercent} status="active" />
+              <div style={{ marginTop: 16 }}>
+                <Text>
+                  Поиск информации о компаниях через Polza.AI: {job.processed} из {job.total},
+                  найдено {job.found}, ошибок {job.failed}. Осталось примерно: {formatEta(job.eta_seconds)}
+                </Text>
+              </div>
+              <Button style={{ marginTop: 16 }} onClick={handleCancel}>
+                Отменить
+              </Button>
+            </div>
+          )}
+
           {error && (
             <Alert
               message="Ошибка загрузки"
@@ -95,17 +165,34 @@ const BulkUpload = () => {
             />
           )}
 
-          {result && (
+          {result && !job && (
+            <Alert
+              message="Файл принят"
+              description={result.message}
+              type="info"
+              showIcon
+            />
+          )}
+
+          {jobFinished && (
             <Alert
-              message="Загрузка завершена"
+              message={job.status === 'completed' ? 'Загрузка завершена' : job.status === 'cancelled' ? 'Обработка отменена' : 'Обработка завершилась с ошибкой'}
               description={
                 <div>
-                  <p><strong>Обработано компаний:</strong> {result.companies_processed}</p>
-                  <p><strong>Найдено информации:</strong> {result.companies_found}</p>
-                  <p>{result.message}</p>
+                  <p><strong>Обработано компаний:</strong> {job.processed} из {job.total}</p>
+                  <p><strong>Найдено информации:</strong> {job.found}</p>
+                  <p><strong>Ошибок:</strong> {job.failed}</p>
+                  {job.error_message && <p>{job.error_message}</p>}
+                  {job.errors && job.errors.length > 0 && (
+                    <ul>
+                      {job.errors.map((item) => (
+                        <li key={item.position}>{item.payload}: {item.error}</li>
+                      ))}
+                    </ul>
+                  )}
                 </div>
               }
-              type="success"
+              type={job.status === 'completed' ? 'success' : 'warning'}
               showIcon
             />
           )}
@@ -12,6 +12,7 @@ const Chat = () => {
   const [messages, setMessages] = useState([]);
   const [inputMessage, setInputMessage] = useState('');
   const [loading, setLoading] = useState(false);
+  const [streamStatus, setStreamStatus] = useState(null);
   const [currentDialogId, setCurrentDialogId] = useState(null);
   const [dialogs, setDialogs] = useState([]);
   const [dialogsLoading, setDialogsLoading] = useState(false);
@@ -175,16 +176,44 @@ const Chat = () => {
       timestamp: new Date().toISOString()
     };
 
-    setMessages(prev => [...prev, userMessage]);
+    // Пустое сообщение помощника дополняется фрагментами ответа по мере их прихода
+    const assistantMessage = {
+      role: 'assistant',
+      content: '',
+      timestamp: new Date().toISOString(),
+      streaming: true
+    };
+
+    setMessages(prev => [...prev, userMessage, assistantMessage]);
     setInputMessage('');
     setLoading(true);
+    setStreamStatus('AI думает...');
+
+    const handleStreamEvent = (event, data) => {
+      if (event === 'start' && data?.companies?.length) {
+        setStreamStatus(`Ищем информацию: ${data.companies.join(', ')}`);
+      } else if (event === 'start' && data?.equipment) {
+        setStreamStatus(`Ищем компании, использующие ${data.equipment}`);
+      } else if (event === 'company' || event === 'equipment') {
+        setStreamStatus(`Найдено: ${data.name}. Формируем ответ...`);
+      } else if (event === 'token') {
+        setStreamStatus(null);
+        setMessages(prev => {
+          const next = [...prev];
+          const last = next[next.length - 1];
+          next[next.length - 1] = { ...last, content: last.content + data.content };
+          return next;
+        });
+      }
+    };
 
     try {
-      const response = await chatService.sendDialogMessage(inputMessage, currentDialogId, messages);
+      const response = await chatService.streamDialogMessage(inputMessage, currentDialogId, handleStreamEvent);
       
       // Проверяем, что ответ содержит необходимые данные
       if (response && response.message) {
-        setMessages(response.conversation_history || []);
+        // Заменяем локальные черновики сообщениями, сохраненными на сервере
+        setMessages(prev => [...prev.slice(0, -2), ...(response.messages || [])]);
         setCurrentDialogId(response.dialog_id);
         
         // Обновляем список диалогов, если это новый диалог
@@ -207,9 +236,10 @@ const Chat = () => {
         content: `Извините, произошла ошибка при обработке вашего сообщения.\n\n**Детали ошибки:** ${errorText}\n\nПопробуйте:\n- Переформулировать запрос\n- Проверить подключение к интернету\n- Обновить страницу`,
         timestamp: new Date().toISOString()
       };
-      setMessages(prev => [...prev, errorMessage]);
+      setMessages(prev => [...prev.filter(msg => !msg.streaming), errorMessage]);
     } finally {
       setLoading(false);
+      setStreamStatus(null);
     }
   };
 
@@ -499,10 +529,10 @@ const Chat = () => {
               )}
             />
           )}
-          {loading && (
+          {loading && streamStatus && (
             <div style={{ textAlign: 'center', padding: 16 }}>
               <Spin />
-              <div style={{ marginTop: 8 }}>AI думает...</div>
+              <div style={{ marginTop: 8 }}>{streamStatus}</div>
             </div>
           )}
           <div ref={messagesEndRef} />
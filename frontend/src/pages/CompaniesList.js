@@ -1,9 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { 
   Table, 
   Card, 
   Typography, 
-  Spin, 
   Alert, 
   Space,
   Tag,
@@ -12,7 +11,9 @@ import {
   Form,
   Input,
   message,
-  Popconfirm
+  Popconfirm,
+  Checkbox,
+  Select
 } from 'antd';
 import { 
   EditOutlined, 
@@ -29,10 +30,26 @@ import { companyService, emailService } from '../services/api';
 
 const { Title, Text } = Typography;
 
+const LANGUAGE_OPTIONS = [
+  { value: 'ru', label: '🇷🇺 Русский' },
+  { value: 'en', label: '🇬🇧 English' },
+  { value: 'de', label: '🇩🇪 Deutsch' },
+  { value: 'fr', label: '🇫🇷 Français' },
+  { value: 'es', label: '🇪🇸 Español' },
+  { value: 'zh', label: '🇨🇳 中文' },
+  { value: 'ja', label: '🇯🇵 日本語' }
+];
+
 const CompaniesList = () => {
   const [companies, setCompanies] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  // Поиск и фильтры выполняются на сервере, страницы запрашиваются по одной
+  const [filters, setFilters] = useState({ q: '', has_email: false, verified: false, language: undefined });
+  const [pagination, setPagination] = useState({ current: 1, pageSize: 10 });
+  const [hasMore, setHasMore] = useState(false);
+  // cursors.current[i] - курсор страницы i + 1, полученный с предыдущей страницей
+  const cursors = useRef([null]);
   const [editingCompany, setEditingCompany] = useState(null);
   const [editModalVisible, setEditModalVisible] = useState(false);
   const [emailCampaignModalVisible, setEmailCampaignModalVisible] = useState(false);
@@ -43,13 +60,22 @@ const CompaniesList = () => {
 
   useEffect(() => {
     loadCompanies();
-  }, []);
+  }, [filters, pagination]);
 
   const loadCompanies = async () => {
     try {
       setLoading(true);
-      const data = await companyService.getCompanies();
-      setCompanies(data);
+      const { current, pageSize } = pagination;
+      const { items, nextCursor } = await companyService.getCompaniesPage(cursors.current[current - 1], pageSize, {
+        q: filters.q.trim(),
+        has_email: filters.has_email || undefined,
+        verified: filters.verified || undefined,
+        language: filters.language
+      });
+      cursors.current[current] = nextCursor;
+      setHasMore(Boolean(nextCursor));
+      setCompanies(items);
+      setError(null);
     } catch (err) {
       setError('Ошибка при загрузке списка компаний');
     } finally {
@@ -57,6 +83,22 @@ const CompaniesList = () => {
     }
   };
 
+  const updateFilters = (changes) => {
+    cursors.current = [null];
+    setFilters((previous) => ({ ...previous, ...changes }));
+    setPagination((previous) => ({ ...previous, current: 1 }));
+  };
+
+  const handleTableChange = (tablePagination) => {
+    if (tablePagination.pageSize !== pagination.pageSize) {
+      // Курсоры привязаны к размеру страницы - начинаем сначала
+      cursors.current = [null];
+      setPagination({ current: 1, pageSize: tablePagination.pageSize });
+    } else {
+      setPagination({ current: tablePagination.current, pageSize: tablePagination.pageSize });
+    }
+  };
+
   const handleEdit = (company) => {
     setEditingCompany(company);
     form.setFieldsValue(company);
@@ -232,17 +274,6 @@ const CompaniesList = () => {
     },
   ];
 
-  if (loading) {
-    return (
-      <div className="loading-container">
-        <Spin size="large" />
-        <div style={{ marginTop: 16 }}>
-          <Text>Загрузка списка компаний...</Text>
-        </div>
-      </div>
-    );
-  }
-
   const rowSelection = {
     selectedRowKeys: selectedCompanyIds,
     onChange: (selectedRowKeys) => {
@@ -288,18 +319,50 @@ const CompaniesList = () => {
       )}
 
       <Card>
+        <Space wrap style={{ marginBottom: 16 }}>
+          <Input.Search
+            placeholder="Название, описание, адрес или оборудование"
+            allowClear
+            enterButton
+            style={{ width: 400 }}
+            onSearch={(value) => updateFilters({ q: value })}
+          />
+          <Checkbox
+            checked={filters.has_email}
+            onChange={(e) => updateFilters({ has_email: e.target.checked })}
+          >
+            С email
+          </Checkbox>
+          <Checkbox
+            checked={filters.verified}
+            onChange={(e) => updateFilters({ verified: e.target.checked })}
+          >
+            Проверенные
+          </Checkbox>
+          <Select
+            placeholder="Язык рассылки"
+            allowClear
+            style={{ width: 180 }}
+            options={LANGUAGE_OPTIONS}
+            value={filters.language}
+            onChange={(value) => updateFilters({ language: value })}
+          />
+        </Space>
         <Table
           columns={columns}
           dataSource={companies}
           rowKey="id"
+          loading={loading}
           rowSelection={rowSelection}
           pagination={{
-            pageSize: 10,
+            current: pagination.current,
+            pageSize: pagination.pageSize,
+            // Общее число не считается на сервере: показываем пройденные страницы и следующую, если она есть
+            total: (pagination.current - 1) * pagination.pageSize + companies.length + (hasMore ? 1 : 0),
             showSizeChanger: true,
-            showQuickJumper: true,
-            showTotal: (total, range) => 
-              `${range[0]}-${range[1]} из ${total} компаний`,
+            showTotal: (total, range) => `${range[0]}-${range[1]}`,
           }}
+          onChange={handleTableChange}
         />
       </Card>
 
@@ -69,6 +69,19 @@ export const companyService = {
     return response.data;
   },
 
+  // Страница компаний по курсору; filters - { q, has_email, verified, language }, пустые значения не передаются.
+  // nextCursor - курсор следующей страницы (null, если это последняя)
+  getCompaniesPage: async (cursor = null, limit = 10, filters = {}) => {
+    const params = { limit };
+    Object.entries({ cursor, ...filters }).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') {
+        params[key] = value;
+      }
+    });
+    const response = await api.get('/companies', { params });
+    return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+  },
+
   // Получить информацию о компании
   getCompany: async (id) => {
     const response = await api.get(`/companies/${id}`);
@@ -131,14 +144,67 @@ export const searchLogService = {
 
 export const chatService = {
   // Отправить сообщение в диалог
-  sendDialogMessage: async (message, dialogId, conversationHistory) => {
+  // История диалога хранится на сервере, поэтому отправляем только новое сообщение
+  sendDialogMessage: async (message, dialogId) => {
     const response = await api.post('/chat/dialog', {
       message,
-      dialog_id: dialogId,
-      conversation_history: conversationHistory || []
+      dialog_id: dialogId
     });
     return response.data;
   },
+
+  // Отправить сообщение в потоковом режиме (Server-Sent Events).
+  // onEvent(event, data) вызывается для start, company, equipment, token и error;
+  // возвращает данные события done (как у sendDialogMessage)
+  streamDialogMessage: async (message, dialogId, onEvent) => {
+    const response = await fetch(`${API_BASE_URL}/chat/dialog`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify({
+        message,
+        dialog_id: dialogId,
+        stream: true
+      })
+    });
+    if (!response.ok || !response.body) {
+      let errorMessage = `Ошибка сервера: ${response.status}`;
+      try {
+        const data = await response.json();
+        errorMessage = data?.detail || data?.message || errorMessage;
+      } catch (e) {
+        // Тело ответа не JSON - оставляем код статуса
+      }
+      throw new Error(errorMessage);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let event = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach((line) => {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        });
+        const payload = data ? JSON.parse(data) : null;
+        if (event === 'done') result = payload;
+        else if (onEvent) onEvent(event, payload);
+      }
+    }
+    if (!result) {
+      throw new Error('Соединение с сервером прервано');
+    }
+    return result;
+  },
 };
 
 export const dialogService = {
@@ -261,6 +327,20 @@ export const emailService = {
   },
 };
 
+export const jobService = {
+  // Получить прогресс фоновой задачи
+  getJob: async (jobId) => {
+    const response = await api.get(`/jobs/${jobId}`);
+    return response.data;
+  },
+
+  // Отменить фоновую задачу
+  cancelJob: async (jobId) => {
+    const response = await api.post(`/jobs/${jobId}/cancel`);
+    return response.data;
+  },
+};
+
 export const agentService = {
   // Выполнить действие агента
   performAction: async (action, parameters) => {